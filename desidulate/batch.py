@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Run dump -> reg2ssf -> indexssf -> ssf2midi for each tune in sidinfo.csv,
+# in-process, keeping intermediate frames in memory between stages.
+
+import argparse
+import concurrent.futures
+import glob
+import logging
+import multiprocessing
+import os
+import re
+import time
+import pandas as pd
+from desidulate.fileio import midi_path, out_path, write_timings
+from desidulate.indexssf import index_ssf
+from desidulate.reg2ssf import reg2ssf
+from desidulate.sidinfo2dump import DUMP_BACKENDS, dump_jobs, read_sidinfo, run_dump_job
+from desidulate.ssf2midi import ssf2midi, ssf2midi_parser
+
+STAGES = ("dump", "reg2ssf", "indexssf", "ssf2midi")
+BATCH_WORKERS = max(1, multiprocessing.cpu_count())
+
+
+def outputs_current(inputs, outputs):
+    # all outputs exist, and are no older than any input.
+    try:
+        return min(os.path.getmtime(output) for output in outputs) >= max(
+            os.path.getmtime(input_file) for input_file in inputs
+        )
+    except (OSError, ValueError):
+        return False
+
+
+def csv_frame(df):
+    # frame as the next stage would have read it back from CSV.
+    if df.empty:
+        return pd.DataFrame()
+    return df.reset_index().astype(pd.Int64Dtype())
+
+
+class BatchTune:
+
+    def __init__(self, args, job, cia):
+        self.args = args
+        self.job = job
+        self.cia = cia
+        self.dump = job.dump_path
+        self.ssf_log_file = out_path(self.dump, "log.zst")
+        self.ssf_file = out_path(self.dump, "ssf.zst")
+        # index files written by indexssf, if any, so the stage can be skipped
+        # even when there were none.
+        self.index_list_file = out_path(self.dump, "index_ssf.txt")
+        self.stage_stats = []
+        self.ssf_log_df = None
+        self.ssf_df = None
+
+    def run_stage(self, stage, inputs, outputs, stage_func):
+        if not self.args.force and outputs_current(inputs, outputs):
+            self.stage_stats.append((stage, False, 0, 0))
+            return False
+        input_bytes = sum(os.path.getsize(input_file) for input_file in inputs)
+        start_time = time.time()
+        stage_func()
+        self.stage_stats.append((stage, True, time.time() - start_time, input_bytes))
+        return True
+
+    def dump_stage(self):
+        record = run_dump_job(DUMP_BACKENDS[self.args.dump_backend], self.job)
+        if record["status"] != "ok":
+            raise ValueError("%s: dump failed: %s" % (self.job.key, record))
+
+    def reg2ssf_stage(self):
+        ssf_log_df, ssf_df = reg2ssf(self.dump, self.job.pal, self.cia)
+        self.ssf_log_df = csv_frame(ssf_log_df)
+        self.ssf_df = csv_frame(ssf_df)
+
+    def indexssf_stage(self):
+        index_files = index_ssf(self.ssf_file, df=self.ssf_df)
+        with open(self.index_list_file, "w", encoding="utf8") as f:
+            for index_file in index_files:
+                f.write(os.path.basename(index_file) + "\n")
+
+    def ssf2midi_stage(self):
+        args = ssf2midi_parser().parse_args(
+            [
+                self.ssf_log_file,
+                "--workers=1",
+                "--pal" if self.job.pal else "--ntsc",
+                "--cia=%u" % self.cia,
+            ]
+        )
+        if ssf2midi(args, ssf_log_df=self.ssf_log_df, ssfs_df=self.ssf_df):
+            raise ValueError("%s: ssf2midi failed" % self.job.key)
+
+    def run(self):
+        sidfile = os.path.join(self.job.dname, self.job.bname)
+        if self.args.dump_backend:
+            self.run_stage("dump", [sidfile], [self.dump], self.dump_stage)
+        if not os.path.exists(self.dump):
+            logging.info("%s: no dump %s", self.job.key, self.dump)
+            return self.stage_stats
+        self.run_stage(
+            "reg2ssf",
+            [self.dump],
+            [self.ssf_log_file, self.ssf_file],
+            self.reg2ssf_stage,
+        )
+        self.run_stage(
+            "indexssf",
+            [self.ssf_file],
+            [self.index_list_file]
+            + glob.glob(glob.escape(out_path(self.ssf_file, "")) + "*.index_ssf.zst"),
+            self.indexssf_stage,
+        )
+        self.run_stage(
+            "ssf2midi",
+            [self.ssf_log_file, self.ssf_file],
+            [midi_path(self.ssf_log_file), out_path(self.ssf_log_file, "inst.txt.zst")],
+            self.ssf2midi_stage,
+        )
+        stage_timings = {
+            stage: {"time": stage_time, "bytes": input_bytes}
+            for stage, ran, stage_time, input_bytes in self.stage_stats
+            if ran
+        }
+        if stage_timings:
+            write_timings(self.dump, stage_timings)
+        return self.stage_stats
+
+
+def batch_tune(args, job, cia):
+    logging.info("%s: starting", job.key)
+    return (job.key, BatchTune(args, job, cia).run())
+
+
+def stage_throughput(all_stage_stats, wall_time):
+    throughput = {}
+    for stage in STAGES:
+        stats = [stat for stat in all_stage_stats if stat[0] == stage]
+        ran = [stat for stat in stats if stat[1]]
+        stage_time = sum(stat[2] for stat in ran)
+        stage_bytes = sum(stat[3] for stat in ran)
+        throughput[stage] = {
+            "ran": len(ran),
+            "skipped": len(stats) - len(ran),
+            "time": stage_time,
+            "tunes_per_sec": len(ran) / stage_time if stage_time else 0,
+            "mb_per_sec": stage_bytes / stage_time / 1e6 if stage_time else 0,
+            "share": stage_time / wall_time if wall_time else 0,
+        }
+    return throughput
+
+
+def batch_tunes(args, df):
+    if "magicID" in df.columns:
+        df = df[df["magicID"] == "PSID"]
+    if "sids" in df.columns:
+        df = df[df["sids"] == 1]
+    if args.filter:
+        filter_re = re.compile(args.filter)
+        df = df[[bool(filter_re.match(path)) for path in df["path"]]]
+    cias = [0] * len(df)
+    if "cia" in df.columns:
+        cias = [int(cia) if pd.notna(cia) else 0 for cia in df["cia"]]
+    # longest first, so that the pool finishes together.
+    return sorted(
+        zip(dump_jobs(df, args.hvscdir), cias),
+        key=lambda tune: tune[0].cycles,
+        reverse=True,
+    )
+
+
+def run_batch(args, df):
+    tunes = batch_tunes(args, df)
+    logging.info("%u tunes", len(tunes))
+    all_stage_stats = []
+    start_time = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(batch_tune, args, job, cia) for job, cia in tunes]
+        for i, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            key, stage_stats = future.result()
+            all_stage_stats.extend(stage_stats)
+            logging.info(
+                "%s: ran %s (%u of %u)",
+                key,
+                " ".join(stat[0] for stat in stage_stats if stat[1]) or "nothing",
+                i,
+                len(tunes),
+            )
+    return stage_throughput(all_stage_stats, (time.time() - start_time) * args.workers)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Run the desidulate pipeline for all songs in sidinfo.csv"
+    )
+    parser.add_argument("sidinfo", type=str)
+    parser.add_argument("--hvscdir", default="/local/hvsc", type=str)
+    parser.add_argument(
+        "--workers", default=BATCH_WORKERS, type=int, help="tunes to process at once"
+    )
+    parser.add_argument(
+        "--dump-backend",
+        dest="dump_backend",
+        default=None,
+        choices=sorted(DUMP_BACKENDS),
+        help="make missing dumps with this backend (default only use existing dumps)",
+    )
+    parser.add_argument("--filter", default="", type=str, help="regex of paths to run")
+    parser.add_argument(
+        "--force",
+        default=False,
+        action="store_true",
+        help="run all stages, even if outputs are up to date",
+    )
+    args = parser.parse_args()
+
+    throughput = run_batch(args, read_sidinfo(args.sidinfo))
+    for stage, stage_throughput_stats in throughput.items():
+        logging.info(
+            "%s: ran %u, skipped %u, %.1fs, %.2f tunes/s, %.2f MB/s, %.0f%% of worker time",
+            stage,
+            stage_throughput_stats["ran"],
+            stage_throughput_stats["skipped"],
+            stage_throughput_stats["time"],
+            stage_throughput_stats["tunes_per_sec"],
+            stage_throughput_stats["mb_per_sec"],
+            stage_throughput_stats["share"] * 100,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,981 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Minimal 6502 and C64 (CIA1/VIC raster/banking) emulation, sufficient to
+# run SID init and play routines and observe CIA1 timer A programming.
+# http://www.oxyron.de/html/opcodes02.html
+# https://hvsc.c64.org/download/C64Music/DOCUMENTS/SID_file_format.txt
+
+PAL_CLOCK = 985248
+NTSC_CLOCK = 1022727
+PAL_RASTER = (312, 63)
+NTSC_RASTER = (263, 65)
+# KERNAL IOINIT CIA1 timer A defaults.
+PAL_CIA_TIMER = 0x4025
+NTSC_CIA_TIMER = 0x4295
+# CIA1 timer A registers, in each mirror at $DC00-$DCFF.
+CIA1_TIMERA_REGS = (0x4, 0x5, 0xE)
+# Return address of the driver's idle loop.
+IDLE = 0xFFFF
+
+READ_CYCLES = {
+    "imm": 2,
+    "zp": 3,
+    "zpx": 4,
+    "zpy": 4,
+    "abs": 4,
+    "abx": 4,
+    "aby": 4,
+    "izx": 6,
+    "izy": 5,
+}
+RMW_CYCLES = {
+    "acc": 2,
+    "zp": 5,
+    "zpx": 6,
+    "abs": 6,
+    "abx": 7,
+    "aby": 7,
+    "izx": 8,
+    "izy": 8,
+}
+WRITE_CYCLES = {
+    "zp": 3,
+    "zpx": 4,
+    "zpy": 4,
+    "abs": 4,
+    "abx": 5,
+    "aby": 5,
+    "izx": 6,
+    "izy": 6,
+}
+ALU_MODES = ("imm", "zp", "zpx", "abs", "abx", "aby", "izx", "izy")
+RMW_MODES = ("zp", "zpx", "abs", "abx")
+ILLEGAL_RMW_MODES = ("zp", "zpx", "abs", "abx", "aby", "izx", "izy")
+
+# (mnemonic, cycles by mode, opcodes by mode)
+OPCODE_GROUPS = (
+    (
+        (
+            "adc",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0x69, 0x65, 0x75, 0x6D, 0x7D, 0x79, 0x61, 0x71))),
+        ),
+        (
+            "and",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0x29, 0x25, 0x35, 0x2D, 0x3D, 0x39, 0x21, 0x31))),
+        ),
+        (
+            "cmp",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0xC9, 0xC5, 0xD5, 0xCD, 0xDD, 0xD9, 0xC1, 0xD1))),
+        ),
+        (
+            "eor",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0x49, 0x45, 0x55, 0x4D, 0x5D, 0x59, 0x41, 0x51))),
+        ),
+        (
+            "lda",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0xA9, 0xA5, 0xB5, 0xAD, 0xBD, 0xB9, 0xA1, 0xB1))),
+        ),
+        (
+            "ora",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0x09, 0x05, 0x15, 0x0D, 0x1D, 0x19, 0x01, 0x11))),
+        ),
+        (
+            "sbc",
+            READ_CYCLES,
+            dict(zip(ALU_MODES, (0xE9, 0xE5, 0xF5, 0xED, 0xFD, 0xF9, 0xE1, 0xF1))),
+        ),
+        (
+            "sta",
+            WRITE_CYCLES,
+            dict(zip(ALU_MODES[1:], (0x85, 0x95, 0x8D, 0x9D, 0x99, 0x81, 0x91))),
+        ),
+        (
+            "asl",
+            RMW_CYCLES,
+            dict(zip(("acc",) + RMW_MODES, (0x0A, 0x06, 0x16, 0x0E, 0x1E))),
+        ),
+        (
+            "lsr",
+            RMW_CYCLES,
+            dict(zip(("acc",) + RMW_MODES, (0x4A, 0x46, 0x56, 0x4E, 0x5E))),
+        ),
+        (
+            "rol",
+            RMW_CYCLES,
+            dict(zip(("acc",) + RMW_MODES, (0x2A, 0x26, 0x36, 0x2E, 0x3E))),
+        ),
+        (
+            "ror",
+            RMW_CYCLES,
+            dict(zip(("acc",) + RMW_MODES, (0x6A, 0x66, 0x76, 0x6E, 0x7E))),
+        ),
+        ("dec", RMW_CYCLES, dict(zip(RMW_MODES, (0xC6, 0xD6, 0xCE, 0xDE)))),
+        ("inc", RMW_CYCLES, dict(zip(RMW_MODES, (0xE6, 0xF6, 0xEE, 0xFE)))),
+        ("bit", READ_CYCLES, {"zp": 0x24, "abs": 0x2C}),
+        ("cpx", READ_CYCLES, {"imm": 0xE0, "zp": 0xE4, "abs": 0xEC}),
+        ("cpy", READ_CYCLES, {"imm": 0xC0, "zp": 0xC4, "abs": 0xCC}),
+        (
+            "ldx",
+            READ_CYCLES,
+            {"imm": 0xA2, "zp": 0xA6, "zpy": 0xB6, "abs": 0xAE, "aby": 0xBE},
+        ),
+        (
+            "ldy",
+            READ_CYCLES,
+            {"imm": 0xA0, "zp": 0xA4, "zpx": 0xB4, "abs": 0xAC, "abx": 0xBC},
+        ),
+        ("stx", WRITE_CYCLES, {"zp": 0x86, "zpy": 0x96, "abs": 0x8E}),
+        ("sty", WRITE_CYCLES, {"zp": 0x84, "zpx": 0x94, "abs": 0x8C}),
+        ("jmp", {"abs": 3, "ind": 5}, {"abs": 0x4C, "ind": 0x6C}),
+        ("jsr", {"abs": 6}, {"abs": 0x20}),
+        ("bcc", {"rel": 2}, {"rel": 0x90}),
+        ("bcs", {"rel": 2}, {"rel": 0xB0}),
+        ("beq", {"rel": 2}, {"rel": 0xF0}),
+        ("bmi", {"rel": 2}, {"rel": 0x30}),
+        ("bne", {"rel": 2}, {"rel": 0xD0}),
+        ("bpl", {"rel": 2}, {"rel": 0x10}),
+        ("bvc", {"rel": 2}, {"rel": 0x50}),
+        ("bvs", {"rel": 2}, {"rel": 0x70}),
+        ("brk", {"imp": 7}, {"imp": 0x00}),
+        ("rti", {"imp": 6}, {"imp": 0x40}),
+        ("rts", {"imp": 6}, {"imp": 0x60}),
+        ("pha", {"imp": 3}, {"imp": 0x48}),
+        ("php", {"imp": 3}, {"imp": 0x08}),
+        ("pla", {"imp": 4}, {"imp": 0x68}),
+        ("plp", {"imp": 4}, {"imp": 0x28}),
+        ("clc", {"imp": 2}, {"imp": 0x18}),
+        ("cld", {"imp": 2}, {"imp": 0xD8}),
+        ("cli", {"imp": 2}, {"imp": 0x58}),
+        ("clv", {"imp": 2}, {"imp": 0xB8}),
+        ("sec", {"imp": 2}, {"imp": 0x38}),
+        ("sed", {"imp": 2}, {"imp": 0xF8}),
+        ("sei", {"imp": 2}, {"imp": 0x78}),
+        ("dex", {"imp": 2}, {"imp": 0xCA}),
+        ("dey", {"imp": 2}, {"imp": 0x88}),
+        ("inx", {"imp": 2}, {"imp": 0xE8}),
+        ("iny", {"imp": 2}, {"imp": 0xC8}),
+        ("tax", {"imp": 2}, {"imp": 0xAA}),
+        ("tay", {"imp": 2}, {"imp": 0xA8}),
+        ("tsx", {"imp": 2}, {"imp": 0xBA}),
+        ("txa", {"imp": 2}, {"imp": 0x8A}),
+        ("txs", {"imp": 2}, {"imp": 0x9A}),
+        ("tya", {"imp": 2}, {"imp": 0x98}),
+        ("nop", {"imp": 2}, {"imp": 0xEA}),
+        # Common illegal opcodes.
+        (
+            "lax",
+            READ_CYCLES,
+            {
+                "zp": 0xA7,
+                "zpy": 0xB7,
+                "abs": 0xAF,
+                "aby": 0xBF,
+                "izx": 0xA3,
+                "izy": 0xB3,
+            },
+        ),
+        ("sax", WRITE_CYCLES, {"zp": 0x87, "zpy": 0x97, "abs": 0x8F, "izx": 0x83}),
+        (
+            "dcp",
+            RMW_CYCLES,
+            dict(zip(ILLEGAL_RMW_MODES, (0xC7, 0xD7, 0xCF, 0xDF, 0xDB, 0xC3, 0xD3))),
+        ),
+        (
+            "isc",
+            RMW_CYCLES,
+            dict(zip(ILLEGAL_RMW_MODES, (0xE7, 0xF7, 0xEF, 0xFF, 0xFB, 0xE3, 0xF3))),
+        ),
+        (
+            "slo",
+            RMW_CYCLES,
+            dict(zip(ILLEGAL_RMW_MODES, (0x07, 0x17, 0x0F, 0x1F, 0x1B, 0x03, 0x13))),
+        ),
+        (
+            "rla",
+            RMW_CYCLES,
+            dict(zip(ILLEGAL_RMW_MODES, (0x27, 0x37, 0x2F, 0x3F, 0x3B, 0x23, 0x33))),
+        ),
+        (
+            "sre",
+            RMW_CYCLES,
+            dict(zip(ILLEGAL_RMW_MODES, (0x47, 0x57, 0x4F, 0x5F, 0x5B, 0x43, 0x53))),
+        ),
+        (
+            "rra",
+            RMW_CYCLES,
+            dict(zip(ILLEGAL_RMW_MODES, (0x67, 0x77, 0x6F, 0x7F, 0x7B, 0x63, 0x73))),
+        ),
+        ("anc", READ_CYCLES, {"imm": 0x0B}),
+        ("anc", READ_CYCLES, {"imm": 0x2B}),
+        ("alr", READ_CYCLES, {"imm": 0x4B}),
+        ("arr", READ_CYCLES, {"imm": 0x6B}),
+        ("sbx", READ_CYCLES, {"imm": 0xCB}),
+        ("sbc", READ_CYCLES, {"imm": 0xEB}),
+    )
+    + tuple(
+        ("nop", {"imp": 2}, {"imp": opcode})
+        for opcode in (0x1A, 0x3A, 0x5A, 0x7A, 0xDA, 0xFA)
+    )
+    + tuple(
+        ("nop", READ_CYCLES, {mode: opcode})
+        for mode, opcodes in (
+            ("imm", (0x80, 0x82, 0x89, 0xC2, 0xE2)),
+            ("zp", (0x04, 0x44, 0x64)),
+            ("zpx", (0x14, 0x34, 0x54, 0x74, 0xD4, 0xF4)),
+            ("abs", (0x0C,)),
+            ("abx", (0x1C, 0x3C, 0x5C, 0x7C, 0xDC, 0xFC)),
+        )
+        for opcode in opcodes
+    )
+)
+
+
+class Cpu6502:
+    # NMOS 6502 core over a flat 64K RAM; subclasses override read/write.
+
+    def __init__(self):
+        self.ram = bytearray(0x10000)
+        self.a = 0
+        self.x = 0
+        self.y = 0
+        self.sp = 0xFF
+        self.pc = 0
+        self.n = 0
+        self.v = 0
+        self.d = 0
+        self.i = 0
+        self.z = 0
+        self.c = 0
+        self.cycles = 0
+        self.instructions = 0
+        self.jammed = None
+        self.ops = [(self.op_jam, self.m_imp, 0)] * 256
+        for mnemonic, cycles, opcodes in OPCODE_GROUPS:
+            op = getattr(self, "op_" + mnemonic)
+            for mode, opcode in opcodes.items():
+                self.ops[opcode] = (op, getattr(self, "m_" + mode), cycles[mode])
+
+    def read(self, addr):
+        return self.ram[addr]
+
+    def write(self, addr, val):
+        self.ram[addr] = val
+
+    def tick(self, cycles):
+        self.cycles += cycles
+
+    def step(self):
+        pc = self.pc
+        op, mode, cycles = self.ops[self.read(pc)]
+        self.pc = (pc + 1) & 0xFFFF
+        op(mode())
+        self.instructions += 1
+        self.tick(cycles)
+
+    def get_p(self, brk=0x10):
+        return (
+            (self.n << 7)
+            | (self.v << 6)
+            | 0x20
+            | brk
+            | (self.d << 3)
+            | (self.i << 2)
+            | (self.z << 1)
+            | self.c
+        )
+
+    def set_p(self, p):
+        self.n = p >> 7
+        self.v = (p >> 6) & 1
+        self.d = (p >> 3) & 1
+        self.i = (p >> 2) & 1
+        self.z = (p >> 1) & 1
+        self.c = p & 1
+
+    def set_nz(self, val):
+        self.n = val >> 7
+        self.z = int(val == 0)
+        return val
+
+    def push(self, val):
+        self.ram[0x100 + self.sp] = val
+        self.sp = (self.sp - 1) & 0xFF
+
+    def pull(self):
+        self.sp = (self.sp + 1) & 0xFF
+        return self.ram[0x100 + self.sp]
+
+    def push_word(self, val):
+        self.push(val >> 8)
+        self.push(val & 0xFF)
+
+    def pull_word(self):
+        lo = self.pull()
+        return lo | (self.pull() << 8)
+
+    def read_word(self, addr):
+        return self.read(addr) | (self.read((addr + 1) & 0xFFFF) << 8)
+
+    def interrupt(self, vector, brk=0):
+        self.push_word(self.pc)
+        self.push(self.get_p(brk))
+        self.i = 1
+        self.pc = self.read_word(vector)
+
+    # Addressing modes, returning the effective address.
+
+    def m_imp(self):
+        return None
+
+    def m_acc(self):
+        return None
+
+    def m_imm(self):
+        addr = self.pc
+        self.pc = (addr + 1) & 0xFFFF
+        return addr
+
+    def m_zp(self):
+        addr = self.read(self.pc)
+        self.pc = (self.pc + 1) & 0xFFFF
+        return addr
+
+    def m_zpx(self):
+        return (self.m_zp() + self.x) & 0xFF
+
+    def m_zpy(self):
+        return (self.m_zp() + self.y) & 0xFF
+
+    def m_abs(self):
+        addr = self.read_word(self.pc)
+        self.pc = (self.pc + 2) & 0xFFFF
+        return addr
+
+    def m_abx(self):
+        return (self.m_abs() + self.x) & 0xFFFF
+
+    def m_aby(self):
+        return (self.m_abs() + self.y) & 0xFFFF
+
+    def m_ind(self):
+        ptr = self.m_abs()
+        # page wrap bug.
+        return self.read(ptr) | (self.read((ptr & 0xFF00) | ((ptr + 1) & 0xFF)) << 8)
+
+    def m_izx(self):
+        ptr = self.m_zpx()
+        return self.ram[ptr] | (self.ram[(ptr + 1) & 0xFF] << 8)
+
+    def m_izy(self):
+        ptr = self.m_zp()
+        return ((self.ram[ptr] | (self.ram[(ptr + 1) & 0xFF] << 8)) + self.y) & 0xFFFF
+
+    def m_rel(self):
+        offset = self.read(self.pc)
+        self.pc = (self.pc + 1) & 0xFFFF
+        if offset & 0x80:
+            offset -= 0x100
+        return (self.pc + offset) & 0xFFFF
+
+    # Read-modify-write helpers.
+
+    def rmw(self, addr, func):
+        if addr is None:
+            self.a = func(self.a)
+            return self.a
+        val = self.read(addr)
+        # NMOS writes the unmodified value first.
+        self.write(addr, val)
+        val = func(val)
+        self.write(addr, val)
+        return val
+
+    def _asl(self, val):
+        self.c = val >> 7
+        return self.set_nz((val << 1) & 0xFF)
+
+    def _lsr(self, val):
+        self.c = val & 1
+        return self.set_nz(val >> 1)
+
+    def _rol(self, val):
+        carry = self.c
+        self.c = val >> 7
+        return self.set_nz(((val << 1) & 0xFF) | carry)
+
+    def _ror(self, val):
+        carry = self.c
+        self.c = val & 1
+        return self.set_nz((val >> 1) | (carry << 7))
+
+    def _inc(self, val):
+        return self.set_nz((val + 1) & 0xFF)
+
+    def _dec(self, val):
+        return self.set_nz((val - 1) & 0xFF)
+
+    def _adc(self, val):
+        a = self.a
+        result = a + val + self.c
+        if self.d:
+            lo = (a & 0xF) + (val & 0xF) + self.c
+            hi = (a >> 4) + (val >> 4)
+            if lo > 9:
+                lo += 6
+            if lo > 0xF:
+                hi += 1
+            self.z = int(result & 0xFF == 0)
+            self.n = (hi >> 3) & 1
+            self.v = int(bool(~(a ^ val) & (a ^ (hi << 4)) & 0x80))
+            if hi > 9:
+                hi += 6
+            self.c = int(hi > 0xF)
+            self.a = ((hi << 4) | (lo & 0xF)) & 0xFF
+            return
+        self.v = int(bool(~(a ^ val) & (a ^ result) & 0x80))
+        self.c = result >> 8
+        self.a = self.set_nz(result & 0xFF)
+
+    def _sbc(self, val):
+        if self.d:
+            a = self.a
+            borrow = 1 - self.c
+            result = a - val - borrow
+            lo = (a & 0xF) - (val & 0xF) - borrow
+            hi = (a >> 4) - (val >> 4)
+            if lo & 0x10:
+                lo -= 6
+                hi -= 1
+            if hi & 0x10:
+                hi -= 6
+            self.set_nz(result & 0xFF)
+            self.v = int(bool((a ^ val) & (a ^ result) & 0x80))
+            self.c = int(result >= 0)
+            self.a = ((hi << 4) | (lo & 0xF)) & 0xFF
+            return
+        self._adc(val ^ 0xFF)
+
+    def _cmp(self, reg, val):
+        self.c = int(reg >= val)
+        self.set_nz((reg - val) & 0xFF)
+
+    def branch(self, addr):
+        self.pc = addr
+        self.tick(1)
+
+    # Official opcodes.
+
+    def op_adc(self, addr):
+        self._adc(self.read(addr))
+
+    def op_sbc(self, addr):
+        self._sbc(self.read(addr))
+
+    def op_and(self, addr):
+        self.a = self.set_nz(self.a & self.read(addr))
+
+    def op_ora(self, addr):
+        self.a = self.set_nz(self.a | self.read(addr))
+
+    def op_eor(self, addr):
+        self.a = self.set_nz(self.a ^ self.read(addr))
+
+    def op_cmp(self, addr):
+        self._cmp(self.a, self.read(addr))
+
+    def op_cpx(self, addr):
+        self._cmp(self.x, self.read(addr))
+
+    def op_cpy(self, addr):
+        self._cmp(self.y, self.read(addr))
+
+    def op_bit(self, addr):
+        val = self.read(addr)
+        self.z = int(self.a & val == 0)
+        self.n = val >> 7
+        self.v = (val >> 6) & 1
+
+    def op_lda(self, addr):
+        self.a = self.set_nz(self.read(addr))
+
+    def op_ldx(self, addr):
+        self.x = self.set_nz(self.read(addr))
+
+    def op_ldy(self, addr):
+        self.y = self.set_nz(self.read(addr))
+
+    def op_sta(self, addr):
+        self.write(addr, self.a)
+
+    def op_stx(self, addr):
+        self.write(addr, self.x)
+
+    def op_sty(self, addr):
+        self.write(addr, self.y)
+
+    def op_asl(self, addr):
+        self.rmw(addr, self._asl)
+
+    def op_lsr(self, addr):
+        self.rmw(addr, self._lsr)
+
+    def op_rol(self, addr):
+        self.rmw(addr, self._rol)
+
+    def op_ror(self, addr):
+        self.rmw(addr, self._ror)
+
+    def op_inc(self, addr):
+        self.rmw(addr, self._inc)
+
+    def op_dec(self, addr):
+        self.rmw(addr, self._dec)
+
+    def op_jmp(self, addr):
+        self.pc = addr
+
+    def op_jsr(self, addr):
+        self.push_word((self.pc - 1) & 0xFFFF)
+        self.pc = addr
+
+    def op_rts(self, _addr):
+        self.pc = (self.pull_word() + 1) & 0xFFFF
+
+    def op_rti(self, _addr):
+        self.set_p(self.pull())
+        self.pc = self.pull_word()
+
+    def op_brk(self, _addr):
+        self.pc = (self.pc + 1) & 0xFFFF
+        self.interrupt(0xFFFE, brk=0x10)
+
+    def op_bcc(self, addr):
+        if not self.c:
+            self.branch(addr)
+
+    def op_bcs(self, addr):
+        if self.c:
+            self.branch(addr)
+
+    def op_bne(self, addr):
+        if not self.z:
+            self.branch(addr)
+
+    def op_beq(self, addr):
+        if self.z:
+            self.branch(addr)
+
+    def op_bpl(self, addr):
+        if not self.n:
+            self.branch(addr)
+
+    def op_bmi(self, addr):
+        if self.n:
+            self.branch(addr)
+
+    def op_bvc(self, addr):
+        if not self.v:
+            self.branch(addr)
+
+    def op_bvs(self, addr):
+        if self.v:
+            self.branch(addr)
+
+    def op_pha(self, _addr):
+        self.push(self.a)
+
+    def op_php(self, _addr):
+        self.push(self.get_p())
+
+    def op_pla(self, _addr):
+        self.a = self.set_nz(self.pull())
+
+    def op_plp(self, _addr):
+        self.set_p(self.pull())
+
+    def op_clc(self, _addr):
+        self.c = 0
+
+    def op_cld(self, _addr):
+        self.d = 0
+
+    def op_cli(self, _addr):
+        self.i = 0
+
+    def op_clv(self, _addr):
+        self.v = 0
+
+    def op_sec(self, _addr):
+        self.c = 1
+
+    def op_sed(self, _addr):
+        self.d = 1
+
+    def op_sei(self, _addr):
+        self.i = 1
+
+    def op_dex(self, _addr):
+        self.x = self.set_nz((self.x - 1) & 0xFF)
+
+    def op_dey(self, _addr):
+        self.y = self.set_nz((self.y - 1) & 0xFF)
+
+    def op_inx(self, _addr):
+        self.x = self.set_nz((self.x + 1) & 0xFF)
+
+    def op_iny(self, _addr):
+        self.y = self.set_nz((self.y + 1) & 0xFF)
+
+    def op_tax(self, _addr):
+        self.x = self.set_nz(self.a)
+
+    def op_tay(self, _addr):
+        self.y = self.set_nz(self.a)
+
+    def op_tsx(self, _addr):
+        self.x = self.set_nz(self.sp)
+
+    def op_txa(self, _addr):
+        self.a = self.set_nz(self.x)
+
+    def op_txs(self, _addr):
+        self.sp = self.x
+
+    def op_tya(self, _addr):
+        self.a = self.set_nz(self.y)
+
+    def op_nop(self, addr):
+        if addr is not None:
+            self.read(addr)
+
+    # Illegal opcodes.
+
+    def op_jam(self, _addr):
+        self.pc = (self.pc - 1) & 0xFFFF
+        self.jammed = self.read(self.pc)
+
+    def op_lax(self, addr):
+        self.a = self.x = self.set_nz(self.read(addr))
+
+    def op_sax(self, addr):
+        self.write(addr, self.a & self.x)
+
+    def op_dcp(self, addr):
+        self._cmp(self.a, self.rmw(addr, lambda val: (val - 1) & 0xFF))
+
+    def op_isc(self, addr):
+        self._sbc(self.rmw(addr, lambda val: (val + 1) & 0xFF))
+
+    def op_slo(self, addr):
+        self.a = self.set_nz(self.a | self.rmw(addr, self._asl))
+
+    def op_rla(self, addr):
+        self.a = self.set_nz(self.a & self.rmw(addr, self._rol))
+
+    def op_sre(self, addr):
+        self.a = self.set_nz(self.a ^ self.rmw(addr, self._lsr))
+
+    def op_rra(self, addr):
+        self._adc(self.rmw(addr, self._ror))
+
+    def op_anc(self, addr):
+        self.op_and(addr)
+        self.c = self.n
+
+    def op_alr(self, addr):
+        self.a &= self.read(addr)
+        self.a = self._lsr(self.a)
+
+    def op_arr(self, addr):
+        self.a &= self.read(addr)
+        self.a = self.set_nz((self.a >> 1) | (self.c << 7))
+        self.c = (self.a >> 6) & 1
+        self.v = self.c ^ ((self.a >> 5) & 1)
+
+    def op_sbx(self, addr):
+        result = (self.a & self.x) - self.read(addr)
+        self.c = int(result >= 0)
+        self.x = self.set_nz(result & 0xFF)
+
+
+def kernal_stub():
+    kernal = bytearray([0x60] * 0x2000)
+
+    def poke(addr, code):
+        kernal[addr - 0xE000 : addr - 0xE000 + len(code)] = bytes(code)
+
+    # IRQ entry: save registers, dispatch via $0316 (BRK) or $0314 (IRQ).
+    poke(
+        0xFF48,
+        (0x48, 0x8A, 0x48, 0x98, 0x48, 0xBA, 0xBD, 0x04, 0x01, 0x29)
+        + (0x10, 0xF0, 0x03, 0x6C, 0x16, 0x03, 0x6C, 0x14, 0x03),
+    )
+    # $EA31: default IRQ handler, acknowledge CIA1 and return via $EA81.
+    poke(0xEA31, (0x4C, 0x7E, 0xEA))
+    poke(0xEA7E, (0xAD, 0x0D, 0xDC, 0x68, 0xA8, 0x68, 0xAA, 0x68, 0x40))
+    # NMI entry, and NMI/BRK defaults.
+    poke(0xFE43, (0x78, 0x6C, 0x18, 0x03))
+    poke(0xFE47, (0x40,))
+    poke(0xFE66, (0x02,))
+    poke(0xFFFA, (0x43, 0xFE, 0xE2, 0xFC, 0x48, 0xFF))
+    return kernal
+
+
+class C64(Cpu6502):
+    # RAM with banked KERNAL stub and I/O. BASIC and character ROMs are not
+    # emulated (RAM is seen instead), nor is CIA2, whose NMIs are ignored.
+
+    def __init__(self, pal=True):
+        super().__init__()
+        self.pal = pal
+        self.raster_lines, self.raster_cycles = PAL_RASTER if pal else NTSC_RASTER
+        self.frame_cycles = self.raster_lines * self.raster_cycles
+        self.kernal = kernal_stub()
+        self.io = bytearray(0x1000)
+        self.kernal_in = True
+        self.io_in = True
+        self.cia_latch = 0xFFFF
+        self.cia_counter = 0xFFFF
+        self.cia_ctrl = 0
+        self.cia_icr = 0
+        self.cia_mask = 0
+        self.vic_irq = 0
+        self.vic_mask = 0
+        self.irq = False
+        self.play_address = 0
+        self.play_bank = None
+        self.in_call = False
+        self.cia_writes = []
+        self.ram[0] = 0x2F
+        self.write(1, 0x37)
+        # default IRQ/BRK/NMI vectors.
+        self.ram[0x314:0x31A] = bytes((0x31, 0xEA, 0x66, 0xFE, 0x47, 0xFE))
+        self.ram[0x2A6] = int(pal)
+
+    def set_port(self):
+        port = self.ram[1] & 7
+        self.kernal_in = bool(port & 2)
+        self.io_in = bool(port & 3) and bool(port & 4)
+
+    def update_irq(self):
+        self.irq = bool(
+            (self.cia_icr & self.cia_mask & 0x1F)
+            or (self.vic_irq & self.vic_mask & 0xF)
+        )
+
+    def raster(self):
+        return (self.cycles // self.raster_cycles) % self.raster_lines
+
+    def raster_compare(self):
+        return self.io[0x12] | ((self.io[0x11] & 0x80) << 1)
+
+    def read(self, addr):
+        if addr < 0xD000:
+            return self.ram[addr]
+        if addr >= 0xE000:
+            if self.kernal_in:
+                return self.kernal[addr - 0xE000]
+            return self.ram[addr]
+        if self.io_in:
+            return self.io_read(addr)
+        return self.ram[addr]
+
+    def write(self, addr, val):
+        if 0xD000 <= addr < 0xE000 and self.io_in:
+            # not writes to the RAM under I/O.
+            if 0xDC00 <= addr < 0xDD00 and addr & 0xF in CIA1_TIMERA_REGS:
+                self.cia_writes.append((addr & 0xF, val))
+            self.io_write(addr, val)
+            return
+        self.ram[addr] = val
+        if addr == 1:
+            self.set_port()
+
+    def io_read(self, addr):
+        if addr < 0xD400:
+            reg = addr & 0x3F
+            if reg == 0x11:
+                return (self.io[reg] & 0x7F) | ((self.raster() >> 1) & 0x80)
+            if reg == 0x12:
+                return self.raster() & 0xFF
+            if reg == 0x19:
+                irq = self.vic_irq & self.vic_mask & 0xF
+                return 0x70 | self.vic_irq | (0x80 if irq else 0)
+            return self.io[reg]
+        if 0xDC00 <= addr < 0xDD00:
+            reg = addr & 0xF
+            if reg == 4:
+                return self.cia_counter & 0xFF
+            if reg == 5:
+                return self.cia_counter >> 8
+            if reg == 0xD:
+                icr = self.cia_icr
+                if icr & self.cia_mask & 0x1F:
+                    icr |= 0x80
+                self.cia_icr = 0
+                self.update_irq()
+                return icr
+            if reg == 0xE:
+                return self.cia_ctrl & 0xEF
+            return self.io[0xC00 + reg]
+        return self.io[addr - 0xD000]
+
+    def io_write(self, addr, val):
+        if addr < 0xD400:
+            reg = addr & 0x3F
+            if reg == 0x19:
+                self.vic_irq &= ~val & 0xF
+                self.update_irq()
+            elif reg == 0x1A:
+                self.vic_mask = val & 0xF
+                self.update_irq()
+            self.io[reg] = val
+            return
+        if 0xDC00 <= addr < 0xDD00:
+            reg = addr & 0xF
+            if reg == 4:
+                self.cia_latch = (self.cia_latch & 0xFF00) | val
+            elif reg == 5:
+                self.cia_latch = (self.cia_latch & 0xFF) | (val << 8)
+                if not self.cia_ctrl & 1:
+                    self.cia_counter = self.cia_latch
+            elif reg == 0xD:
+                if val & 0x80:
+                    self.cia_mask |= val & 0x1F
+                else:
+                    self.cia_mask &= ~val & 0x1F
+                self.update_irq()
+            elif reg == 0xE:
+                if val & 0x10:
+                    self.cia_counter = self.cia_latch
+                self.cia_ctrl = val & 0xEF
+            self.io[0xC00 + reg] = val
+            return
+        self.io[addr - 0xD000] = val
+
+    def tick(self, cycles):
+        before = self.cycles
+        self.cycles += cycles
+        if self.cia_ctrl & 1:
+            self.cia_counter -= cycles
+            if self.cia_counter < 0:
+                self.cia_icr |= 1
+                if self.cia_ctrl & 8:
+                    self.cia_ctrl &= 0xFE
+                    self.cia_counter = self.cia_latch
+                else:
+                    overrun = (-self.cia_counter - 1) % (self.cia_latch + 1)
+                    self.cia_counter = self.cia_latch - overrun
+                self.update_irq()
+        if self.vic_mask & 1:
+            target = self.raster_compare() * self.raster_cycles
+            frame_before = before % self.frame_cycles
+            frame_after = frame_before + cycles
+            if (
+                frame_before < target <= frame_after
+                or target <= frame_after - self.frame_cycles
+            ):
+                self.vic_irq |= 1
+                self.update_irq()
+
+    def next_event(self):
+        # cycles until the next possible interrupt, if any.
+        events = []
+        if self.cia_ctrl & 1 and self.cia_mask & 1:
+            events.append(self.cia_counter + 1)
+        if self.vic_mask & 1:
+            target = self.raster_compare() * self.raster_cycles
+            events.append(
+                (target - self.cycles % self.frame_cycles - 1) % self.frame_cycles + 1
+            )
+        if events:
+            return min(events)
+        return None
+
+    def call(self, addr, bank):
+        if bank is not None:
+            self.write(1, bank)
+        self.push_word(IDLE - 1)
+        self.pc = addr
+
+    def run(self, max_cycles):
+        while self.cycles < max_cycles and self.jammed is None:
+            if self.pc == IDLE:
+                if self.in_call:
+                    # init or play returned, as RTI from the driver.
+                    self.in_call = False
+                    self.i = 0
+                if not (self.irq and not self.i):
+                    idle_cycles = self.next_event()
+                    if idle_cycles is None:
+                        break
+                    self.tick(min(idle_cycles, max_cycles - self.cycles))
+                    continue
+                if self.play_address:
+                    # driver IRQ handler: acknowledge and call play.
+                    self.io_read(0xDC0D)
+                    self.vic_irq = 0
+                    self.update_irq()
+                    self.in_call = True
+                    self.i = 1
+                    self.call(self.play_address, self.play_bank)
+                    continue
+            if self.irq and not self.i:
+                self.interrupt(0xFFFE)
+                self.tick(7)
+            self.step()
+
+    def start_cia_timer(self):
+        # as KERNAL IOINIT/the PSID driver. Set directly rather than with write(),
+        # so that cia_writes has only the tune's own writes.
+        timer = PAL_CIA_TIMER if self.pal else NTSC_CIA_TIMER
+        self.io_write(0xDC0D, 0x81)
+        self.io_write(0xDC04, timer & 0xFF)
+        self.io_write(0xDC05, timer >> 8)
+        self.io_write(0xDC0E, 0x11)
+
+
+def psid_bank(addr):
+    if addr < 0xA000:
+        return 0x37
+    if addr < 0xD000:
+        return 0x36
+    if addr >= 0xE000:
+        return 0x35
+    return 0x34
+
+
+def run_sid(data, load_address, init_address, play_address, song, rsid, pal, seconds):
+    if not load_address:
+        load_address = data[0] | (data[1] << 8)
+        data = data[2:]
+    if not init_address:
+        init_address = load_address
+    c64 = C64(pal=pal)
+    c64.ram[load_address : load_address + len(data)] = data[: 0x10000 - load_address]
+    c64.start_cia_timer()
+    if rsid:
+        init_bank = None
+    else:
+        init_bank = psid_bank(init_address)
+        c64.play_address = play_address
+        if play_address:
+            c64.play_bank = psid_bank(play_address)
+        c64.i = 1
+    c64.a = song - 1
+    c64.in_call = True
+    c64.call(init_address, init_bank)
+    c64.run(seconds * (PAL_CLOCK if pal else NTSC_CLOCK))
+    return c64
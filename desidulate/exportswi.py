@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Export Sid Wizard instrument tables for SSFs in a (merged) SSF store, to one
+# zip library with a <hashid>.swi.txt per SSF, and index.csv. The store is read
+# EXPORT_ROWS rows at a time, and at most two batches per worker are in flight.
+
+import argparse
+import concurrent.futures
+import io
+import logging
+import multiprocessing
+import re
+import zipfile
+import numpy as np
+import pandas as pd
+from desidulate.sidlib import control_label, timer_args, unique_control_labels
+from desidulate.sidwrap import get_sid
+from desidulate.ssf2swi import print_swi, ssf_swi
+
+EXPORT_ROWS = int(1e6)
+EXPORT_BATCH = 256
+EXPORT_WORKERS = max(1, multiprocessing.cpu_count())
+LABEL_COLS = ["control", "control_label", "unique_control_labels"]
+
+
+def store_chunks(store, chunk_rows=EXPORT_ROWS):
+    # yields chunks of whole SSFs (rows for a hashid are contiguous in a store).
+    tail = None
+    with pd.read_csv(store, dtype=pd.Int64Dtype(), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            if chunk.empty:
+                continue
+            if tail is not None:
+                chunk = pd.concat([tail, chunk], ignore_index=True)
+            last = chunk["hashid"] == chunk["hashid"].iat[-1]
+            tail = chunk[last]
+            if not last.all():
+                yield chunk[~last]
+    if tail is not None:
+        yield tail
+
+
+def export_candidates(df, min_count=1, pr_speeds=None, label=None):
+    df = unique_control_labels(control_label(df))
+    first_df = df.drop_duplicates("hashid")
+    keep = np.ones(len(first_df), dtype=bool)
+    if "count" in first_df.columns:
+        keep &= first_df["count"].fillna(0).to_numpy() >= min_count
+    if pr_speeds:
+        keep &= first_df["pr_speed"].isin(pr_speeds).to_numpy()
+    if label:
+        label_re = re.compile(label)
+        keep &= np.array(
+            [
+                bool(label_re.search(labels))
+                for labels in first_df["unique_control_labels"]
+            ]
+        )
+    return df[df["hashid"].isin(first_df["hashid"][keep])]
+
+
+def export_batches(store, batch=EXPORT_BATCH, chunk_rows=EXPORT_ROWS, **filters):
+    for chunk in store_chunks(store, chunk_rows=chunk_rows):
+        df = export_candidates(chunk, **filters)
+        if df.empty:
+            continue
+        hashids = df["hashid"].to_numpy(dtype=np.int64)
+        ssfs = np.cumsum(np.diff(hashids, prepend=hashids[:1] - 1) != 0) - 1
+        for _, batch_df in df.groupby(ssfs // batch, sort=True):
+            yield batch_df
+
+
+def export_batch(pal, cia, batch_df):
+    # returns [(index row, swi text)] for each SSF in batch_df.
+    sid = get_sid(pal, cia)
+    exported = []
+    for hashid, ssf_df in batch_df.groupby("hashid", sort=False):
+        first_row = ssf_df.iloc[0]
+        pr_speed, adsr, sw_df, swi_df = ssf_swi(sid, ssf_df.drop(LABEL_COLS, axis=1))
+        swi_f = io.StringIO()
+        print_swi(pr_speed, adsr, sw_df, swi_df, file=swi_f)
+        index_row = {
+            "hashid": hashid,
+            "count": first_row.get("count", pd.NA),
+            "pr_speed": pr_speed,
+            "labels": first_row["unique_control_labels"],
+            "adsr": adsr,
+        }
+        exported.append((index_row, swi_f.getvalue()))
+    return exported
+
+
+def export_swis(
+    store,
+    library,
+    pal=True,
+    cia=0,
+    workers=EXPORT_WORKERS,
+    batch=EXPORT_BATCH,
+    chunk_rows=EXPORT_ROWS,
+    **filters
+):
+    index_rows = []
+    with zipfile.ZipFile(
+        library, "w", compression=zipfile.ZIP_DEFLATED
+    ) as library_zip, concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+
+        def write_exported(futures):
+            for future in futures:
+                for index_row, swi_text in future.result():
+                    library_zip.writestr("%d.swi.txt" % index_row["hashid"], swi_text)
+                    index_rows.append(index_row)
+
+        pending = set()
+        for batch_df in export_batches(
+            store, batch=batch, chunk_rows=chunk_rows, **filters
+        ):
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                write_exported(done)
+            pending.add(executor.submit(export_batch, pal, cia, batch_df))
+        write_exported(concurrent.futures.wait(pending).done)
+        index_df = pd.DataFrame(
+            index_rows, columns=["hashid", "count", "pr_speed", "labels", "adsr"]
+        ).sort_values("hashid")
+        library_zip.writestr("index.csv", index_df.to_csv(index=False))
+    logging.info("exported %u instruments to %s", len(index_rows), library)
+    return len(index_rows)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Export Sid Wizard instruments from an SSF store to a zip library"
+    )
+    parser.add_argument("store", help="(merged) SSF store to read")
+    parser.add_argument("--library", default="swi.zip", help="zip library to write")
+    parser.add_argument(
+        "--min_count", default=1, type=int, help="export only SSFs used this often"
+    )
+    parser.add_argument(
+        "--pr_speed",
+        default=[],
+        type=int,
+        action="append",
+        help="export only SSFs with this pr_speed (may be repeated)",
+    )
+    parser.add_argument(
+        "--label",
+        default=None,
+        help="export only SSFs with control labels matching regex",
+    )
+    parser.add_argument(
+        "--workers", default=EXPORT_WORKERS, type=int, help="export processes"
+    )
+    parser.add_argument(
+        "--batch", default=EXPORT_BATCH, type=int, help="SSFs per export task"
+    )
+    parser.add_argument(
+        "--chunk_rows",
+        default=EXPORT_ROWS,
+        type=int,
+        help="store rows to hold in memory at once",
+    )
+    timer_args(parser)
+    args = parser.parse_args()
+
+    export_swis(
+        args.store,
+        args.library,
+        pal=args.pal,
+        cia=args.cia,
+        workers=args.workers,
+        batch=args.batch,
+        chunk_rows=args.chunk_rows,
+        min_count=args.min_count,
+        pr_speeds=args.pr_speed,
+        label=args.label,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,62 @@
 
 ## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
 
+import json
+import operator
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+FILTER_OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    ">=": operator.ge,
+    ">": operator.gt,
+}
 
 
 def read_csv(*args, **kwargs):
     return pd.read_csv(*args, **kwargs, engine="pyarrow")
 
 
+def read_int_columns(path, columns, filters=None):
+    # read only columns, and only rows matching all (column, op, value) filters,
+    # from parquet or (compressed) CSV. Missing columns are all NA.
+    expression = None
+    for col, op, val in filters or []:
+        col_expression = FILTER_OPS[op](ds.field(col), val)
+        expression = (
+            col_expression if expression is None else expression & col_expression
+        )
+    if path.endswith(".parquet"):
+        file_columns = set(pq.read_schema(path).names)
+        table = pq.read_table(
+            path,
+            columns=[col for col in columns if col in file_columns],
+            filters=expression,
+        )
+    else:
+        reader = pa_csv.open_csv(
+            pa.input_stream(path, compression="detect"),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={col: pa.int64() for col in columns},
+                include_columns=columns,
+                include_missing_columns=True,
+            ),
+        )
+        batches = [
+            batch if expression is None else batch.filter(expression)
+            for batch in reader
+        ]
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+    df = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    return df.reindex(columns=columns).astype(pd.Int64Dtype())
+
+
 def out_path(snd_log_name, new_ext):
     snd_log_name = os.path.expanduser(snd_log_name)
     base = os.path.basename(snd_log_name)
@@ -25,6 +73,10 @@ def out_path(snd_log_name, new_ext):
         "txt",
         "ssf",
         "index_ssf",
+        "ssf_groups",
+        "ssf_index",
+        "json",
+        "parquet",
     }
     while True:
         dot = base.rfind(".")
@@ -47,3 +99,24 @@ def wav_path(snd_log_name, hashid=None):
     if hashid:
         return out_path(snd_log_name, "%d.wav" % hashid)
     return out_path(snd_log_name, "wav")
+
+
+def timings_path(snd_log_name):
+    return out_path(snd_log_name, "timings.json")
+
+
+def read_timings(snd_log_name):
+    # recorded {stage: {"time": seconds, "bytes": input bytes}}, if any.
+    try:
+        with open(timings_path(snd_log_name), encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_timings(snd_log_name, stage_timings):
+    # update, rather than replace, so skipped stages keep their last timing.
+    timings = read_timings(snd_log_name)
+    timings.update(stage_timings)
+    with open(timings_path(snd_log_name), "w", encoding="utf8") as f:
+        json.dump(timings, f)
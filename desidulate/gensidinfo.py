@@ -9,144 +9,212 @@
 import argparse
 import csv
 import hashlib
-import json
 import logging
 import multiprocessing
 import os
 import pathlib
-import re
 import random
+import sqlite3
 import concurrent.futures
-import numpy as np
-import pandas as pd
 
-from desidulate.sidinfo import sidinfo
+from desidulate.songlengths import songlengths_index
+from desidulate.sidinfo import sidinfo, emulate_cia_timer, scrape_cia_timer
 
-MAX_WORKERS = int(multiprocessing.cpu_count() / 2)
-UNKNOWNS = pd.DataFrame([{"val": val} for val in ("<?>", "UNKNOWN")])
-tunename_re = re.compile(r"^; (.+.sid)$")
-tunelength_re = re.compile(r"([a-z\d]+)=([\d+\s+\:\.]+)$")
-tunelength_time_re = re.compile(r"(\d+)\:(\d+)\.*(\d*)$")
+MAX_WORKERS = max(1, int(multiprocessing.cpu_count() / 2))
+UNKNOWNS = frozenset(("<?>", "UNKNOWN"))
+# sidinfo() results, in output order.
+SONG_COLUMNS = (
+    ("magicID", "TEXT"),
+    ("version", "INTEGER"),
+    ("dataOffset", "INTEGER"),
+    ("loadAddress", "INTEGER"),
+    ("initAddress", "INTEGER"),
+    ("playAddress", "INTEGER"),
+    ("songs", "INTEGER"),
+    ("startSong", "INTEGER"),
+    ("speed", "TEXT"),
+    ("name", "TEXT"),
+    ("author", "TEXT"),
+    ("released", "TEXT"),
+    ("binformat", "TEXT"),
+    ("psidSpecific", "TEXT"),
+    ("clock", "TEXT"),
+    ("sidmodel", "TEXT"),
+    ("sidmodel2", "TEXT"),
+    ("sidmodel3", "TEXT"),
+    ("startPage", "INTEGER"),
+    ("pageLength", "INTEGER"),
+    ("secondSIDAddress", "INTEGER"),
+    ("thirdSIDAddress", "INTEGER"),
+    ("pal", "INTEGER"),
+    ("sids", "INTEGER"),
+    ("cia", "INTEGER"),
+    ("song", "INTEGER"),
+)
+SONG_COLUMN_NAMES = tuple(col for col, _ in SONG_COLUMNS)
+# commit scraped songs every SCRAPE_BATCH sidfiles.
+SCRAPE_BATCH = 64
 
 
-def scrape_sidinfo(i, sidfile, tunelengths, cache):
-    logging.info("scraping %u: %s", i, sidfile)
-    sidinfo_file = str(sidfile)
-    sidinfo_file = sidinfo_file[: sidinfo_file.rfind(".")]
-    sidinfo_file = (
-        os.path.join(sidinfo_file, os.path.basename(sidinfo_file)) + ".sidinfo"
+def scrape_sidinfo(i, path, md5_hash, cia_probe=emulate_cia_timer):
+    logging.info("scraping %u: %s", i, path)
+    results = sidinfo(path, cia_probe)
+    logging.info("%s: %s", path, results)
+    return (md5_hash, results)
+
+
+def file_md5(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def open_sidinfo_db(db_path):
+    db = sqlite3.connect(db_path)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS files "
+        "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+        "mtime REAL NOT NULL, md5 TEXT NOT NULL)"
     )
-    sidinfo_dir = os.path.dirname(sidinfo_file)
-    if not os.path.exists(sidinfo_dir):
-        os.makedirs(sidinfo_dir)
-    if not os.path.exists(sidinfo_file) or not cache:
-        with open(sidfile, "rb") as f:
-            md5_hash = hashlib.md5(f.read()).hexdigest()
-        results = []
-        path = str(os.path.normpath(sidfile))
-        mtime = sidfile.stat().st_mtime
-        for result in sidinfo(path):
-            result.update(
-                {
-                    "path": path,
-                    "mtime": mtime,
-                    "md5": md5_hash,
-                    "length": tunelengths[result["song"]],
-                }
-            )
-            results.append(result)
-        sidinfo_file_tmp = sidinfo_file.replace(
-            os.path.basename(sidinfo_file), "." + os.path.basename(sidinfo_file)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS songs (md5 TEXT NOT NULL, "
+        + ", ".join(f'"{col}" {col_type}' for col, col_type in SONG_COLUMNS)
+        + ", PRIMARY KEY (md5, song))"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, val TEXT NOT NULL)"
+    )
+    return db
+
+
+def update_cia_probe(db, cia_probe):
+    # songs found with a different CIA probe are scraped again.
+    probe = getattr(cia_probe, "__name__", str(cia_probe))
+    row = db.execute("SELECT val FROM settings WHERE key = 'cia_probe'").fetchone()
+    if row is not None and row[0] != probe:
+        logging.info("CIA probe changed from %s to %s", row[0], probe)
+        db.execute("DELETE FROM songs")
+    db.execute("INSERT OR REPLACE INTO settings VALUES ('cia_probe', ?)", (probe,))
+    db.commit()
+
+
+def song_row(md5_hash, result):
+    return (md5_hash,) + tuple(
+        None if result[col] in UNKNOWNS else result[col] for col in SONG_COLUMN_NAMES
+    )
+
+
+def update_files(db, sidfiles):
+    # only rehash files whose size or mtime changed.
+    known_files = {
+        path: (size, mtime)
+        for path, size, mtime in db.execute("SELECT path, size, mtime FROM files")
+    }
+    changed_files = []
+    for sidfile in sidfiles:
+        path = str(sidfile)
+        stat = sidfile.stat()
+        if known_files.pop(path, None) != (stat.st_size, stat.st_mtime):
+            changed_files.append((path, stat.st_size, stat.st_mtime, file_md5(path)))
+    db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", changed_files)
+    db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in known_files])
+    db.commit()
+    logging.info(
+        "%u sidfiles changed, %u removed", len(changed_files), len(known_files)
+    )
+
+
+def write_sidinfo_csv(db, songlengths, csv_path):
+    # text columns with only one distinct value (counting unknown) are dropped.
+    text_cols = ["path", "md5"] + [
+        col for col, col_type in SONG_COLUMNS if col_type == "TEXT"
+    ]
+    distinct_counts = db.execute(
+        "SELECT "
+        + ", ".join(
+            f'COUNT(DISTINCT "{col}") + COALESCE(MAX("{col}" IS NULL), 0)'
+            for col in text_cols
         )
+        + " FROM files JOIN songs USING (md5)"
+    ).fetchone()
+    drops = {col for col, n in zip(text_cols, distinct_counts) if n <= 1}
+    cols = ("path",) + SONG_COLUMN_NAMES + ("mtime", "md5", "length")
+    keep = [i for i, col in enumerate(cols) if col not in drops]
+    song_i = cols.index("song")
+    rows = db.execute(
+        "SELECT files.path, "
+        + ", ".join(f'songs."{col}"' for col in SONG_COLUMN_NAMES)
+        + ", files.mtime, files.md5 FROM files JOIN songs USING (md5) "
+        "ORDER BY files.path, songs.song"
+    )
+    with open(csv_path, "w", encoding="utf8", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow([cols[i] for i in keep])
+        for row in rows:
+            row += (songlengths[row[0]][row[song_i]],)
+            writer.writerow([row[i] for i in keep])
+
 
-        with open(sidinfo_file_tmp, "w", encoding="utf8") as f:
-            f.write(json.dumps(results))
-        os.rename(sidinfo_file_tmp, sidinfo_file)
-    with open(sidinfo_file, "r", encoding="utf8") as f:
-        results = json.loads(f.read())
-        logging.info("%s: %s", sidfile, results)
-        return results
-
-
-def scrape_tunelengths(tunelengthfile):
-    all_tunelengths = {}
-    tunename = None
-    with open(tunelengthfile, encoding="utf8") as f:
-        for line in f:
-            tunename_match = tunename_re.match(line)
-            if tunename_match:
-                tunename = os.path.join("C64Music", tunename_match.group(1)[1:])
-                continue
-            tunelength_match = tunelength_re.match(line)
-            if not tunelength_match:
-                continue
-            assert tunename
-            md5_hash = tunelength_match.group(1)
-            tunelength_raw = tunelength_match.group(2).split()
-            tunelengths = {}
-            for song, raw in enumerate(tunelength_raw, start=1):
-                raw_match = tunelength_time_re.match(raw)
-                if raw_match is None:
-                    raise ValueError(raw)
-                tunelength = int(raw_match.group(1)) * 60
-                tunelength += int(raw_match.group(2))
-                if raw_match.group(3):
-                    tunelength += 1
-                tunelengths[song] = tunelength
-            all_tunelengths[md5_hash] = tunelengths
-            all_tunelengths[tunename] = tunelengths
-            tunename = None
-    return all_tunelengths
-
-
-def scrape_sids(hvscdir, cache):
+def scrape_sids(hvscdir, cache, db_path, csv_path, cia_probe=emulate_cia_timer):
     current = pathlib.Path(hvscdir)
     currentdocs = pathlib.Path(os.path.join(current, "C64Music/DOCUMENTS"))
     sidfiles = list(sorted(current.rglob("*.sid")))
-    random.shuffle(sidfiles)
-    logging.info("scraping %u sidfiles", len(sidfiles))
-    all_tunelengths = {}
-    for tunelengthfile in currentdocs.rglob(r"Songlengths.md5"):
-        all_tunelengths.update(scrape_tunelengths(tunelengthfile))
-    missing_sidfiles = {str(sidfile) for sidfile in sidfiles} - set(all_tunelengths)
+    logging.info("found %u sidfiles", len(sidfiles))
+    songlengths_files = sorted(currentdocs.rglob(r"Songlengths.md5"))
+    if not songlengths_files:
+        raise ValueError(f"no Songlengths.md5 in {currentdocs}")
+    songlengths = songlengths_index(songlengths_files)
+    missing_sidfiles = {
+        str(sidfile) for sidfile in sidfiles if str(sidfile) not in songlengths
+    }
     if missing_sidfiles:
         print("no tunelengths for %s" % missing_sidfiles)
         for sidfile in missing_sidfiles:
             sidfiles.remove(pathlib.Path(sidfile))
-    assert len(all_tunelengths) / 2 == len(sidfiles), (
-        len(all_tunelengths),
+    assert len(songlengths) == len(sidfiles), (
+        len(songlengths),
         len(sidfiles),
     )
 
+    db = open_sidinfo_db(db_path)
+    update_files(db, sidfiles)
+    # drop songs of removed or changed files.
+    db.execute("DELETE FROM songs WHERE md5 NOT IN (SELECT md5 FROM files)")
+    update_cia_probe(db, cia_probe)
+    if not cache:
+        db.execute("DELETE FROM songs")
+    # scrape each new content once, regardless of how many paths have it.
+    new_sidfiles = db.execute(
+        "SELECT MIN(path), md5 FROM files "
+        "WHERE md5 NOT IN (SELECT md5 FROM songs) GROUP BY md5"
+    ).fetchall()
+    random.shuffle(new_sidfiles)
+    logging.info("scraping %u sidfiles", len(new_sidfiles))
+
     with concurrent.futures.ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
         result_futures = []
-        for i, sidfile in enumerate(sidfiles, start=1):
+        for i, new_sidfile in enumerate(new_sidfiles, start=1):
+            path, md5_hash = new_sidfile
             result_futures.append(
-                executor.submit(
-                    scrape_sidinfo, i, sidfile, all_tunelengths[str(sidfile)], cache
-                )
+                executor.submit(scrape_sidinfo, i, path, md5_hash, cia_probe)
             )
-        results = []
-        for future in concurrent.futures.as_completed(result_futures):
-            results.extend(future.result())
-
-    df = pd.DataFrame(results)
-    drops = []
-
-    for col, col_type in df.dtypes.items():
-        if col_type is np.dtype("object"):
-            n = df[col].nunique()
-            if n == 1:
-                drops.append(col)
-            else:
-                df.loc[df[col].isin(UNKNOWNS.val), [col]] = pd.NA
-        if col in drops:
-            continue
-
-    if drops:
-        df = df.drop(drops, axis=1)
+        # results are kept as they complete, so a crash loses at most a batch.
+        for i, future in enumerate(
+            concurrent.futures.as_completed(result_futures), start=1
+        ):
+            md5_hash, results = future.result()
+            db.executemany(
+                "INSERT OR REPLACE INTO songs VALUES ("
+                + ", ".join(["?"] * (len(SONG_COLUMNS) + 1))
+                + ")",
+                [song_row(md5_hash, result) for result in results],
+            )
+            if i % SCRAPE_BATCH == 0:
+                db.commit()
+        db.commit()
 
-    return df
+    write_sidinfo_csv(db, songlengths, csv_path)
+    db.close()
+    songlengths.close()
 
 
 def main():
@@ -154,21 +222,43 @@ def main():
     parser.add_argument("--hvscdir", default=".", type=str)
     cache_parser = parser.add_mutually_exclusive_group(required=False)
     cache_parser.add_argument(
-        "--cache", dest="cache", action="store_true", help="Use cache"
+        "--cache",
+        dest="cache",
+        action="store_true",
+        help="Only scrape new or changed sidfiles",
     )
     cache_parser.add_argument(
-        "--nocache", dest="cache", action="store_false", help="Do not cache"
+        "--nocache", dest="cache", action="store_false", help="Scrape all sidfiles"
     )
     parser.set_defaults(cache=True)
+    parser.add_argument(
+        "--db",
+        default=None,
+        type=str,
+        help="sidinfo metadata database (default sidinfo.db in hvscdir)",
+    )
+    parser.add_argument(
+        "--docker",
+        default=False,
+        action="store_true",
+        help="Use sidplayfp in docker, rather than internal emulator, to find CIA timers",
+    )
 
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
-    df = scrape_sids(args.hvscdir, args.cache)
-    df.to_csv(
+    cia_probe = emulate_cia_timer
+    if args.docker:
+        cia_probe = scrape_cia_timer
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(args.hvscdir, "sidinfo.db")
+    scrape_sids(
+        args.hvscdir,
+        args.cache,
+        db_path,
         os.path.join(args.hvscdir, "sidinfo.csv"),
-        index=False,
-        quoting=csv.QUOTE_NONNUMERIC,
+        cia_probe,
     )
 
 
@@ -1,16 +1,92 @@
 #!/usr/bin/python3
 
 import argparse
-from desidulate.sidinfo import sidinfo
+import concurrent.futures
+import json
+import multiprocessing
+import signal
+import struct
+from desidulate.sidinfo import (
+    emulate_cia_timer,
+    probe_song_cia,
+    scrape_cia_timer,
+    sidinfo_songs,
+)
+
+PROBE_WORKERS = max(1, multiprocessing.cpu_count())
+PROBE_TIMEOUT = 30
+
+
+def probe_timeout(_signum, _frame):
+    raise TimeoutError("CIA probe timed out")
+
+
+def timed_probe_song_cia(decoded_song, cia_probe, timeout):
+    # the timeout is enforced in the worker, so a stuck probe frees the worker.
+    signal.signal(signal.SIGALRM, probe_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return probe_song_cia(decoded_song, cia_probe)
+    except (TimeoutError, ValueError) as err:
+        decoded_song["cia"] = None
+        decoded_song["error"] = str(err)
+        return decoded_song
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def getsidinfo(sidfiles, cia_probe, workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT):
+    # yields songs in input order, parsing all headers before probing.
+    all_songs = []
+    for sidfile in sidfiles:
+        try:
+            all_songs.append(sidinfo_songs(sidfile))
+        except (OSError, struct.error) as err:
+            all_songs.append([{"path": sidfile, "error": str(err)}])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        probes = [
+            [
+                (
+                    executor.submit(timed_probe_song_cia, song, cia_probe, timeout)
+                    if song.get("cia", None)
+                    else None
+                )
+                for song in songs
+            ]
+            for songs in all_songs
+        ]
+        for songs, song_probes in zip(all_songs, probes):
+            for song, probe in zip(songs, song_probes):
+                if probe is not None:
+                    song = probe.result()
+                yield song
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("sidfile", nargs="+")
+    parser.add_argument(
+        "--docker",
+        default=False,
+        action="store_true",
+        help="Use sidplayfp in docker, rather than internal emulator, to find CIA timers",
+    )
+    parser.add_argument(
+        "--workers", default=PROBE_WORKERS, type=int, help="concurrent CIA probes"
+    )
+    parser.add_argument(
+        "--timeout",
+        default=PROBE_TIMEOUT,
+        type=float,
+        help="seconds to allow each CIA probe",
+    )
     args = parser.parse_args()
+    cia_probe = emulate_cia_timer
+    if args.docker:
+        cia_probe = scrape_cia_timer
 
-    for f in args.sidfile:
-        print(sidinfo(f))
+    for song in getsidinfo(args.sidfile, cia_probe, args.workers, args.timeout):
+        print(json.dumps(song), flush=True)
 
 
 if __name__ == "__main__":
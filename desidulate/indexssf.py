@@ -7,10 +7,16 @@
 ## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
 
 import argparse
-import pandas as pd
 
-from desidulate.fileio import read_csv, out_path
-from desidulate.sidlib import set_sid_dtype, control_labels, unique_control_labels
+from desidulate.fileio import read_int_columns, out_path
+from desidulate.sidlib import (
+    V1_CONTROL_BITS,
+    set_sid_dtype,
+    control_labels,
+    unique_control_labels,
+)
+
+INDEX_COLS = ["hashid", "hashid_noclock", "clock", "pr_speed", "vol"] + V1_CONTROL_BITS
 
 parser = argparse.ArgumentParser(description="Index SSFs with waveforms")
 parser.add_argument("ssffile", help="SSF file")
@@ -20,20 +26,45 @@ parser.add_argument(
 parser.add_argument("--max_pr_speed", default=8, type=int, help="max pr_speed")
 
 
-def main():
-    args = parser.parse_args()
-    df = set_sid_dtype(read_csv(args.ssffile, dtype=pd.Int64Dtype()))
+def label_ssfs(df, max_clock=500000, max_pr_speed=8):
+    # INDEX_COLS of rows within max_clock and max_pr_speed, with control labels.
+    if not df.empty:
+        df = df.reindex(columns=INDEX_COLS)
+        df = df[(df.clock <= max_clock) & (df.pr_speed <= max_pr_speed)]
+    df = set_sid_dtype(df)
     if not df.empty:
-        df = df[(df.clock <= args.max_clock) & (df.pr_speed <= args.max_pr_speed)]
         df = control_labels(df)
         df = unique_control_labels(df)
+    return df
+
+
+def index_ssf(ssffile, df=None, max_clock=500000, max_pr_speed=8):
+    # df may be passed in, already read (e.g. from reg2ssf).
+    # Otherwise, read only the columns and rows needed from ssffile.
+    if df is None:
+        df = read_int_columns(
+            ssffile,
+            INDEX_COLS,
+            filters=[("clock", "<=", max_clock), ("pr_speed", "<=", max_pr_speed)],
+        )
+    df = label_ssfs(df, max_clock=max_clock, max_pr_speed=max_pr_speed)
+    index_files = []
+    if not df.empty:
         vols = df[df["vol"].notna()]["vol"].nunique()
         for labels, ssf_df in df.groupby("unique_control_labels"):
             if labels:
+                index_file = out_path(ssffile, "%u.%s.index_ssf.zst" % (vols, labels))
                 ssf_df[["hashid", "hashid_noclock"]].drop_duplicates().to_csv(
-                    out_path(args.ssffile, "%u.%s.index_ssf.zst" % (vols, labels)),
+                    index_file,
                     index=False,
                 )
+                index_files.append(index_file)
+    return index_files
+
+
+def main():
+    args = parser.parse_args()
+    index_ssf(args.ssffile, max_clock=args.max_clock, max_pr_speed=args.max_pr_speed)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Merge many ssf.zst files into one global SSF store, with one row set per hashid,
+# and an index of which tunes each hashid occurs in. SSF rows are partitioned by
+# hashid into bucket files on disk, then each bucket is reduced on its own, so
+# only MERGE_ROWS rows and one bucket need be in memory at once.
+
+import argparse
+import glob
+import logging
+import os
+import re
+import tempfile
+import pandas as pd
+import zstandard
+from desidulate.fileio import read_csv
+
+MERGE_BUCKETS = 64
+MERGE_ROWS = int(1e6)
+SSF_TUNE_SONG_RE = re.compile(r"^(.+)/(\d+)/[^/]+-\d+\.ssf\.zst$")
+
+
+def ssf_tune_song(ssffile):
+    # C64Music/x/1/x-1.ssf.zst is C64Music/x.sid, song 1.
+    match = SSF_TUNE_SONG_RE.match(os.path.normpath(ssffile))
+    if match:
+        return (match.group(1) + ".sid", int(match.group(2)))
+    return (ssffile, 0)
+
+
+class SsfBuckets:
+
+    def __init__(self, bucket_dir, buckets=MERGE_BUCKETS, merge_rows=MERGE_ROWS):
+        self.bucket_dir = bucket_dir
+        self.buckets = buckets
+        self.merge_rows = merge_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.parts = 0
+        self.columns = {}
+
+    def bucket_path(self, bucket):
+        return os.path.join(self.bucket_dir, str(bucket))
+
+    def add(self, source, ssf_df):
+        ssf_df = ssf_df.assign(source=source)
+        self.columns.update(dict.fromkeys(ssf_df.columns))
+        self.pending.append(ssf_df)
+        self.pending_rows += len(ssf_df)
+        if self.pending_rows >= self.merge_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        df = pd.concat(self.pending, ignore_index=True)
+        for bucket, bucket_df in df.groupby(df["hashid"] % self.buckets):
+            bucket_path = self.bucket_path(bucket)
+            os.makedirs(bucket_path, exist_ok=True)
+            bucket_df.to_parquet(
+                os.path.join(bucket_path, "%u.parquet" % self.parts), index=False
+            )
+        self.parts += 1
+        self.pending = []
+        self.pending_rows = 0
+
+    def reduce(self):
+        # yields one canonical row set per hashid, with count summed across tunes.
+        self.flush()
+        columns = [col for col in self.columns if col != "source"]
+        for bucket in range(self.buckets):
+            parts = sorted(glob.glob(os.path.join(self.bucket_path(bucket), "*")))
+            if not parts:
+                continue
+            df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+            counts = (
+                df.drop_duplicates(["hashid", "source"])
+                .groupby("hashid")["count"]
+                .sum()
+            )
+            # keep the rows from the first tune that had the hashid.
+            df = df[df["source"] == df.groupby("hashid")["source"].transform("min")]
+            df = df.sort_values(["hashid", "source"], kind="stable")
+            df["count"] = df["hashid"].map(counts)
+            yield df.reindex(columns=columns)
+
+
+def merge_ssfs(
+    ssffiles, store, occurrences, buckets=MERGE_BUCKETS, merge_rows=MERGE_ROWS
+):
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        ssf_buckets = SsfBuckets(bucket_dir, buckets=buckets, merge_rows=merge_rows)
+        with zstandard.open(occurrences, "w", encoding="utf8") as occurrences_f:
+            occurrences_f.write("tune,song,hashid,count\n")
+            for source, ssffile in enumerate(ssffiles):
+                ssf_df = read_csv(ssffile, dtype=pd.Int64Dtype())
+                if ssf_df.empty:
+                    continue
+                ssf_buckets.add(source, ssf_df)
+                tune, song = ssf_tune_song(ssffile)
+                ssf_df.drop_duplicates("hashid")[["hashid", "count"]].assign(
+                    tune=tune, song=song
+                )[["tune", "song", "hashid", "count"]].to_csv(
+                    occurrences_f, header=False, index=False
+                )
+                logging.info("read %s (%u)", ssffile, source + 1)
+
+        hashids = 0
+        with zstandard.open(store, "w", encoding="utf8") as store_f:
+            header = True
+            for df in ssf_buckets.reduce():
+                df.to_csv(store_f, header=header, index=False)
+                header = False
+                hashids += df["hashid"].nunique()
+        logging.info("wrote %u unique SSFs to %s", hashids, store)
+    return hashids
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Merge ssf.zst files into a global SSF store"
+    )
+    parser.add_argument("ssffile", nargs="*", help="ssf.zst files to merge")
+    parser.add_argument(
+        "--ssflist", default=None, type=str, help="file of ssf.zst files to merge"
+    )
+    parser.add_argument("--store", default="merged.ssf.zst", help="SSF store to write")
+    parser.add_argument(
+        "--occurrences",
+        default="merged.occurrences.zst",
+        help="(tune, song) to hashid index to write",
+    )
+    parser.add_argument(
+        "--buckets", default=MERGE_BUCKETS, type=int, help="hashid partitions"
+    )
+    parser.add_argument(
+        "--merge_rows",
+        default=MERGE_ROWS,
+        type=int,
+        help="rows to hold in memory before writing to partitions",
+    )
+    args = parser.parse_args()
+
+    ssffiles = list(args.ssffile)
+    if args.ssflist:
+        with open(args.ssflist, encoding="utf8") as f:
+            ssffiles.extend(line.strip() for line in f if line.strip())
+    merge_ssfs(
+        ssffiles,
+        args.store,
+        args.occurrences,
+        buckets=args.buckets,
+        merge_rows=args.merge_rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,8 +12,50 @@
 import argparse
 import logging
 from desidulate.fileio import out_path
-from desidulate.sidlib import reg2state, state2ssfs, timer_args
+from desidulate.sidlib import reg2state, ssf_groups, state2ssfs, timer_args
 from desidulate.sidwrap import get_sid
+from desidulate.ssfstore import write_ssf_log, write_ssf_store
+
+MAX_STATES = int(10 * 1e6)
+
+
+def reg2ssf(
+    logfile,
+    pal,
+    cia,
+    maxstates=MAX_STATES,
+    maxprspeed=1,
+    dfext="zst",
+    relative_hash=False,
+):
+    sid = get_sid(pal, cia)
+    df = reg2state(logfile, nrows=int(maxstates))
+    ssf_log_df, ssf_df = state2ssfs(
+        sid,
+        df,
+        maxprspeed=maxprspeed,
+        near=sid.one_sample_cycles,
+        relative_hash=relative_hash,
+    )
+
+    outputs = [
+        (".".join(("log", dfext)), ssf_log_df),
+        (".".join(("ssf", dfext)), ssf_df),
+    ]
+    if relative_hash and not ssf_df.empty:
+        outputs.append((".".join(("ssf_groups", dfext)), ssf_groups(ssf_df)))
+    for ext, filedf in outputs:
+        filename = out_path(logfile, ext)
+        logging.debug("writing %s", filename)
+        if ext == "ssf.parquet":
+            write_ssf_store(filedf, filename)
+        elif ext == "log.parquet":
+            write_ssf_log(filedf, filename)
+        elif dfext == "parquet":
+            filedf.to_parquet(filename)
+        else:
+            filedf.to_csv(filename)
+    return ssf_log_df, ssf_df
 
 
 def main():
@@ -25,28 +67,34 @@ def main():
     parser.add_argument("logfile", default="vicesnd.sid", help="log file to read")
     parser.add_argument(
         "--maxstates",
-        default=int(10 * 1e6),
+        default=MAX_STATES,
         help="maximum number of SID states to analyze",
     )
-    parser.add_argument("--dfext", default="zst", help="default dataframe extension")
+    parser.add_argument(
+        "--dfext",
+        default="zst",
+        help="default dataframe extension (parquet writes an indexed SSF store)",
+    )
     parser.add_argument("--maxprspeed", default=1, help="max prspeed to detect")
+    parser.add_argument(
+        "--relative_hash",
+        default=False,
+        action="store_true",
+        help="also hash SSFs independent of transposition, and write ssf_groups",
+    )
     timer_args(parser)
     args = parser.parse_args()
 
-    sid = get_sid(args.pal, args.cia)
-    df = reg2state(args.logfile, nrows=int(args.maxstates))
-    ssf_log_df, ssf_df = state2ssfs(
-        sid, df, maxprspeed=args.maxprspeed, near=sid.one_sample_cycles
+    reg2ssf(
+        args.logfile,
+        args.pal,
+        args.cia,
+        maxstates=args.maxstates,
+        maxprspeed=args.maxprspeed,
+        dfext=args.dfext,
+        relative_hash=args.relative_hash,
     )
 
-    for ext, filedf in (
-        (".".join(("log", args.dfext)), ssf_log_df),
-        (".".join(("ssf", args.dfext)), ssf_df),
-    ):
-        filename = out_path(args.logfile, ext)
-        logging.debug("writing %s", filename)
-        filedf.to_csv(filename)
-
 
 if __name__ == "__main__":
     main()
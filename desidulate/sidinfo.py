@@ -3,13 +3,17 @@
 # https://hvsc.c64.org/download/C64Music/DOCUMENTS/SID_file_format.txt
 import copy
 import os
-import re
 import struct
 import docker
+from desidulate.cpu6502 import run_sid
 
 SIDPLAYFP_IMAGE = "anarkiwi/sidplayfp"
-CIA1_TIMERA_RE = re.compile(r"^.+\s+ST([AXY])a\s+dc0([45e])$")
-INSTRUCTION_RE = re.compile(r"^.+Instruction\s+\((\d+)\)$")
+# sidplayfp --cpu-debug log: stores to CIA1 timer A, and instruction counts.
+CIA1_TIMERA_REG = b"dc0"
+CIA1_TIMERA_REGS = {b"dc04": 4, b"dc05": 5, b"dc0e": 0xE}
+CPU_REG_FIELDS = {b"STAa": 2, b"STXa": 3, b"STYa": 4}
+INSTRUCTION = b"Instruction"
+SCAN_CHUNK_SIZE = 2**20
 
 
 def intdecode(_, x):
@@ -100,54 +104,14 @@ SID_HEADERS = (
 )
 
 
-def scrape_cia_timer(sidfile, validate_ctrl, tune, cutoff_time=1):
-    siddir = os.path.realpath(os.path.dirname(sidfile))
-    client = docker.from_env()
+def cia_timer(sidfile, validate_ctrl, cia_writes, instructions):
+    # reduce (register, value) writes to CIA1 $DC04/$DC05/$DC0E to a timer value.
     timer_low = 0
     timer_high = 0
     timer = 0
     ctrl = 0
-    instruction_cutoff = cutoff_time * 1e6
-    instructions = 0
-    cmd = [
-        f"-t{cutoff_time}",
-        "-q",
-        "--cpu-debug",
-        "--delay=0",
-        f"-os{tune}",
-        "-w/dev/null",
-        os.path.join("tmp", os.path.basename(sidfile)),
-    ]
-    sidplayfp = client.containers.run(
-        SIDPLAYFP_IMAGE,
-        cmd,
-        remove=True,
-        stdout=True,
-        detach=True,
-        network="none",
-        volumes=[f"{siddir}:/tmp:ro"],
-        ulimits=[docker.types.Ulimit(name="cpu", hard=round(cutoff_time * 2))],
-    )
     timer_starts = 0
-    for line in sidplayfp.logs(stream=True, stdout=True, stderr=False):
-        # need to drain log buffer to avoid docker client socket leak.
-        if instructions > instruction_cutoff:
-            continue
-        line = line.decode("utf8").strip()
-        if not line:
-            continue
-        match = INSTRUCTION_RE.match(line)
-        if match:
-            instructions = int(match.group(1))
-            continue
-        match = CIA1_TIMERA_RE.match(line)
-        if not match:
-            continue
-        cpu_reg = match.group(1)
-        cia_reg = int(match.group(2), 16)
-        cpu_reg_map = {"A": 2, "X": 3, "Y": 4}
-        raw_val = line.split()[cpu_reg_map[cpu_reg]]
-        val = int(raw_val, 16)
+    for cia_reg, val in cia_writes:
         if cia_reg == 0xE:
             ctrl = val
             if ctrl & 2**0:
@@ -158,7 +122,6 @@ def scrape_cia_timer(sidfile, validate_ctrl, tune, cutoff_time=1):
             elif cia_reg == 5:
                 timer_high = val
             timer = (timer_high << 8) + timer_low
-    client.close()
     if validate_ctrl:
         if not timer_starts:
             raise ValueError(f"{sidfile}: CIA timer not started: {ctrl}")
@@ -172,7 +135,144 @@ def scrape_cia_timer(sidfile, validate_ctrl, tune, cutoff_time=1):
     return timer
 
 
-def sidinfo_song(sidfile, song, decoded, rsid, raw_speed):
+class CiaLogScanner:
+    # Find CIA1 timer A stores in a sidplayfp --cpu-debug log, fed in arbitrary
+    # chunks, until the instruction cutoff is reached.
+
+    def __init__(self, instruction_cutoff, chunk_size=SCAN_CHUNK_SIZE):
+        self.instruction_cutoff = instruction_cutoff
+        self.chunk_size = chunk_size
+        self.instructions = 0
+        self.cia_writes = []
+        self.done = False
+        self.pending = []
+        self.pending_size = 0
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        self.pending.append(chunk)
+        self.pending_size += len(chunk)
+        if self.pending_size >= self.chunk_size:
+            self.flush(final=False)
+
+    def flush(self, final=True):
+        buf = b"".join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+        if not final:
+            # scan only complete lines.
+            end = buf.rfind(b"\n") + 1
+            if end < len(buf):
+                self.pending.append(buf[end:])
+                self.pending_size = len(buf) - end
+            buf = buf[:end]
+        if not self.done:
+            self.scan(buf)
+
+    @staticmethod
+    def instruction_count(buf, pos):
+        start = buf.find(b"(", pos + len(INSTRUCTION)) + 1
+        return int(buf[start : buf.find(b")", start)])
+
+    def scan(self, buf):
+        end = len(buf)
+        pos = buf.rfind(INSTRUCTION)
+        if pos == -1:
+            pass
+        elif self.instruction_count(buf, pos) <= self.instruction_cutoff:
+            self.instructions = self.instruction_count(buf, pos)
+        else:
+            # ignore everything after the line that passes the cutoff.
+            pos = buf.find(INSTRUCTION)
+            while self.instruction_count(buf, pos) <= self.instruction_cutoff:
+                pos = buf.find(INSTRUCTION, pos + len(INSTRUCTION))
+            self.instructions = self.instruction_count(buf, pos)
+            self.done = True
+            end = buf.rfind(b"\n", 0, pos) + 1
+
+        pos = buf.find(CIA1_TIMERA_REG, 0, end)
+        while pos != -1:
+            line_end = buf.find(b"\n", pos, end)
+            if line_end == -1:
+                line_end = end
+            line_start = buf.rfind(b"\n", 0, pos) + 1
+            line = buf[line_start:line_end].split()
+            if (
+                len(line) > 4
+                and line[-1] in CIA1_TIMERA_REGS
+                and line[-2] in CPU_REG_FIELDS
+            ):
+                self.cia_writes.append(
+                    (
+                        CIA1_TIMERA_REGS[line[-1]],
+                        int(line[CPU_REG_FIELDS[line[-2]]], 16),
+                    )
+                )
+            pos = buf.find(CIA1_TIMERA_REG, line_end, end)
+
+
+def scrape_cia_timer(sidfile, validate_ctrl, tune, cutoff_time=1):
+    siddir = os.path.realpath(os.path.dirname(sidfile))
+    client = docker.from_env()
+    scanner = CiaLogScanner(cutoff_time * 1e6)
+    cmd = [
+        f"-t{cutoff_time}",
+        "-q",
+        "--cpu-debug",
+        "--delay=0",
+        f"-os{tune}",
+        "-w/dev/null",
+        os.path.join("tmp", os.path.basename(sidfile)),
+    ]
+    sidplayfp = client.containers.run(
+        SIDPLAYFP_IMAGE,
+        cmd,
+        remove=True,
+        stdout=True,
+        detach=True,
+        network="none",
+        volumes=[f"{siddir}:/tmp:ro"],
+        ulimits=[docker.types.Ulimit(name="cpu", hard=round(cutoff_time * 2))],
+    )
+    logs = sidplayfp.logs(stream=True, stdout=True, stderr=False)
+    try:
+        for chunk in logs:
+            scanner.feed(chunk)
+            if scanner.done:
+                break
+        scanner.flush()
+    finally:
+        # close the stream and stop the container rather than draining the log.
+        logs.close()
+        try:
+            sidplayfp.stop(timeout=0)
+        except docker.errors.APIError:
+            pass
+        client.close()
+    return cia_timer(sidfile, validate_ctrl, scanner.cia_writes, scanner.instructions)
+
+
+def emulate_cia_timer(sidfile, validate_ctrl, tune, cutoff_time=1):
+    # As scrape_cia_timer(), but run in process with the built in 6502 emulator.
+    # Parity with sidplayfp has not been checked: run utils/cmpciatimer.py to do so.
+    with open(sidfile, "rb") as f:
+        data = f.read()
+    decoded = sid_header(sidfile, data)
+    c64 = run_sid(
+        data[decoded["dataOffset"] :],
+        decoded["loadAddress"],
+        decoded["initAddress"],
+        decoded["playAddress"],
+        tune,
+        decoded["magicID"] == "RSID",
+        decoded["clock"] != "NTSC",
+        cutoff_time,
+    )
+    return cia_timer(sidfile, validate_ctrl, c64.cia_writes, c64.instructions)
+
+
+def sidinfo_song(sidfile, song, decoded, rsid, raw_speed, cia_probe=emulate_cia_timer):
     decoded_song = copy.deepcopy(decoded)
     decoded_song["song"] = song
 
@@ -181,16 +281,25 @@ def sidinfo_song(sidfile, song, decoded, rsid, raw_speed):
             decoded_song["speed"] = "CIA"
         decoded_song["cia"] = int(decoded_song["speed"] == "CIA")
 
+    # without a probe, cia is left as 1 for songs that need one.
+    if cia_probe is not None:
+        decoded_song = probe_song_cia(decoded_song, cia_probe)
+    return decoded_song
+
+
+def probe_song_cia(decoded_song, cia_probe=emulate_cia_timer):
     if decoded_song["cia"]:
-        decoded_song["cia"] = scrape_cia_timer(sidfile, not rsid, song)
+        decoded_song["cia"] = cia_probe(
+            decoded_song["path"],
+            decoded_song["magicID"] != "RSID",
+            decoded_song["song"],
+        )
     return decoded_song
 
 
-def sidinfo(sidfile):
-    with open(sidfile, "rb") as f:
-        data = f.read()[:SID_HEADER_LEN]
+def sid_header(sidfile, data):
     unpack_format = ">" + "".join((field_type for _, field_type, _ in SID_HEADERS))
-    results = struct.unpack(unpack_format, data)
+    results = struct.unpack(unpack_format, data[:SID_HEADER_LEN])
     rsid = results[0] == b"RSID"
     decoded = {"path": sidfile}
     for header_data, field_data in zip(SID_HEADERS, results):
@@ -200,6 +309,15 @@ def sidinfo(sidfile):
             decoded.update(decoded_field)
         else:
             decoded[field] = decoded_field
+    return decoded
+
+
+def sidinfo_songs(sidfile):
+    # header only, with cia 1 for songs that need a CIA probe.
+    with open(sidfile, "rb") as f:
+        data = f.read(SID_HEADER_LEN)
+    decoded = sid_header(sidfile, data)
+    rsid = decoded["magicID"] == "RSID"
 
     raw_speed = decoded["speed"]
     decoded["speed"] = "VBI"
@@ -215,8 +333,16 @@ def sidinfo(sidfile):
                 decoded[sidmodel] = decoded["sidmodel"]
     decoded["cia"] = int(rsid)
 
-    decoded_songs = []
-    for song in range(1, decoded["songs"] + 1):
-        decoded_songs.append(sidinfo_song(sidfile, song, decoded, rsid, raw_speed))
+    return [
+        sidinfo_song(sidfile, song, decoded, rsid, raw_speed, cia_probe=None)
+        for song in range(1, decoded["songs"] + 1)
+    ]
+
 
+def sidinfo(sidfile, cia_probe=emulate_cia_timer):
+    decoded_songs = sidinfo_songs(sidfile)
+    if cia_probe is not None:
+        decoded_songs = [
+            probe_song_cia(decoded_song, cia_probe) for decoded_song in decoded_songs
+        ]
     return decoded_songs
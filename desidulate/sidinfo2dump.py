@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import subprocess
+import time
+import zstandard
+from pyresidfp import SoundInterfaceDevice
+from desidulate.fileio import read_csv
+from desidulate.songlengths import songlengths_index
+
+VICEIMAGE = "anarkiwi/headlessvice"
+DUMP_WORKERS = 4
+
+
+class DumpJob:
+
+    def __init__(self, hvscdir, path, song, pal, length):
+        if pal:
+            clock_freq = SoundInterfaceDevice.PAL_CLOCK_FREQUENCY
+        else:
+            clock_freq = SoundInterfaceDevice.NTSC_CLOCK_FREQUENCY
+        self.path = path
+        self.pal = pal
+        self.song = song
+        self.key = f"{path}:{song}"
+        self.cycles = int(clock_freq * (length + 1))
+        self.dname = os.path.join(hvscdir, os.path.dirname(path))
+        self.bname = os.path.basename(path)
+        dbname = "%s/%u/%s" % (self.bname, song, self.bname)
+        dbname = dbname.replace(".sid", "")
+        self.dbname = dbname + "-%u.dump.zst" % song
+        self.dump_path = os.path.join(self.dname, self.dbname)
+
+    def vice_cmd(self):
+        return [
+            "docker",
+            "run",
+            "--rm",
+            "-v",
+            "%s:/vice" % self.dname,
+            "--name",
+            "-".join(
+                ["vsid", os.path.basename(self.dname), self.bname, str(self.song)]
+            ),
+            "-i",
+            VICEIMAGE,
+            "/usr/local/bin/vsiddump.py",
+            os.path.join("/vice", self.dbname),
+            "-warp",
+            "-console",
+            "-silent",
+            "-limit",
+            str(self.cycles),
+            "-tune",
+            str(self.song),
+            os.path.join("/vice", self.bname),
+        ]
+
+
+def read_sidinfo(sidinfo, songlengths=None):
+    df = read_csv(sidinfo)
+    if songlengths:
+        songlengths = songlengths_index(songlengths)
+        try:
+            df["length"] = [
+                songlengths[path][song] for path, song in zip(df["path"], df["song"])
+            ]
+        finally:
+            songlengths.close()
+    return df
+
+
+def dump_jobs(df, hvscdir):
+    return [
+        DumpJob(hvscdir, row.path, row.song, row.pal, row.length)
+        for row in df.itertuples()
+    ]
+
+
+def vice_dump(job):
+    return subprocess.run(
+        job.vice_cmd(), stdin=subprocess.DEVNULL, check=False
+    ).returncode
+
+
+def stub_dump(job):
+    # write an empty dump, for testing.
+    with open(job.dump_path, "wb") as f:
+        f.write(zstandard.ZstdCompressor().compress(b""))
+    return 0
+
+
+DUMP_BACKENDS = {
+    "vice": vice_dump,
+    "stub": stub_dump,
+}
+
+
+def read_dump_status(status_path):
+    # latest status of each job.
+    dump_status = {}
+    if os.path.exists(status_path):
+        with open(status_path, encoding="utf8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # partially written by an interrupted run.
+                    continue
+                dump_status[record["job"]] = record
+    return dump_status
+
+
+def status_ends_with_newline(status_path):
+    with open(status_path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def run_dump_job(backend, job):
+    os.makedirs(os.path.dirname(job.dump_path), exist_ok=True)
+    start_time = time.time()
+    error = None
+    try:
+        returncode = backend(job)
+    except OSError as err:
+        returncode = None
+        error = str(err)
+    return {
+        "job": job.key,
+        "dump": job.dump_path,
+        "cycles": job.cycles,
+        "status": "ok" if returncode == 0 else "failed",
+        "returncode": returncode,
+        "error": error,
+        "start": start_time,
+        "duration": time.time() - start_time,
+    }
+
+
+def run_dump_jobs(jobs, backend, status_path, workers=DUMP_WORKERS):
+    dump_status = read_dump_status(status_path)
+    # longest first, so that the pool finishes together.
+    # A job already done is run again if its dump has since been removed.
+    pending_jobs = sorted(
+        (
+            job
+            for job in jobs
+            if dump_status.get(job.key, {}).get("status", None) != "ok"
+            or not os.path.exists(job.dump_path)
+        ),
+        key=lambda job: job.cycles,
+        reverse=True,
+    )
+    logging.info(
+        "%u dump jobs, %u already done",
+        len(pending_jobs),
+        len(jobs) - len(pending_jobs),
+    )
+    statuses = {"ok": 0, "failed": 0}
+    with open(status_path, "a", encoding="utf8") as status_f:
+        if status_f.tell() and not status_ends_with_newline(status_path):
+            status_f.write("\n")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_dump_job, backend, job) for job in pending_jobs
+            ]
+            for i, future in enumerate(
+                concurrent.futures.as_completed(futures), start=1
+            ):
+                record = future.result()
+                status_f.write(json.dumps(record) + "\n")
+                status_f.flush()
+                statuses[record["status"]] += 1
+                logging.info(
+                    "%s %s in %.1fs (%u of %u)",
+                    record["job"],
+                    record["status"],
+                    record["duration"],
+                    i,
+                    len(pending_jobs),
+                )
+    return statuses
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Run register dumps for all songs in sidinfo.csv"
+    )
+    parser.add_argument("sidinfo", type=str)
+    parser.add_argument("--hvscdir", default="/local/hvsc", type=str)
+    parser.add_argument(
+        "--songlengths",
+        default=None,
+        type=str,
+        help="use song lengths from this Songlengths.md5, rather than sidinfo",
+    )
+    parser.add_argument(
+        "--workers", default=DUMP_WORKERS, type=int, help="concurrent dump jobs"
+    )
+    parser.add_argument(
+        "--backend", default="vice", choices=sorted(DUMP_BACKENDS), help="dump backend"
+    )
+    parser.add_argument(
+        "--status",
+        default=None,
+        type=str,
+        help="job status file, to resume from (default from sidinfo)",
+    )
+    args = parser.parse_args()
+
+    status_path = args.status
+    if status_path is None:
+        status_path = os.path.splitext(args.sidinfo)[0] + ".dumpstatus.jsonl"
+    df = read_sidinfo(args.sidinfo, args.songlengths)
+    statuses = run_dump_jobs(
+        dump_jobs(df, args.hvscdir),
+        DUMP_BACKENDS[args.backend],
+        status_path,
+        workers=args.workers,
+    )
+    logging.info("dumps: %s", statuses)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,58 +2,27 @@
 
 import argparse
 import os
-from pyresidfp import SoundInterfaceDevice
-from desidulate.fileio import read_csv
-
-VICEIMAGE = "anarkiwi/headlessvice"
+from desidulate.sidinfo2dump import dump_jobs, read_sidinfo
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("sidinfo", type=str)
     parser.add_argument("--hvscdir", default="/local/hvsc", type=str)
+    parser.add_argument(
+        "--songlengths",
+        default=None,
+        type=str,
+        help="use song lengths from this Songlengths.md5, rather than sidinfo",
+    )
     args = parser.parse_args()
 
-    df = read_csv(args.sidinfo)
-
-    for row in df.itertuples():
-        if row.pal:
-            clock_freq = SoundInterfaceDevice.PAL_CLOCK_FREQUENCY
-        else:
-            clock_freq = SoundInterfaceDevice.NTSC_CLOCK_FREQUENCY
-        path = row.path
-
-        cycles = int(clock_freq * (row.length + 1))
-        dname = os.path.join(args.hvscdir, os.path.dirname(path))
-        bname = os.path.basename(path)
-        dbname = "%s/%u/%s" % (bname, row.song, bname)
-        dbname = dbname.replace(".sid", "")
-        dbname = dbname + "-%u.dump.zst" % row.song
-        dbpath = os.path.join(dname, os.path.dirname(dbname))
-        vice_cmd = [
-            "docker",
-            "run",
-            "--rm",
-            "-v",
-            "%s:/vice" % dname,
-            "--name",
-            "-".join(["vsid", os.path.basename(dname), bname, str(row.song)]),
-            "-i",
-            VICEIMAGE,
-            "/usr/local/bin/vsiddump.py",
-            os.path.join("/vice", dbname),
-            "-warp",
-            "-console",
-            "-silent",
-            "-limit",
-            str(cycles),
-            "-tune",
-            str(row.song),
-            os.path.join("/vice", bname),
-        ]
+    df = read_sidinfo(args.sidinfo, args.songlengths)
+    for job in dump_jobs(df, args.hvscdir):
+        dbpath = os.path.dirname(job.dump_path)
         if not os.path.exists(dbpath):
             os.makedirs(dbpath)
-        print(" ".join(vice_cmd))
+        print(" ".join(job.vice_cmd()))
 
 
 if __name__ == "__main__":
@@ -1,9 +1,60 @@
 #!/usr/bin/python3
 
 import argparse
+import heapq
 import os
 import re
+import numpy as np
 import pandas as pd
+from desidulate.fileio import read_timings
+
+# stages whose recorded timings make up a job's cost.
+COST_STAGES = ("reg2ssf", "indexssf", "ssf2midi")
+
+
+def recorded_cost(filename):
+    timings = read_timings(filename)
+    stage_times = [timings[stage]["time"] for stage in COST_STAGES if stage in timings]
+    if not stage_times:
+        return None
+    return sum(stage_times)
+
+
+def fit_cost_model(sizes, costs):
+    # linear cost in file size, from tunes with recorded timings.
+    sizes = np.asarray(sizes, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+    if len(np.unique(sizes)) > 1:
+        slope, intercept = np.polyfit(sizes, costs, 1)
+        if slope > 0:
+            return (slope, intercept)
+    if sizes.sum():
+        return (costs.sum() / sizes.sum(), 0)
+    # no usable timings, so cost is just size.
+    return (1, 0)
+
+
+def estimate_costs(sizes, costs):
+    # recorded cost where there is one, otherwise predict from size.
+    known = [(size, cost) for size, cost in zip(sizes, costs) if cost is not None]
+    slope, intercept = fit_cost_model(
+        [size for size, _ in known], [cost for _, cost in known]
+    )
+    return [
+        cost if cost is not None else max(0, slope * size + intercept)
+        for size, cost in zip(sizes, costs)
+    ]
+
+
+def shard_jobs(jobs, shards):
+    # longest processing time first, each to the least loaded shard.
+    shard_heap = [(0, shard) for shard in range(shards)]
+    shard_job_lists = [[] for _ in range(shards)]
+    for cost, job in sorted(jobs, key=lambda cost_job: cost_job[0], reverse=True):
+        shard_cost, shard = heapq.heappop(shard_heap)
+        shard_job_lists[shard].append((cost, job))
+        heapq.heappush(shard_heap, (shard_cost + cost, shard))
+    return shard_job_lists
 
 
 def main():
@@ -23,7 +74,16 @@ def main():
     timer_parser.add_argument(
         "--no-timer", dest="timer", action="store_false", help="do not add timer args"
     )
+    parser.add_argument(
+        "--shards",
+        default=1,
+        type=int,
+        help="split jobs into this many shards of equal predicted cost",
+    )
+    parser.add_argument("--shard", default=0, type=int, help="shard to print")
     args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be less than --shards")
 
     filter_re = None
     if args.filter:
@@ -61,9 +121,13 @@ def main():
             sidinfo_args.append(os.path.join(args.jobprefix, filename))
         else:
             sidinfo_args.append(filename)
-        outputs.append((size, " ".join(sidinfo_args)))
+        outputs.append((size, recorded_cost(filename), " ".join(sidinfo_args)))
 
-    for _size, sidinfo_args in sorted(outputs, reverse=True):
+    costs = estimate_costs(
+        [size for size, _, _ in outputs], [cost for _, cost, _ in outputs]
+    )
+    jobs = [(cost, output[2]) for cost, output in zip(costs, outputs)]
+    for _cost, sidinfo_args in shard_jobs(jobs, args.shards)[args.shard]:
         print(sidinfo_args)
 
 
@@ -6,6 +6,7 @@
 
 ## THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABL E FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import bisect
 import copy
 import logging
 import warnings
@@ -19,6 +20,8 @@ from desidulate.fileio import read_csv
 # use of external filter will be non deterministic.
 FLTEXT = False
 ADSR_COLS = ["atk1", "dec1", "sus1", "rel1"]
+# relative hash pitch resolution, so register rounding does not split transpositions.
+RELATIVE_CENTS = 10
 CONTROL_BITS = ["gate", "sync", "ring", "test", "tri", "saw", "pulse", "noise"]
 V1_CONTROL_BITS = [bit + "1" for bit in CONTROL_BITS]
 V1_CONTROL_BITS_LABELS = {
@@ -125,24 +128,111 @@ def calc_rates(sid, maxprspeed, vdf, ratemin=128):
     return (rate, pr_speed)
 
 
+# Polynomial rolling hash (modulo a Mersenne prime) used to compare
+# candidate repeats in O(1). Matches are always verified, so a collision
+# costs time but can never change a result.
+REPEAT_HASH_MOD = 2**61 - 1
+REPEAT_HASH_BASE = 1000003
+REPEAT_GRAM = 8
+
+
+def repeat_hash(prefix_hashes, powers, start, stop):
+    return (
+        prefix_hashes[stop] - prefix_hashes[start] * powers[stop - start]
+    ) % REPEAT_HASH_MOD
+
+
 def remove_end_repeats(waveforms):
+    # Remove repeats of the last lookback elements, for each lookback from
+    # len / 2 down to 2. The rolling hashes of all prefixes are computed
+    # once (truncation leaves them valid), so each test is O(1) and
+    # verifying a match costs no more than the elements it removes:
+    # O(n) expected time for n waveforms.
     repeat_len = int(len(waveforms) / 2)
     if repeat_len > 1:
-        repeat_range = [i for i in reversed(range(repeat_len + 1)) if i > 1]
-        for lookback in repeat_range:
-            while len(waveforms) >= lookback * 2:
-                if waveforms[-lookback:] != waveforms[-(lookback * 2) : -lookback]:
+        prefix_hashes = [0]
+        powers = [1]
+        for waveform in waveforms:
+            prefix_hashes.append(
+                (prefix_hashes[-1] * REPEAT_HASH_BASE + hash(waveform))
+                % REPEAT_HASH_MOD
+            )
+            powers.append((powers[-1] * REPEAT_HASH_BASE) % REPEAT_HASH_MOD)
+        n = len(waveforms)
+        for lookback in range(repeat_len, 1, -1):
+            while n >= lookback * 2:
+                if repeat_hash(prefix_hashes, powers, n - lookback, n) != repeat_hash(
+                    prefix_hashes, powers, n - lookback * 2, n - lookback
+                ) or list(waveforms[n - lookback : n]) != list(
+                    waveforms[n - lookback * 2 : n - lookback]
+                ):
                     break
-                waveforms = waveforms[:-lookback]
+                n -= lookback
+        waveforms = waveforms[:n]
     return waveforms
 
 
 def remove_repeats(seq):
-    non_repeats = seq[:1]
-    for i in seq[1:]:
-        if i != non_repeats[-1]:
-            non_repeats.append(i)
-            non_repeats = remove_end_repeats(non_repeats)
+    # Equivalent to appending each element that differs from the last, and
+    # calling remove_end_repeats() after each append. The output never
+    # contains a repeat, so after an append only the longest repeat ending at
+    # the new element must be removed, and removing it leaves a prefix that is
+    # also repeat free. A repeat of lookback L >= REPEAT_GRAM can only end at
+    # the new element if the last REPEAT_GRAM elements also end L elements
+    # earlier, so only those earlier positions are tested (found via the
+    # rolling hash of the last REPEAT_GRAM elements), plus the few lookbacks
+    # shorter than REPEAT_GRAM, each in O(1).
+    #
+    # Time is O(n + C) expected for n elements, where C is the number of
+    # earlier positions tested (at most the output length per element, so
+    # O(n * m) worst case for output length m, versus O(n * m^2) comparisons
+    # by calling remove_end_repeats() after each append).
+    non_repeats = []
+    prefix_hashes = [0]
+    powers = [1]
+    gram_hashes = []
+    gram_positions = defaultdict(list)
+    for i in seq:
+        if non_repeats and i == non_repeats[-1]:
+            continue
+        n = len(non_repeats) + 1
+        prefix_hashes.append(
+            (prefix_hashes[-1] * REPEAT_HASH_BASE + hash(i)) % REPEAT_HASH_MOD
+        )
+        if len(powers) <= n:
+            powers.append((powers[-1] * REPEAT_HASH_BASE) % REPEAT_HASH_MOD)
+        non_repeats.append(i)
+        gram_hash = None
+        lookbacks = []
+        if n >= REPEAT_GRAM:
+            gram_hash = repeat_hash(prefix_hashes, powers, n - REPEAT_GRAM, n)
+            positions = gram_positions[gram_hash]
+            # earliest position that could end the first half of a repeat.
+            first_pos = n - 1 - n // 2
+            lookbacks = [
+                n - 1 - pos
+                for pos in positions[bisect.bisect_left(positions, first_pos) :]
+                if n - 1 - pos >= REPEAT_GRAM
+            ]
+            positions.append(n - 1)
+        gram_hashes.append(gram_hash)
+        lookbacks.extend(range(min(REPEAT_GRAM - 1, n // 2), 1, -1))
+        for lookback in lookbacks:
+            if non_repeats[n - 1 - lookback] != i:
+                continue
+            if repeat_hash(prefix_hashes, powers, n - lookback, n) == repeat_hash(
+                prefix_hashes, powers, n - lookback * 2, n - lookback
+            ) and (
+                non_repeats[n - lookback :]
+                == non_repeats[n - lookback * 2 : n - lookback]
+            ):
+                for removed_hash in gram_hashes[n - lookback :]:
+                    if removed_hash is not None:
+                        gram_positions[removed_hash].pop()
+                del non_repeats[n - lookback :]
+                del prefix_hashes[n - lookback + 1 :]
+                del gram_hashes[n - lookback :]
+                break
     return non_repeats
 
 
@@ -156,41 +246,96 @@ def bits2control(val):
     return "0"
 
 
+CONTROL_LABELS = np.array([bits2control(val) for val in range(256)], dtype=object)
+
+
 def control_label(df):
     control_reg = bits2byte(df, V1_CONTROL_BITS, startbit=1)
     df["control"] = control_reg
-    control_df = pd.DataFrame(
-        [
-            {"control": val, "control_label": bits2control(val)}
-            for val in control_reg.unique()
-        ]
+    df = df.reset_index(drop=True)
+    df["control_label"] = pd.Series(
+        CONTROL_LABELS[df["control"].to_numpy(dtype=np.uint8)], dtype="str"
     )
-    return df.merge(control_df, how="left", on="control")
+    return df
+
+
+def group_starts(keys):
+    return np.flatnonzero(np.diff(keys, prepend=keys[:1] - 1))
 
 
 def control_labels(df):
     df = control_label(df)
-    labels = df.groupby("hashid").apply(
-        lambda ssf_df: "-".join(
-            remove_repeats(list(squeeze_diffs(ssf_df, ["control"])["control_label"]))
-        )
+    _, hashid_groups = np.unique(
+        df["hashid"].to_numpy(dtype=np.int64), return_inverse=True
     )
-    labels.name = "control_labels"
-    return df.merge(labels, how="left", on="hashid")
+    hashid_order = np.argsort(hashid_groups, kind="stable")
+    groups = hashid_groups[hashid_order]
+    controls = df["control"].to_numpy(dtype=np.uint8)[hashid_order]
+    starts = group_starts(groups)
+    # squeeze repeated controls within each SSF, as squeeze_diffs() would.
+    prev_controls = np.roll(controls, 1)
+    prev_controls[starts] = 0
+    changed = controls != prev_controls
+    changed_groups = groups[changed]
+    changed_controls = controls[changed]
+    changed_starts = group_starts(changed_groups)
+    changed_stops = np.append(changed_starts[1:], len(changed_groups))
+
+    # many SSFs share a control sequence, so label each distinct sequence once.
+    label_cache = {}
+    labels = np.full(len(starts), "", dtype=object)
+    for group, start, stop in zip(
+        changed_groups[changed_starts], changed_starts, changed_stops
+    ):
+        seq = changed_controls[start:stop].tobytes()
+        label = label_cache.get(seq, None)
+        if label is None:
+            label = "-".join(CONTROL_LABELS[list(remove_repeats(seq))])
+            label_cache[seq] = label
+        labels[group] = label
+    df["control_labels"] = pd.Series(labels[hashid_groups], dtype="str")
+    return df
+
+
+# control values (from control_label()) that do not have the test bit set.
+NOTEST_CONTROLS = [val for val in range(0, 256, 2) if "T" not in CONTROL_LABELS[val]]
+NOTEST_CONTROL_BITS = np.zeros(256, dtype=np.uint64)
+NOTEST_CONTROL_BITS[NOTEST_CONTROLS] = np.uint64(1) << np.arange(
+    len(NOTEST_CONTROLS), dtype=np.uint64
+)
 
 
 def unique_control_labels(df):
-    labels = df.groupby("hashid").apply(
-        lambda ssf_df: "-".join(
-            sorted(
-                waveform
-                for waveform in ssf_df["control_label"].unique()
-                if "T" not in waveform
+    _, hashid_groups = np.unique(
+        df["hashid"].to_numpy(dtype=np.int64), return_inverse=True
+    )
+    hashid_order = np.argsort(hashid_groups, kind="stable")
+    # set of distinct non-test waveforms per SSF, as a bitmask.
+    control_bits = NOTEST_CONTROL_BITS[
+        df["control"].to_numpy(dtype=np.uint8)[hashid_order]
+    ]
+    masks = np.bitwise_or.reduceat(
+        control_bits, group_starts(hashid_groups[hashid_order])
+    )
+    unique_masks, mask_groups = np.unique(masks, return_inverse=True)
+    mask_labels = np.array(
+        [
+            "-".join(
+                sorted(
+                    CONTROL_LABELS[val]
+                    for i, val in enumerate(NOTEST_CONTROLS)
+                    if int(mask) & 2**i
+                )
             )
-        )
+            for mask in unique_masks
+        ],
+        dtype=object,
+    )
+    df = df.reset_index(drop=True)
+    df["unique_control_labels"] = pd.Series(
+        mask_labels[mask_groups][hashid_groups], dtype="str"
     )
-    labels.name = "unique_control_labels"
-    return df.merge(labels, on="hashid", how="left")
+    return df
 
 
 def timer_args(parser):
@@ -362,7 +507,69 @@ def hash_vdf(vdf, meta_cols, hashid="hashid_noclock", ssf="ssf"):
     return vdf
 
 
-def split_vdf(sid, df, near=16, guard=96, maxprspeed=8):
+def cents(freq, base_freq, resolution=1):
+    # interval between register frequencies, NA where either is NA or 0.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interval = 1200 * np.log2(
+            freq.astype(pd.Float64Dtype()).to_numpy(dtype=np.float64, na_value=np.nan)
+            / base_freq.astype(pd.Float64Dtype()).to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+        )
+    interval[~np.isfinite(interval)] = np.nan
+    return (
+        pd.Series(interval / resolution, index=freq.index)
+        .round()
+        .astype(pd.Int64Dtype())
+    )
+
+
+def relative_vdf(vdf, ssf="ssf"):
+    # pitch as intervals from the first note, and pulse width and filter cutoff
+    # as deltas from their first values, so transposed SSFs have the same state.
+    rvdf = vdf.copy()
+    ssf_groups = rvdf.groupby(ssf, sort=False)
+    first_freq = ssf_groups["freq1"].transform("first")
+    for col in ("freq1", "freq3"):
+        if col in rvdf.columns:
+            rvdf[col] = cents(rvdf[col], first_freq, RELATIVE_CENTS)
+    for col in ("pwduty1", "fltcoff"):
+        if col in rvdf.columns:
+            rvdf[col] = rvdf[col].astype(pd.Int64Dtype()) - ssf_groups[col].transform(
+                "first"
+            ).astype(pd.Int64Dtype())
+    return rvdf
+
+
+def ssf_groups(ssf_df):
+    # map each SSF to the canonical (most common) SSF with the same relative hash,
+    # and the interval in cents it is transposed from the canonical SSF.
+    first_df = (
+        ssf_df.reset_index()
+        .groupby("hashid", sort=False)
+        .agg(
+            hashid_relative=("hashid_relative", "first"),
+            count=("count", "first"),
+            freq1=("freq1", "first"),
+        )
+        .reset_index()
+    )
+    canonical_df = (
+        first_df.sort_values(["count", "hashid"], ascending=[False, True])
+        .drop_duplicates("hashid_relative")[["hashid_relative", "hashid", "freq1"]]
+        .rename(columns={"hashid": "canonical_hashid", "freq1": "canonical_freq1"})
+    )
+    groups_df = first_df.merge(canonical_df, how="left", on="hashid_relative")
+    groups_df["transpose"] = cents(groups_df["freq1"], groups_df["canonical_freq1"])
+    groups_df.loc[groups_df["hashid"] == groups_df["canonical_hashid"], "transpose"] = 0
+    return (
+        groups_df[["hashid", "hashid_relative", "canonical_hashid", "transpose"]]
+        .sort_values(["canonical_hashid", "hashid"])
+        .set_index("hashid")
+    )
+
+
+def split_vdf(sid, df, near=16, guard=96, maxprspeed=8, relative_hash=False):
     fltcols = [
         col for col in df.columns if col.startswith("flt") and not col[-1].isdigit()
     ]
@@ -617,6 +824,14 @@ def split_vdf(sid, df, near=16, guard=96, maxprspeed=8):
         v_dfs = pd.concat(v_dfs)
         logging.debug("calculating row hashes on %s", sorted(non_meta_cols))
         v_dfs = hash_vdf(v_dfs, set(v_dfs.columns) - non_meta_cols)
+        if relative_hash:
+            logging.debug("calculating relative row hashes")
+            relative_v_dfs = relative_vdf(v_dfs)
+            v_dfs["hashid_relative"] = hash_vdf(
+                relative_v_dfs,
+                set(relative_v_dfs.columns) - non_meta_cols,
+                hashid="hashid_relative",
+            )["hashid_relative"].to_numpy()
         prefix_cols = ["pr_speed", "clock"]
         meta_cols = [
             col
@@ -656,12 +871,14 @@ def pad_ssf_duration(sid, ssf_df, first_clock_duration):
     return ssf_df
 
 
-def state2ssfs(sid, df, maxprspeed=8, near=16):
+def state2ssfs(sid, df, maxprspeed=8, near=16, relative_hash=False):
     ssf_log = []
     ssf_dfs = {}
     ssf_count = defaultdict(int)
 
-    for v, v_df in split_vdf(sid, df, maxprspeed=maxprspeed, near=near):
+    for v, v_df in split_vdf(
+        sid, df, maxprspeed=maxprspeed, near=near, relative_hash=relative_hash
+    ):
         ssfs = v_df["ssf"].nunique()
         voice_ssfs = set()
         logging.debug("splitting %u SSFs for voice %u", ssfs, v)
@@ -676,6 +893,10 @@ def state2ssfs(sid, df, maxprspeed=8, near=16):
             ]
             ssf_df = group_ssf_dfs[0]
             ssf_dfs[hashid] = pad_ssf_duration(sid, ssf_df, first_clock_start)
+            if relative_hash:
+                ssf_dfs[hashid]["hashid_relative"] = hash(
+                    (ssf_df["hashid_relative"].iat[0], pr_speed)
+                )
             ssf_count[hashid] += len(group_ssf_dfs)
             clock_starts = [ssf_df["clock_start"].iat[0] for ssf_df in group_ssf_dfs]
             ssf_log.extend(
@@ -7,6 +7,7 @@
 import logging
 from collections import defaultdict
 from functools import lru_cache
+import numpy as np
 from music21 import midi
 from desidulate.sidlib import timer_args
 
@@ -124,6 +125,46 @@ def compand_velocity(velocity):
     return round(((velocity / MAX_MIDI_VEL) * VEL_RANGE)) + MIN_VEL
 
 
+# Growable columnar storage for (clock, duration, pitch, velocity) notes.
+class PitchArrays:
+
+    def __init__(self, capacity=256):
+        self.size = 0
+        self.clock = np.empty(capacity, dtype=np.float64)
+        self.duration = np.empty(capacity, dtype=np.float64)
+        self.pitch = np.empty(capacity, dtype=np.int16)
+        self.velocity = np.empty(capacity, dtype=np.int16)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, clock, duration, pitch, velocity):
+        if self.size == len(self.clock):
+            capacity = len(self.clock) * 2
+            for col in ("clock", "duration", "pitch", "velocity"):
+                arr = getattr(self, col)
+                new_arr = np.empty(capacity, dtype=arr.dtype)
+                new_arr[: self.size] = arr
+                setattr(self, col, new_arr)
+        i = self.size
+        self.clock[i] = clock
+        self.duration[i] = duration
+        self.pitch[i] = pitch
+        self.velocity[i] = velocity
+        self.size += 1
+
+    def columns(self, mask=None):
+        cols = (
+            self.clock[: self.size],
+            self.duration[: self.size],
+            self.pitch[: self.size],
+            self.velocity[: self.size],
+        )
+        if mask is not None:
+            cols = tuple(col[mask] for col in cols)
+        return cols
+
+
 class SidMidiFile:
 
     def __init__(self, sid, bpm=None, lead_program=81, bass_program=39, drum_program=0):
@@ -135,8 +176,8 @@ class SidMidiFile:
         self.lead_program = lead_program
         self.bass_program = bass_program
         self.drum_program = drum_program
-        self.pitches = defaultdict(list)
-        self.drum_pitches = defaultdict(list)
+        self.pitches = defaultdict(PitchArrays)
+        self.drum_pitches = defaultdict(PitchArrays)
         self.tpqn = 960
         self.sid_env_max = 15
         self.sid_velocity = {
@@ -188,15 +229,27 @@ class SidMidiFile:
     def clock_to_ticks(self, clock):
         return self.sid.clock_to_ticks(clock, self.bpm, self.tpqn)
 
-    def add_note(self, track, channel, pitch, velocity, last_clock, clock, duration):
+    def add_note_ticks(
+        self, track, channel, pitch, velocity, note_on_ticks, note_off_ticks
+    ):
         note_on = make_event(track, midi.ChannelVoiceMessages.NOTE_ON, channel)
         note_on.pitch = pitch
         note_on.velocity = velocity
-        add_event(track, note_on, self.clock_to_ticks(clock - last_clock), channel)
+        add_event(track, note_on, note_on_ticks, channel)
         note_off = make_event(track, midi.ChannelVoiceMessages.NOTE_OFF, channel)
         note_off.pitch = pitch
         note_off.velocity = 0
-        add_event(track, note_off, self.clock_to_ticks(duration), channel)
+        add_event(track, note_off, note_off_ticks, channel)
+
+    def add_note(self, track, channel, pitch, velocity, last_clock, clock, duration):
+        self.add_note_ticks(
+            track,
+            channel,
+            pitch,
+            velocity,
+            self.clock_to_ticks(clock - last_clock),
+            self.clock_to_ticks(duration),
+        )
         return clock + duration
 
     def add_program_change(self, track, channel, program):
@@ -204,77 +257,70 @@ class SidMidiFile:
         pc.data = program
         add_event(track, pc, 0, channel)
 
-    def deoverlap_pitches(self, voice_pitch_data):
-        deoverlapped = []
-        if voice_pitch_data:
-            clock_order = sorted(voice_pitch_data, key=lambda x: x[0])
-            last_pitch_data = clock_order[-1]
-            deoverlapped = []
-            for i, pitch_data in enumerate(clock_order[:-1]):
-                next_pitch_data = clock_order[i + 1]
-                clock, duration, pitch, velocity = pitch_data
-                next_clock = next_pitch_data[0]
-                duration = min(duration, next_clock - clock)
-                assert duration > 0, (pitch_data, next_pitch_data)
-                deoverlapped.append((clock, duration, pitch, velocity))
-            deoverlapped.append(last_pitch_data)
-        return deoverlapped
-
-    def write_pitches(self, smf_track, channel, program, voice_pitch_data):
+    def deoverlap_pitches(self, clock, duration, pitch, velocity):
+        # truncate each note so that it ends before the next note starts.
+        clock_order = np.argsort(clock, kind="stable")
+        clock, duration, pitch, velocity = (
+            col[clock_order] for col in (clock, duration, pitch, velocity)
+        )
+        if len(clock) > 1:
+            duration[:-1] = np.minimum(duration[:-1], np.diff(clock))
+            assert (duration[:-1] > 0).all(), (clock, duration)
+        return (clock, duration, pitch, velocity)
+
+    def write_pitches(self, smf_track, channel, program, pitch_cols):
         track = midi.MidiTrack(smf_track)
         self.add_program_change(track, channel, program)
-        last_clock = 0
-        for pitch_data in self.deoverlap_pitches(voice_pitch_data):
-            clock, duration, pitch, velocity = pitch_data
-            assert velocity
-            last_clock = self.add_note(
-                track, channel, pitch, velocity, last_clock, clock, duration
-            )
+        clock, duration, pitch, velocity = self.deoverlap_pitches(*pitch_cols)
+        assert velocity.all()
+        last_clock = np.concatenate(([0], clock[:-1] + duration[:-1]))
+        note_on_ticks = self.clock_to_ticks(clock - last_clock)
+        note_off_ticks = self.clock_to_ticks(duration)
+        for note in zip(
+            pitch.tolist(),
+            velocity.tolist(),
+            note_on_ticks.tolist(),
+            note_off_ticks.tolist(),
+        ):
+            self.add_note_ticks(track, channel, *note)
         add_end_of_track(track, channel)
         return track
 
     def write(self, file_name):
         track_pitches = []
 
-        for voicenum, voice_pitch_data in self.pitches.items():
-            if voice_pitch_data:
-                bass_pitch_data = []
-                lead_pitch_data = []
-                for pitch_data in voice_pitch_data:
-                    clock, duration, pitch, velocity = pitch_data
-                    if pitch < BASS_SPLIT_PITCH:
-                        bass_pitch_data.append(pitch_data)
-                    else:
-                        lead_pitch_data.append(pitch_data)
-                for program, pitch_data in (
-                    (self.lead_program, lead_pitch_data),
-                    (self.bass_program, bass_pitch_data),
+        for voice_pitches in self.pitches.values():
+            if voice_pitches:
+                bass = voice_pitches.columns()[2] < BASS_SPLIT_PITCH
+                for program, mask in (
+                    (self.lead_program, ~bass),
+                    (self.bass_program, bass),
                 ):
-                    if pitch_data:
-                        track_pitches.append((None, program, pitch_data))
-        for voicenum, voice_pitch_data in self.drum_pitches.items():
-            if voice_pitch_data:
+                    if mask.any():
+                        track_pitches.append(
+                            (None, program, voice_pitches.columns(mask))
+                        )
+        for voice_pitches in self.drum_pitches.values():
+            if voice_pitches:
                 track_pitches.append(
-                    (DRUM_CHANNEL, self.drum_program, voice_pitch_data)
+                    (DRUM_CHANNEL, self.drum_program, voice_pitches.columns())
                 )
 
         tracks = []
         for smf_track, pitches in enumerate(track_pitches, start=1):
-            channel, program, voice_pitch_data = pitches
+            channel, program, pitch_cols = pitches
             if channel is None:
                 channel = smf_track
-            tracks.append(
-                self.write_pitches(smf_track, channel, program, voice_pitch_data)
-            )
+            tracks.append(self.write_pitches(smf_track, channel, program, pitch_cols))
         write_midi(file_name, self.tpqn, tracks)
 
     def add_pitch(self, voicenum, clock, duration, pitch, velocity):
         assert duration > 0, duration
-        self.pitches[voicenum].append((clock, duration, pitch, velocity))
+        self.pitches[voicenum].append(clock, duration, pitch, velocity)
 
     def add_drum_pitch(self, voicenum, clock, duration, pitch, velocity):
         assert duration > 0, duration
-        self.drum_pitches[voicenum].append((clock, duration, pitch, velocity))
+        self.drum_pitches[voicenum].append(clock, duration, pitch, velocity)
 
     def get_note_starts(self, row_states):
         last_note = None
@@ -85,11 +85,10 @@ class SidWrap:
         )
 
         logging.info("using PR frequency %f Hz (%u cycles)", self.int_freq, self.clockq)
-        self.resid = SoundInterfaceDevice(
-            model=model,
-            clock_frequency=self.clock_freq,
-            sampling_frequency=sampling_frequency,
-        )
+        self.model = model
+        self.sampling_frequency = sampling_frequency
+        self.resid = None
+        self.reset()
         self.attack_clock = {
             k: int(v / 1e3 * self.clock_freq) for k, v in self.ATTACK_MS.items()
         }
@@ -97,6 +96,15 @@ class SidWrap:
             k: int(v / 1e3 * self.clock_freq) for k, v in self.DECAY_RELEASE_MS.items()
         }
 
+    def reset(self):
+        # resid.reset() does not clear all emulator state, so samples rendered
+        # after a reset can depend on what was rendered before it.
+        self.resid = SoundInterfaceDevice(
+            model=self.model,
+            clock_frequency=self.clock_freq,
+            sampling_frequency=self.sampling_frequency,
+        )
+
     def qn_to_clock(self, qn, bpm):
         return self.clock_freq * 60 / bpm * qn
 
@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# HVSC Songlengths.md5 parser, and a compact memory mapped index of it.
+# https://hvsc.c64.org/download/C64Music/DOCUMENTS/Songlengths.faq
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+
+SONGLENGTHS_INDEX_MAGIC = b"DSSL"
+SONGLENGTHS_INDEX_VERSION = 2
+# magic, version, tunes, hash table slots, song lengths,
+# md5 digest of Songlengths.md5 paths, sizes and mtimes.
+SONGLENGTHS_HEADER = struct.Struct("<4sIIII16s")
+# tune number (EMPTY_SLOT if unused).
+SONGLENGTHS_SLOT = struct.Struct("<I")
+# md5 digest, md5 digest of path, offset of first song length, songs.
+SONGLENGTHS_TUNE = struct.Struct("<16s16sII")
+SONGLENGTHS_LENGTH = struct.Struct("<I")
+EMPTY_SLOT = 0xFFFFFFFF
+
+
+def parse_songlength(raw):
+    # [m]m:ss[.SSS], rounding any fraction up to the next second.
+    minutes, _, seconds = raw.partition(":")
+    seconds, _, fraction = seconds.partition(".")
+    if not (
+        minutes.isdigit() and seconds.isdigit() and (not fraction or fraction.isdigit())
+    ):
+        raise ValueError(raw)
+    tunelength = int(minutes) * 60 + int(seconds)
+    if fraction:
+        tunelength += 1
+    return tunelength
+
+
+def parse_songlengths(songlengths_file):
+    # yields (path, md5, song lengths) for each tune.
+    tunename = None
+    with open(songlengths_file, encoding="utf8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.startswith("; ") and line.endswith(".sid"):
+                tunename = os.path.join("C64Music", line[3:])
+                continue
+            md5_hash, sep, raw_lengths = line.partition("=")
+            if not sep or not md5_hash.isalnum() or md5_hash.lower() != md5_hash:
+                continue
+            if not raw_lengths or raw_lengths.strip(" \t0123456789:.") != "":
+                continue
+            assert tunename
+            yield (
+                tunename,
+                md5_hash,
+                tuple(parse_songlength(raw) for raw in raw_lengths.split()),
+            )
+            tunename = None
+
+
+def _slot(digest, mask):
+    return int.from_bytes(digest[:8], "little") & mask
+
+
+def songlengths_files_list(songlengths_files):
+    if isinstance(songlengths_files, (str, os.PathLike)):
+        return [str(songlengths_files)]
+    return [str(songlengths_file) for songlengths_file in songlengths_files]
+
+
+def songlengths_sources(songlengths_files):
+    # identifies the Songlengths.md5 files an index was built from.
+    sources = hashlib.md5()
+    for songlengths_file in songlengths_files_list(songlengths_files):
+        stat = os.stat(songlengths_file)
+        sources.update(
+            (
+                "%s\0%u\0%u\n" % (songlengths_file, stat.st_size, stat.st_mtime_ns)
+            ).encode("utf8")
+        )
+    return sources.digest()
+
+
+def write_songlengths_index(songlengths_files, index_file):
+    # one Songlengths.md5 or several, where later files override earlier ones.
+    songlengths_files = songlengths_files_list(songlengths_files)
+    # before parsing, so a file changed while parsing causes a rebuild next time.
+    sources = songlengths_sources(songlengths_files)
+    tunes = list(
+        {
+            tune[0]: tune
+            for songlengths_file in songlengths_files
+            for tune in parse_songlengths(songlengths_file)
+        }.values()
+    )
+    slots = 2
+    while slots < len(tunes) * 2:
+        slots *= 2
+    mask = slots - 1
+    md5_slots = [EMPTY_SLOT] * slots
+    path_slots = [EMPTY_SLOT] * slots
+    tune_entries = []
+    lengths = []
+    for i, tune in enumerate(tunes):
+        tunename, md5_hash, tunelengths = tune
+        digests = (
+            bytes.fromhex(md5_hash),
+            hashlib.md5(tunename.encode("utf8")).digest(),
+        )
+        for field, table in enumerate((md5_slots, path_slots)):
+            digest = digests[field]
+            slot = _slot(digest, mask)
+            while (
+                table[slot] != EMPTY_SLOT and tune_entries[table[slot]][field] != digest
+            ):
+                slot = (slot + 1) & mask
+            table[slot] = i
+        tune_entries.append(digests + (len(lengths), len(tunelengths)))
+        lengths.extend(tunelengths)
+
+    index_file_tmp = index_file + ".tmp"
+    with open(index_file_tmp, "wb") as f:
+        f.write(
+            SONGLENGTHS_HEADER.pack(
+                SONGLENGTHS_INDEX_MAGIC,
+                SONGLENGTHS_INDEX_VERSION,
+                len(tunes),
+                slots,
+                len(lengths),
+                sources,
+            )
+        )
+        for table in (md5_slots, path_slots):
+            f.write(struct.pack(f"<{slots}I", *table))
+        f.write(b"".join(SONGLENGTHS_TUNE.pack(*tune) for tune in tune_entries))
+        f.write(struct.pack(f"<{len(lengths)}I", *lengths))
+    os.replace(index_file_tmp, index_file)
+    logging.info("indexed %u tunes from %s", len(tunes), " ".join(songlengths_files))
+
+
+class SongLengths:
+    # Memory mapped Songlengths.md5 index, by path (e.g. C64Music/...) or md5.
+
+    def __init__(self, index_file):
+        with open(index_file, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self.mmap[: SONGLENGTHS_HEADER.size]
+        if len(header) != SONGLENGTHS_HEADER.size or header[:8] != struct.pack(
+            "<4sI", SONGLENGTHS_INDEX_MAGIC, SONGLENGTHS_INDEX_VERSION
+        ):
+            self.mmap.close()
+            raise ValueError(f"{index_file}: not a songlengths index")
+        _, _, self.tunes, self.slots, _, self.sources = SONGLENGTHS_HEADER.unpack(
+            header
+        )
+        self.mask = self.slots - 1
+        self.md5_slots = SONGLENGTHS_HEADER.size
+        self.path_slots = self.md5_slots + self.slots * SONGLENGTHS_SLOT.size
+        self.tune_entries = self.path_slots + self.slots * SONGLENGTHS_SLOT.size
+        self.lengths = self.tune_entries + self.tunes * SONGLENGTHS_TUNE.size
+
+    def close(self):
+        self.mmap.close()
+
+    def __len__(self):
+        return self.tunes
+
+    def _find(self, table, field, digest):
+        # returns song lengths of tune matching digest, if any.
+        slot = _slot(digest, self.mask)
+        while True:
+            (tune,) = SONGLENGTHS_SLOT.unpack_from(
+                self.mmap, table + slot * SONGLENGTHS_SLOT.size
+            )
+            if tune == EMPTY_SLOT:
+                return None
+            tune_entry = SONGLENGTHS_TUNE.unpack_from(
+                self.mmap, self.tune_entries + tune * SONGLENGTHS_TUNE.size
+            )
+            if tune_entry[field] == digest:
+                offset, songs = tune_entry[2:]
+                return struct.unpack_from(
+                    f"<{songs}I",
+                    self.mmap,
+                    self.lengths + offset * SONGLENGTHS_LENGTH.size,
+                )
+            slot = (slot + 1) & self.mask
+
+    def by_md5(self, md5_hash):
+        try:
+            digest = bytes.fromhex(md5_hash)
+        except ValueError:
+            return None
+        if len(digest) != 16:
+            return None
+        return self._find(self.md5_slots, 0, digest)
+
+    def by_path(self, path):
+        return self._find(self.path_slots, 1, hashlib.md5(path.encode("utf8")).digest())
+
+    def get(self, key, default=None):
+        tunelengths = self.by_path(key)
+        if tunelengths is None:
+            tunelengths = self.by_md5(key)
+        if tunelengths is None:
+            return default
+        # song number (from 1) to length in seconds.
+        return dict(enumerate(tunelengths, start=1))
+
+    def __getitem__(self, key):
+        tunelengths = self.get(key)
+        if tunelengths is None:
+            raise KeyError(key)
+        return tunelengths
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+def songlengths_index(songlengths_files, index_file=None):
+    # (re)build the index if any Songlengths.md5 has changed, and map it.
+    songlengths_files = songlengths_files_list(songlengths_files)
+    if index_file is None:
+        index_file = songlengths_files[0] + ".index"
+        if len(songlengths_files) > 1:
+            # one index for each set of Songlengths.md5 files.
+            sources = hashlib.md5("\n".join(songlengths_files).encode("utf8"))
+            index_file = "%s.%s.index" % (
+                songlengths_files[0],
+                sources.hexdigest()[:8],
+            )
+    if os.path.exists(index_file):
+        try:
+            songlengths = SongLengths(index_file)
+        except ValueError:
+            # empty, or an older index version.
+            songlengths = None
+        if songlengths is not None:
+            if songlengths.sources == songlengths_sources(songlengths_files):
+                return songlengths
+            songlengths.close()
+    write_songlengths_index(songlengths_files, index_file)
+    return SongLengths(index_file)
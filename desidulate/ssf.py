@@ -10,11 +10,13 @@
 # http://www.ucapps.de/howto_sid_wavetables_1.html
 
 import logging
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
-from desidulate.fileio import out_path, read_csv
-from desidulate.sidlib import set_sid_dtype, control_labels
+from desidulate.sidlib import set_sid_dtype, control_labels, group_starts
 from desidulate.sidmidi import closest_midi, MEMBRANE_DRUM_MAP, CYMBAL_DRUMS
 from desidulate.sidwav import state2samples, samples_loudestf, readwav
+from desidulate.ssfstore import SsfStore, ssf_store_path
 
 INITIAL_FRAMES = 4
 
@@ -43,6 +45,17 @@ def add_freq_notes_df(sid, ssfs_df):
     return set_sid_dtype(ssfs_df).merge(freq_notes_df, how="left", on="freq1")
 
 
+def smf_transcribe(smf, pitches, drum_pitches, first_clock, voicenum, total_duration):
+    for clock, duration, pitch, velocity in pitches:
+        if pd.notna(total_duration) and clock > total_duration:
+            break
+        smf.add_pitch(voicenum, first_clock + clock, duration, pitch, velocity)
+    for clock, duration, pitch, velocity in drum_pitches:
+        if pd.notna(total_duration) and clock > total_duration:
+            break
+        smf.add_drum_pitch(voicenum, first_clock + clock, duration, pitch, velocity)
+
+
 class SidSoundFragment:
 
     def __init__(
@@ -166,17 +179,14 @@ class SidSoundFragment:
         self._set_nondrum_pitches()
 
     def smf_transcribe(self, smf, first_clock, voicenum, total_duration):
-        for clock, duration, pitch, velocity in self.pitches:
-            if pd.notna(total_duration) and clock > total_duration:
-                break
-            smf.add_pitch(voicenum, first_clock + clock, duration, pitch, velocity)
-        if self.percussion:
-            for clock, duration, pitch, velocity in self.drum_pitches:
-                if pd.notna(total_duration) and clock > total_duration:
-                    break
-                smf.add_drum_pitch(
-                    voicenum, first_clock + clock, duration, pitch, velocity
-                )
+        smf_transcribe(
+            smf,
+            self.pitches,
+            self.drum_pitches if self.percussion else (),
+            first_clock,
+            voicenum,
+            total_duration,
+        )
 
     def instrument(self, base_instrument):
         base_instrument.update(
@@ -191,6 +201,55 @@ class SidSoundFragment:
         return base_instrument
 
 
+# Picklable summary of a SidSoundFragment, sufficient to transcribe it to SMF.
+class SidSoundFragmentTranscription:
+
+    def __init__(self, ssf, base_instrument):
+        self.percussion = ssf.percussion
+        self.pitches = tuple(ssf.pitches)
+        self.drum_pitches = tuple(ssf.drum_pitches)
+        self.instrument = ssf.instrument(base_instrument)
+
+    def smf_transcribe(self, smf, first_clock, voicenum, total_duration):
+        smf_transcribe(
+            smf,
+            self.pitches,
+            self.drum_pitches if self.percussion else (),
+            first_clock,
+            voicenum,
+            total_duration,
+        )
+
+
+# Lazy per-hashid access to SSFs, backed by a frame sorted by hashid.
+class SidSoundFragmentFrames(Mapping):
+
+    def __init__(self, ssfs_df):
+        self.ssfs_df = ssfs_df.sort_values("hashid", kind="stable", ignore_index=True)
+        hashids = self.ssfs_df["hashid"].to_numpy(dtype=np.int64)
+        starts = group_starts(hashids)
+        stops = np.append(starts[1:], len(hashids))
+        self.offsets = dict(zip(hashids[starts].tolist(), zip(starts, stops)))
+        self.ssf_dfs = {}
+
+    def __getitem__(self, hashid):
+        ssf_df = self.ssf_dfs.get(hashid, None)
+        if ssf_df is None:
+            start, stop = self.offsets[hashid]
+            ssf_df = self.ssfs_df.iloc[start:stop].set_index("clock").ffill()
+            self.ssf_dfs[hashid] = ssf_df
+        return ssf_df
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, hashid):
+        return hashid in self.offsets
+
+
 class SidSoundFragmentParser:
 
     def __init__(self, logfile, percussion, sid):
@@ -199,16 +258,16 @@ class SidSoundFragmentParser:
         self.sid = sid
         self.ssf_dfs = {}
 
-    def read_ssfs(self):
-        ssfs_df = add_freq_notes_df(
-            self.sid, read_csv(out_path(self.logfile, "ssf.zst"), dtype=pd.Int64Dtype())
-        )
+    def read_ssfs(self, hashids=None, ssfs_df=None):
+        # ssfs_df may be passed in, already read (e.g. from reg2ssf).
+        if ssfs_df is None:
+            ssfs_df = SsfStore(ssf_store_path(self.logfile)).read(hashids)
+        # only label and materialize SSFs that will be used.
+        elif hashids is not None:
+            ssfs_df = ssfs_df[ssfs_df["hashid"].isin(hashids)]
         # TODO: handle vol/samples
-        ssfs_df = control_labels(ssfs_df)
         ssfs_df = ssfs_df[ssfs_df["vol"].isna()]
+        ssfs_df = control_labels(add_freq_notes_df(self.sid, ssfs_df))
         ssfs_df["vol"] = 15
-        self.ssf_dfs = {
-            hashid: ssf_df.set_index("clock").fillna(method="ffill")
-            for hashid, ssf_df in ssfs_df.groupby("hashid")
-        }
+        self.ssf_dfs = SidSoundFragmentFrames(ssfs_df)
         logging.info("read %u patches", len(self.ssf_dfs))
@@ -13,16 +13,84 @@ import argparse
 import logging
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
-from desidulate.fileio import midi_path, out_path, read_csv
+from desidulate.fileio import midi_path, out_path
 from desidulate.sidmidi import SidMidiFile, midi_args
 from desidulate.sidwrap import get_sid
-from desidulate.ssf import SidSoundFragment, SidSoundFragmentParser
-
-
-def main():
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
-    ALL_VOICES = frozenset([1, 2, 3])
+from desidulate.ssf import (
+    SidSoundFragment,
+    SidSoundFragmentParser,
+    SidSoundFragmentTranscription,
+)
+from desidulate.ssfstore import read_ssf_log
+
+# (percussion, sid, smf) for this process, set by init_ssf_worker().
+ssf_worker = None
+
+
+def init_ssf_worker(pal, cia, bpm, percussion):
+    global ssf_worker
+    sid = get_sid(pal, cia)
+    ssf_worker = (percussion, sid, SidMidiFile(sid, bpm))
+
+
+def parse_ssf(hashid, ssf_df, wav_file):
+    percussion, sid, smf = ssf_worker
+    # render from fresh SID state, so results do not depend on scheduling.
+    sid.reset()
+    ssf = SidSoundFragment(percussion, sid, ssf_df, smf, wav_file=wav_file)
+    return SidSoundFragmentTranscription(ssf, {"hashid": hashid})
+
+
+def run_ssf_jobs(args, ssf_jobs):
+    init_args = (args.pal, args.cia, args.bpm, args.percussion)
+    if args.workers > 1 and len(ssf_jobs) > 1:
+        with ProcessPoolExecutor(
+            max_workers=args.workers, initializer=init_ssf_worker, initargs=init_args
+        ) as pool:
+            futures = [pool.submit(parse_ssf, *ssf_job) for ssf_job in ssf_jobs]
+            for future in as_completed(futures):
+                yield future.result()
+        return
+    init_ssf_worker(*init_args)
+    for ssf_job in ssf_jobs:
+        yield parse_ssf(*ssf_job)
+
+
+def parse_ssfs(args, parser, ssf_log_df):
+    # Analyse each distinct SSF once, at its first occurrence in the log.
+    first_rows = ssf_log_df[ssf_log_df["hashid"].isin(list(parser.ssf_dfs))]
+    first_rows = first_rows.drop_duplicates("hashid")
+    ssf_jobs = []
+    for row in first_rows.itertuples():
+        ssf_df = parser.ssf_dfs[row.hashid]
+        wav_file = out_path(args.ssflogfile, "%d.wav" % row.hashid)
+        if not os.path.exists(wav_file):
+            wav_file = None
+        duration = row.duration
+        if pd.notna(duration):
+            ssf_df.rename(index={ssf_df.index[-1]: duration}, inplace=True)
+        ssf_jobs.append((row.hashid, ssf_df, wav_file))
+
+    ssf_transcriptions = {}
+    for ssf in run_ssf_jobs(args, ssf_jobs):
+        ssf_transcriptions[ssf.instrument["hashid"]] = ssf
+        logging.info(
+            "parsed ssf %d (%u of %u)",
+            ssf.instrument["hashid"],
+            len(ssf_transcriptions),
+            len(ssf_jobs),
+        )
+
+    # return in order of first occurrence.
+    return {hashid: ssf_transcriptions[hashid] for hashid, _, _ in ssf_jobs}
+
+
+ALL_VOICES = frozenset([1, 2, 3])
+
+
+def ssf2midi_parser():
     parser = argparse.ArgumentParser(description="Convert ssf log into a MIDI file")
     parser.add_argument("ssflogfile", default="", help="SSF log file to read")
     parser.add_argument("--midifile", default="", help="MIDI file to write")
@@ -34,20 +102,31 @@ def main():
         type=str,
         help="Voice mask",
     )
+    parser.add_argument(
+        "--workers",
+        default=4,
+        type=int,
+        help="workers to use when parsing SSFs",
+    )
     midi_args(parser)
-    args = parser.parse_args()
+    return parser
+
+
+def ssf2midi(args, ssf_log_df=None, ssfs_df=None):
+    # ssf_log_df and ssfs_df may be passed in, already read (e.g. from reg2ssf).
     voicemask = frozenset([int(v) for v in args.voicemask.split(",")])
 
-    ssf_log_df = read_csv(args.ssflogfile, dtype=pd.Int64Dtype())
+    if ssf_log_df is None:
+        ssf_log_df = read_ssf_log(args.ssflogfile, args.minclock, args.maxclock)
     cols = set(ssf_log_df.columns)
 
     if len(ssf_log_df) == 0:
         print("empty SSF log")
-        sys.exit(0)
+        return 0
 
     if cols != {"clock", "hashid", "voice"}:
         print("not an SSF log file (cols %s)" % cols)
-        sys.exit(1)
+        return 1
 
     if args.maxclock:
         ssf_log_df = ssf_log_df[
@@ -76,31 +155,14 @@ def main():
     sid = get_sid(args.pal, args.cia)
     smf = SidMidiFile(sid, args.bpm)
     parser = SidSoundFragmentParser(args.ssflogfile, args.percussion, sid)
-    parser.read_ssfs()
+    parser.read_ssfs(hashids=ssf_log_df["hashid"].unique(), ssfs_df=ssfs_df)
 
-    ssf_cache = {}
-    ssf_instruments = []
+    ssf_transcriptions = parse_ssfs(args, parser, ssf_log_df)
+    ssf_instruments = [ssf.instrument for ssf in ssf_transcriptions.values()]
     for row in ssf_log_df.itertuples():
-        if row.hashid not in parser.ssf_dfs:
-            continue
-        ssf = ssf_cache.get(row.hashid, None)
+        ssf = ssf_transcriptions.get(row.hashid, None)
         if ssf is None:
-            ssf_df = parser.ssf_dfs[row.hashid]
-            wav_file = out_path(args.ssflogfile, "%d.wav" % row.hashid)
-            if not os.path.exists(wav_file):
-                wav_file = None
-            duration = row.duration
-            if pd.notna(duration):
-                ssf_df.rename(index={ssf_df.index[-1]: duration}, inplace=True)
-            ssf = SidSoundFragment(args.percussion, sid, ssf_df, smf, wav_file=wav_file)
-            ssf_cache[row.hashid] = ssf
-            ssf_instruments.append(ssf.instrument({"hashid": row.hashid}))
-            logging.info(
-                "parsed ssf %d (%u of %u)",
-                row.hashid,
-                len(ssf_cache),
-                len(parser.ssf_dfs),
-            )
+            continue
         ssf.smf_transcribe(smf, row.clock, row.voice, row.duration)
 
     ssf_instrument_file = out_path(args.ssflogfile, "inst.txt.zst")
@@ -111,6 +173,13 @@ def main():
     if not midifile:
         midifile = midi_path(args.ssflogfile)
     smf.write(midifile)
+    return 0
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = ssf2midi_parser().parse_args()
+    sys.exit(ssf2midi(args))
 
 
 if __name__ == "__main__":
@@ -1,80 +1,79 @@
 #!/usr/bin/python3
 
 import argparse
+import logging
+import sys
+import numpy as np
 import pandas as pd
+from desidulate.fileio import out_path
 from desidulate.sidlib import CONTROL_BITS, timer_args
 from desidulate.sidwrap import get_sid
 from desidulate.ssf import add_freq_notes_df
-from desidulate.swilib import sw_rle_diff, dot0
+from desidulate.ssfstore import SsfStore
+from desidulate.swilib import sw_rle_diff_int, dot0
 
-parser = argparse.ArgumentParser(description="Transcribe SSF to Sid Wizard instrument")
-parser.add_argument("ssffile", help="SSF file")
-parser.add_argument("hashid", type=int, help="hashid to transcribe")
-timer_args(parser)
+DROP_COLS = ["hashid_noclock", "hashid_relative", "count", "rate", "vol", "hashid"]
 
-args = parser.parse_args()
-sid = get_sid(args.pal, args.cia)
 
+def int_col(df, col):
+    if col in df.columns:
+        return df[col].fillna(0).to_numpy(dtype=np.int64)
+    return np.zeros(len(df), dtype=np.int64)
 
-def wf_from_row(row):
-    val = 0
-    for b, col in enumerate(CONTROL_BITS):
-        col_val = getattr(row, col + "1", 0)
-        if pd.notna(col_val) and col_val:
-            val += 2**b
-    return "%2.2X" % val
+
+def hex_col(vals, width):
+    fmt = "%%%u.%uX" % (width, width)
+    return [fmt % val for val in vals]
 
 
-def arp_from_row(row):
-    arp = getattr(row, "freq1", 0)
-    val = 0
-    if pd.notna(arp):
-        val = row.closest_note - 12 + 0x81
-    return "%2.2X" % val
+def wf_col(ssf_df):
+    val = np.zeros(len(ssf_df), dtype=np.int64)
+    for b, col in enumerate(CONTROL_BITS):
+        val |= (int_col(ssf_df, col + "1") != 0) << b
+    return val
 
 
-def pulse_from_row(row):
-    pwduty = getattr(row, "pwduty1", 0)
-    val = 0
-    if pd.notna(pwduty):
-        val = pwduty | 0x8000
-    return "%4.4X" % val
+def arp_col(ssf_df):
+    val = np.zeros(len(ssf_df), dtype=np.int64)
+    if "freq1" in ssf_df.columns:
+        notes = ssf_df["freq1"].notna().to_numpy()
+        val[notes] = int_col(ssf_df, "closest_note")[notes] - 12 + 0x81
+    return val
 
 
-def filter_from_row(row):
-    val = 0
-    route_map = {
-        (0, 0, 0): 0x8,
-        (1, 0, 0): 0x9,
-        (1, 1, 0): 0xB,
-        (0, 0, 1): 0xC,
-        (1, 0, 1): 0xD,
-        (0, 1, 1): 0xE,
-        (1, 1, 1): 0xF,
-    }
+def pulse_col(ssf_df):
+    val = np.zeros(len(ssf_df), dtype=np.int64)
+    if "pwduty1" in ssf_df.columns:
+        pulse = ssf_df["pwduty1"].notna().to_numpy()
+        val[pulse] = int_col(ssf_df, "pwduty1")[pulse] | 0x8000
+    return val
 
-    if pd.notna(row.flt1) and row.flt1:
-        coff = row.fltcoff
-        res = row.fltres
-        route = route_map.get((row.fltlo, row.fltband, row.flthi)) << 4
-        val = ((route | res) << 8) | (coff >> 3)
 
-    return "%4.4X" % val
+def filter_col(ssf_df):
+    # route is 0x8 | lo | band << 1 | hi << 2.
+    route = (
+        0x8
+        | int_col(ssf_df, "fltlo")
+        | (int_col(ssf_df, "fltband") << 1)
+        | (int_col(ssf_df, "flthi") << 2)
+    )
+    val = ((((route << 4) | int_col(ssf_df, "fltres")) << 8)) | (
+        int_col(ssf_df, "fltcoff") >> 3
+    )
+    return np.where(int_col(ssf_df, "flt1") != 0, val, 0)
 
 
-def main():
-    df = pd.read_csv(args.ssffile, dtype=pd.Int64Dtype())
-    ssf_df = (
-        df[df.hashid == args.hashid]
-        .drop(["hashid_noclock", "count", "rate", "vol", "hashid", "fltext"], axis=1)
-        .reset_index(drop=True)
+def ssf_swi(sid, ssf_df):
+    # Sid Wizard instrument tables for one SSF.
+    ssf_df = ssf_df.drop(
+        [col for col in DROP_COLS + ["fltext"] if col in ssf_df.columns], axis=1
+    ).reset_index(drop=True)
+    atk1, dec1, sus1, rel1, pr_speed = (
+        ssf_df[["atk1", "dec1", "sus1", "rel1", "pr_speed"]].iloc[0].fillna(0)
     )
-    atk1, dec1, sus1, rel1, pr_speed, test1_initial = ssf_df[
-        ["atk1", "dec1", "sus1", "rel1", "pr_speed", "test1"]
-    ].iloc[0]
     ssf_df = ssf_df.drop(["atk1", "dec1", "sus1", "rel1", "pr_speed"], axis=1)
 
-    if atk1 == 0:
+    if atk1 == 0 and ssf_df["freq1"].notna().any():
         first_freq = ssf_df.index[ssf_df["freq1"].notna()][0]
         ssf_df = ssf_df[first_freq:]
         ssf_df["pr_frame"] = ssf_df["pr_frame"] - ssf_df["pr_frame"].min()
@@ -85,40 +84,69 @@ def main():
     ssf_df = add_freq_notes_df(sid, ssf_df)
     ssf_df["real_freq"] = ssf_df["real_freq"].round(2)
 
-    ssf_df["F"] = ssf_df.apply(lambda x: "%2.2X" % x.name, axis=1)
-    ssf_df["WF"] = ssf_df.apply(wf_from_row, axis=1)
-    ssf_df["ARP"] = ssf_df.apply(arp_from_row, axis=1)
-    ssf_df["PULSE"] = ssf_df.apply(pulse_from_row, axis=1)
-    ssf_df["FILT"] = ssf_df.apply(filter_from_row, axis=1)
-    ssf_df["FILT"] = sw_rle_diff(ssf_df["FILT"], diffmult=2**3)
-    ssf_df["PULSE"] = sw_rle_diff(ssf_df["PULSE"], diffmult=1)
-    ssf_df[["ARP", "PULSE", "FILT"]] = ssf_df[["ARP", "PULSE", "FILT"]].apply(
-        lambda row: [dot0(c) for c in row]
+    wfarp = [
+        wf + dot0(arp)
+        for wf, arp in zip(hex_col(wf_col(ssf_df), 2), hex_col(arp_col(ssf_df), 2))
+    ]
+    # trailing repeats of the last waveform/arpeggio are implied.
+    changes = np.flatnonzero(np.array(wfarp, dtype=object) != wfarp[-1:])
+    if len(changes):
+        wfarp[changes[-1] + 2 :] = ["...."] * len(wfarp[changes[-1] + 2 :])
+    sw_df = pd.DataFrame(
+        {
+            "F": hex_col(ssf_df.index, 2),
+            "WFARP": wfarp,
+            "PULSE": [
+                dot0(val) for val in hex_col(sw_rle_diff_int(pulse_col(ssf_df), 1), 4)
+            ],
+            "FILT": [
+                dot0(val)
+                for val in hex_col(sw_rle_diff_int(filter_col(ssf_df), 2**3), 4)
+            ],
+        },
+        index=ssf_df.index,
     )
+    adsr = "%X%X%X%X" % (atk1, dec1, sus1, rel1)
+    return (pr_speed, adsr, sw_df, ssf_df)
 
-    ssf_df["WFARP"] = ssf_df.apply(lambda row: row.WF + row.ARP, axis=1)
-    lastindex = ssf_df.index.max()
-    lastwfarp = ssf_df["WFARP"].iloc[-1]
-    while ssf_df["WFARP"].iloc[lastindex] == lastwfarp:
-        lastindex -= 1
-    lastindex += 1
-    ssf_df.loc[ssf_df.index > lastindex, ["WFARP"]] = "...."
-    ssf_df = ssf_df.drop(["WF", "ARP"], axis=1)
-
-    sw_cols = ["F", "WFARP", "PULSE", "FILT"]
-    sw_sf = ssf_df[sw_cols]
-    ssf_df = ssf_df.drop(sw_cols, axis=1)
 
-    print("multispeed: %u" % pr_speed)
+def print_swi(pr_speed, adsr, sw_df, ssf_df, file=sys.stdout):
+    print("multispeed: %u" % pr_speed, file=file)
+    print("ADSR: %s" % adsr, file=file)
+    print(file=file)
+    with pd.option_context("display.max_rows", None):
+        print(sw_df, file=file)
+        print(file=file)
+        print(ssf_df, file=file)
 
-    adsr = "%X%X%X%X" % (atk1, dec1, sus1, rel1)
-    print("ADSR: %s" % adsr)
 
-    print()
-    pd.set_option("display.max_rows", None)
-    print(sw_sf)
-    print()
-    print(ssf_df)
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Transcribe SSF to Sid Wizard instrument"
+    )
+    parser.add_argument("ssffile", help="SSF file")
+    parser.add_argument(
+        "hashid",
+        type=int,
+        nargs="?",
+        default=None,
+        help="hashid to transcribe, or all hashids to ssffile.<hashid>.swi.txt if none",
+    )
+    timer_args(parser)
+    args = parser.parse_args()
+
+    sid = get_sid(args.pal, args.cia)
+    ssf_store = SsfStore(args.ssffile)
+    if args.hashid is not None:
+        print_swi(*ssf_swi(sid, ssf_store.read([args.hashid])))
+        return
+    df = ssf_store.read()
+    for hashid, ssf_df in df.groupby("hashid", sort=False):
+        swi_file = out_path(args.ssffile, "%d.swi.txt" % hashid)
+        with open(swi_file, "w", encoding="utf8") as f:
+            print_swi(*ssf_swi(sid, ssf_df), file=f)
+    logging.info("wrote %u instruments", df["hashid"].nunique())
 
 
 if __name__ == "__main__":
@@ -9,15 +9,16 @@
 import argparse
 import logging
 import os
-import sys
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import numpy as np
-import pandas as pd
-from desidulate.fileio import wav_path, out_path, read_csv
+from desidulate.fileio import wav_path, out_path
+from desidulate.sidlib import control_labels
 from desidulate.sidwav import df2wav
 from desidulate.sidwrap import get_sid
 from desidulate.sidmidi import SidMidiFile, midi_args
 from desidulate.ssf import add_freq_notes_df, SidSoundFragment
+from desidulate.ssfindex import SsfIndex
+from desidulate.ssfstore import SsfStore
 
 
 class RenderWav:
@@ -36,6 +37,7 @@ class RenderWav:
             os.system(" ".join(["play", wavfile]))
         if self.args.skip_ssf_parser:
             return
+        ssf_df = control_labels(ssf_df.reset_index()).set_index("clock")
         ssf = SidSoundFragment(self.args.percussion, sid, ssf_df, self.smf)
         logging.info(ssf.instrument({}))
 
@@ -44,11 +46,49 @@ def render_wav(ssf_df, wavfile):
     rw.render(ssf_df, wavfile)
 
 
+def select_hashids(args, ssf_store):
+    # None for all SSFs.
+    hashids = None
+    if args.hashid and args.hashid != "0":
+        hashids = [int(hashid) for hashid in args.hashid.split(",")]
+    if args.rank or args.query:
+        store_hashids = ssf_store.hashids()
+        if hashids is not None:
+            store_hashids = store_hashids[np.isin(store_hashids, hashids)]
+        if args.query:
+            store_hashids = store_hashids[
+                np.isin(store_hashids, SsfIndex(args.db).query(args.query))
+            ]
+        if args.rank:
+            start, _, stop = args.rank.partition(":")
+            store_hashids = store_hashids[
+                int(start) if start else None : int(stop) if stop else None
+            ]
+        hashids = store_hashids
+    return hashids
+
+
 def main():
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
     parser = argparse.ArgumentParser(description="Convert .ssf into a WAV file")
     parser.add_argument("ssffile", default="", help="ssf to read")
-    parser.add_argument("--hashid", default=0, help="hashid to reproduce, or 0 if all")
+    parser.add_argument(
+        "--hashid",
+        default="0",
+        help="comma separated hashids to reproduce, or 0 if all",
+    )
+    parser.add_argument(
+        "--rank",
+        default="",
+        help="start:stop range of SSFs to reproduce, in store (most common first) order",
+    )
+    parser.add_argument(
+        "--query",
+        default=[],
+        nargs="+",
+        help="reproduce only SSFs with all these ssfindex features, e.g. control:n",
+    )
+    parser.add_argument("--db", default="ssfindex.db", help="ssfindex database")
     parser.add_argument(
         "--maxclock",
         default=0,
@@ -97,34 +137,42 @@ def main():
     midi_args(parser)
     args = parser.parse_args()
 
-    df = read_csv(args.ssffile, dtype=pd.Int64Dtype())
-    if df.empty:
-        print("empty SSF file")
-        sys.exit(0)
-
-    if args.maxclock:
-        df = df[df["clock"] <= args.maxclock]
-
+    ssf_store = SsfStore(args.ssffile)
     sid = get_sid(args.pal, args.cia)
     smf = None
-
     if not args.skip_ssf_parser:
-        df = add_freq_notes_df(sid, df)
         smf = SidMidiFile(sid, args.bpm)
 
-    if args.hashid:
-        df = df[df["hashid"] == np.int64(args.hashid)].copy()
-
-    # TODO: handle vol/samples.
-    df = df[df["vol"].isna()]
-    df["vol"] = 15
-
     global rw
     rw = RenderWav(smf, args)
+    rendered = 0
     with ProcessPoolExecutor(max_workers=args.workers) as pool:
-        for hashid, ssf_df in df.groupby("hashid"):
-            wavfile = out_path(args.ssffile, "%u.wav" % hashid)
-            pool.submit(render_wav, ssf_df.copy(), wavfile)
+        pending = set()
+        for df in ssf_store.read_batches(select_hashids(args, ssf_store)):
+            if args.maxclock:
+                df = df[df["clock"] <= args.maxclock]
+            # TODO: handle vol/samples.
+            df = df[df["vol"].isna()]
+            if df.empty:
+                continue
+            df["vol"] = 15
+            # notes are only needed by the SSF parser.
+            if not args.skip_ssf_parser:
+                df = add_freq_notes_df(sid, df)
+            for hashid, ssf_df in df.groupby("hashid", sort=False):
+                # bound SSFs in flight, so memory does not grow with the store.
+                if len(pending) >= args.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                wavfile = out_path(args.ssffile, "%u.wav" % hashid)
+                pending.add(pool.submit(render_wav, ssf_df, wavfile))
+                rendered += 1
+        for future in wait(pending).done:
+            future.result()
+
+    if not rendered:
+        print("empty SSF file")
 
 
 if __name__ == "__main__":
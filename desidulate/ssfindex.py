@@ -0,0 +1,307 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Inverted index from SSF features (terms) to sorted hashids, in sqlite.
+# Terms are:
+#   labels:<unique control labels>, e.g. labels:n-p, as indexssf labels SSFs
+#   control:<control bit label>, e.g. control:n (any noise), control:S (any sync)
+#   pr_speed:<pr_speed>
+#   filter:<1 if voice routed through filter, else 0>
+#   atk:, dec:, sus:, rel:<initial ADSR value>
+# Each file's (term, hashids) are kept, and postings count the files that have
+# each hashid, so re-indexing a changed file removes hashids it no longer has.
+
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import zstandard
+from desidulate.fileio import read_csv
+from desidulate.indexssf import label_ssfs
+
+# index postings every INDEX_BATCH ssf files.
+INDEX_BATCH = 256
+ADSR_COLS = ("atk1", "dec1", "sus1", "rel1")
+
+
+def encode_postings(hashids):
+    # sorted as unsigned, so deltas (modulo 2**64) are small and non-negative.
+    hashids = np.unique(np.asarray(hashids, dtype=np.int64).view(np.uint64))
+    deltas = np.diff(hashids, prepend=np.uint64(0))
+    return zstandard.ZstdCompressor().compress(deltas.astype("<u8").tobytes())
+
+
+def decode_sorted_postings(blob):
+    # hashids, sorted as unsigned.
+    deltas = np.frombuffer(zstandard.ZstdDecompressor().decompress(blob), dtype="<u8")
+    return np.cumsum(deltas, dtype=np.uint64)
+
+
+def decode_postings(blob):
+    return decode_sorted_postings(blob).view(np.int64)
+
+
+def intersect_sorted(x, y):
+    # x and y sorted and unique, x the shorter.
+    if not len(y):
+        return y
+    pos = np.minimum(np.searchsorted(y, x), len(y) - 1)
+    return x[y[pos] == x]
+
+
+def merge_postings(hashid_arrays, count_arrays):
+    # returns hashids sorted as unsigned, with their summed counts (dropping 0).
+    hashids, inverse = np.unique(
+        np.concatenate(hashid_arrays).astype(np.int64).view(np.uint64),
+        return_inverse=True,
+    )
+    counts = np.bincount(
+        inverse, weights=np.concatenate(count_arrays), minlength=len(hashids)
+    ).astype(np.int64)
+    keep = counts > 0
+    return (hashids[keep], counts[keep])
+
+
+def encode_counts(counts):
+    return zstandard.ZstdCompressor().compress(
+        np.asarray(counts, dtype="<u4").tobytes()
+    )
+
+
+def decode_counts(blob):
+    return np.frombuffer(
+        zstandard.ZstdDecompressor().decompress(blob), dtype="<u4"
+    ).astype(np.int64)
+
+
+def ssf_terms(ssf_df):
+    # returns {term: hashids} for all SSFs in ssf_df.
+    df = ssf_df.reset_index(drop=True)
+    hashids = df["hashid"].to_numpy(dtype=np.int64)
+    first_df = df.drop_duplicates("hashid")
+    first_hashids = first_df["hashid"].to_numpy(dtype=np.int64)
+    term_hashids = defaultdict(list)
+
+    def add_terms(terms, term_hashids_array):
+        for term, term_df in pd.DataFrame(
+            {"term": terms, "hashid": term_hashids_array}
+        ).groupby("term"):
+            term_hashids[term].append(term_df["hashid"].to_numpy(dtype=np.int64))
+
+    # labels as indexssf's, for rows within its default clock and pr_speed limits.
+    label_df = (
+        label_ssfs(df)
+        .reindex(columns=["hashid", "unique_control_labels"])
+        .drop_duplicates("hashid")
+    )
+    label_df = label_df[label_df["unique_control_labels"] != ""]
+    label_hashids = label_df["hashid"].to_numpy(dtype=np.int64)
+    labels = label_df["unique_control_labels"].to_numpy(dtype=object)
+    add_terms(["labels:" + label for label in labels], label_hashids)
+    for label in set(labels):
+        for control in set(label.replace("-", "")) - {"0"}:
+            term_hashids["control:" + control].append(label_hashids[labels == label])
+    add_terms(
+        ["pr_speed:%u" % pr_speed for pr_speed in first_df["pr_speed"]], first_hashids
+    )
+    filtered = np.zeros(len(df), dtype=bool)
+    if "flt1" in df.columns:
+        filtered = df["flt1"].fillna(0).to_numpy(dtype=np.int64) > 0
+    filtered_hashids = np.unique(hashids[filtered])
+    add_terms(
+        np.where(np.isin(first_hashids, filtered_hashids), "filter:1", "filter:0"),
+        first_hashids,
+    )
+    for col in ADSR_COLS:
+        if col not in first_df.columns:
+            continue
+        vals = first_df[col]
+        mask = vals.notna().to_numpy()
+        add_terms(
+            ["%s:%u" % (col[:-1], val) for val in vals[mask]], first_hashids[mask]
+        )
+    return {
+        term: np.unique(np.concatenate(hashid_arrays))
+        for term, hashid_arrays in term_hashids.items()
+    }
+
+
+class SsfIndex:
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS postings "
+            "(term TEXT PRIMARY KEY, hashids BLOB NOT NULL, counts BLOB NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS file_postings (path TEXT NOT NULL, "
+            "term TEXT NOT NULL, hashids BLOB NOT NULL, PRIMARY KEY (path, term))"
+        )
+        self.pending_files = {}
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def current(self, path):
+        row = self.db.execute(
+            "SELECT mtime FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        return row is not None and row[0] == os.path.getmtime(path)
+
+    def add(self, path, ssf_df):
+        terms = {}
+        if not ssf_df.empty:
+            terms = ssf_terms(ssf_df)
+        self.pending_files[path] = (os.path.getmtime(path), terms)
+
+    def sorted_postings(self, term):
+        row = self.db.execute(
+            "SELECT hashids FROM postings WHERE term = ?", (term,)
+        ).fetchone()
+        if row is None:
+            return np.array([], dtype=np.uint64)
+        return decode_sorted_postings(row[0])
+
+    def postings(self, term):
+        return self.sorted_postings(term).view(np.int64)
+
+    def flush(self):
+        # replace pending files' postings, and merge the changes into the stored
+        # postings, one write per term.
+        changes = defaultdict(list)
+        for path, (mtime, terms) in self.pending_files.items():
+            for term, blob in self.db.execute(
+                "SELECT term, hashids FROM file_postings WHERE path = ?", (path,)
+            ):
+                changes[term].append((decode_postings(blob), -1))
+            self.db.execute("DELETE FROM file_postings WHERE path = ?", (path,))
+            for term, hashids in terms.items():
+                changes[term].append((hashids, 1))
+            self.db.executemany(
+                "INSERT INTO file_postings VALUES (?, ?, ?)",
+                [
+                    (path, term, encode_postings(hashids))
+                    for term, hashids in terms.items()
+                ],
+            )
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (path, mtime))
+        for term, term_changes in changes.items():
+            hashid_arrays = [self.postings(term)]
+            count_arrays = [self.counts(term)]
+            for hashids, count in term_changes:
+                hashid_arrays.append(hashids)
+                count_arrays.append(np.full(len(hashids), count, dtype=np.int64))
+            hashids, counts = merge_postings(hashid_arrays, count_arrays)
+            if len(hashids):
+                self.db.execute(
+                    "INSERT OR REPLACE INTO postings VALUES (?, ?, ?)",
+                    (term, encode_postings(hashids), encode_counts(counts)),
+                )
+            else:
+                self.db.execute("DELETE FROM postings WHERE term = ?", (term,))
+        self.db.commit()
+        self.pending_files = {}
+
+    def counts(self, term):
+        # number of files with each hashid, in postings() order.
+        row = self.db.execute(
+            "SELECT counts FROM postings WHERE term = ?", (term,)
+        ).fetchone()
+        if row is None:
+            return np.array([], dtype=np.int64)
+        return decode_counts(row[0])
+
+    def terms(self):
+        return [term for (term,) in self.db.execute("SELECT term FROM postings")]
+
+    def query(self, terms):
+        # hashids that have all terms.
+        postings = sorted((self.sorted_postings(term) for term in terms), key=len)
+        if not postings:
+            return np.array([], dtype=np.int64)
+        hashids = postings[0]
+        for term_hashids in postings[1:]:
+            if not len(hashids):
+                break
+            hashids = intersect_sorted(hashids, term_hashids)
+        return hashids.view(np.int64)
+
+
+def index_ssfs(ssffiles, db_path, batch=INDEX_BATCH):
+    ssf_index = SsfIndex(db_path)
+    indexed = 0
+    for ssffile in ssffiles:
+        if ssf_index.current(ssffile):
+            continue
+        ssf_index.add(ssffile, read_csv(ssffile, dtype=pd.Int64Dtype()))
+        indexed += 1
+        logging.info("indexed %s (%u)", ssffile, indexed)
+        if indexed % batch == 0:
+            ssf_index.flush()
+    ssf_index.close()
+    return indexed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Add ssf.zst files to an inverted index of SSF features"
+    )
+    parser.add_argument("ssffile", nargs="*", help="ssf.zst files to index")
+    parser.add_argument(
+        "--ssflist", default=None, type=str, help="file of ssf.zst files to index"
+    )
+    parser.add_argument("--db", default="ssfindex.db", help="index database")
+    args = parser.parse_args()
+
+    ssffiles = list(args.ssffile)
+    if args.ssflist:
+        with open(args.ssflist, encoding="utf8") as f:
+            ssffiles.extend(line.strip() for line in f if line.strip())
+    index_ssfs(ssffiles, args.db)
+
+
+def query_main():
+    parser = argparse.ArgumentParser(
+        description="Find SSF hashids with all the given features"
+    )
+    parser.add_argument(
+        "term",
+        nargs="*",
+        help="features, e.g. control:n control:p pr_speed:1 filter:1",
+    )
+    parser.add_argument("--db", default="ssfindex.db", help="index database")
+    parser.add_argument(
+        "--terms", default=False, action="store_true", help="list indexed terms"
+    )
+    args = parser.parse_args()
+
+    ssf_index = SsfIndex(args.db)
+    if args.terms:
+        for term in sorted(ssf_index.terms()):
+            print(term)
+        return
+    start_time = time.time()
+    hashids = ssf_index.query(args.term)
+    query_time = time.time() - start_time
+    for hashid in hashids:
+        print(hashid)
+    logging.warning("%u SSFs in %.1fms", len(hashids), query_time * 1e3)
+
+
+if __name__ == "__main__":
+    main()
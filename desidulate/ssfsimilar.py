@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Fixed length fingerprints of SSFs, for "sounds like" nearest neighbour search.
+# A fingerprint is the voice state at the end of each of the first
+# FINGERPRINT_FRAMES frames, plus the initial ADSR.
+
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from desidulate.fileio import read_csv
+from desidulate.sidlib import timer_args
+from desidulate.sidwrap import get_sid
+
+FINGERPRINT_FRAMES = 16
+# column, scale to about 0-1.
+FRAME_FEATURES = (
+    ("note", 1 / 128),
+    ("pwduty1", 1 / 4096),
+    ("gate1", 1),
+    ("tri1", 1),
+    ("saw1", 1),
+    ("pulse1", 1),
+    ("noise1", 1),
+    ("fltcoff", 1 / 2048),
+)
+ADSR_FEATURES = (("atk1", 1 / 16), ("dec1", 1 / 16), ("sus1", 1 / 16), ("rel1", 1 / 16))
+FINGERPRINT_DIMS = FINGERPRINT_FRAMES * len(FRAME_FEATURES) + len(ADSR_FEATURES)
+
+
+def ssf_fingerprints(sid, ssf_df, frames=FINGERPRINT_FRAMES):
+    # returns (hashids, fingerprints), one fingerprint row per hashid.
+    df = ssf_df.reset_index(drop=True)
+    hashids, groups = np.unique(
+        df["hashid"].to_numpy(dtype=np.int64), return_inverse=True
+    )
+    order = np.argsort(groups, kind="stable")
+    df = df.iloc[order].reset_index(drop=True)
+    groups = groups[order]
+
+    features = pd.DataFrame(index=df.index)
+    freq = df["freq1"].astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features["note"] = 69 + 12 * np.log2(freq * sid.freq_scaler / 440)
+    for col, _ in FRAME_FEATURES[1:] + ADSR_FEATURES:
+        if col in df.columns:
+            features[col] = (
+                df[col].astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan)
+            )
+        else:
+            features[col] = np.nan
+    features.loc[~np.isfinite(features["note"]), "note"] = np.nan
+    # rows hold only changed registers, so carry state forward within each SSF.
+    features = features.groupby(groups).ffill().fillna(0)
+    # cutoff only matters if the voice is filtered.
+    flt1 = np.zeros(len(df))
+    if "flt1" in df.columns:
+        flt1 = df["flt1"].astype("Float64").groupby(groups).ffill().fillna(0).to_numpy()
+    features.loc[flt1 == 0, "fltcoff"] = 0
+
+    frame_cols = [col for col, _ in FRAME_FEATURES]
+    frame_scale = np.array([scale for _, scale in FRAME_FEATURES], dtype=np.float32)
+    frame_states = np.full((len(hashids), frames, len(frame_cols)), np.nan)
+    pr_frames = df["pr_frame"].to_numpy(dtype=np.int64)
+    # the last row in each frame holds the frame's end state.
+    in_frames = np.flatnonzero(pr_frames < frames)
+    frame_keys = groups[in_frames] * frames + pr_frames[in_frames]
+    _, last_rows = np.unique(frame_keys[::-1], return_index=True)
+    last_rows = in_frames[len(frame_keys) - 1 - last_rows]
+    frame_states[groups[last_rows], pr_frames[last_rows]] = features[
+        frame_cols
+    ].to_numpy()[last_rows]
+    # frames without changes keep the previous frame's state.
+    have_state = ~np.isnan(frame_states[:, :, 0])
+    last_state = np.maximum.accumulate(
+        np.where(have_state, np.arange(frames), 0), axis=1
+    )
+    frame_states = np.take_along_axis(
+        frame_states, last_state[:, :, np.newaxis], axis=1
+    )
+    frame_states = np.nan_to_num(frame_states) * frame_scale
+
+    adsr_cols = [col for col, _ in ADSR_FEATURES]
+    adsr_scale = np.array([scale for _, scale in ADSR_FEATURES], dtype=np.float32)
+    first_rows = np.flatnonzero(np.diff(groups, prepend=-1))
+    adsr = features[adsr_cols].to_numpy()[first_rows] * adsr_scale
+
+    fingerprints = np.hstack([frame_states.reshape(len(hashids), -1), adsr]).astype(
+        np.float32
+    )
+    return hashids, fingerprints
+
+
+class SsfVectors:
+
+    def __init__(self, index_prefix, mmap_mode="r"):
+        self.hashids = np.load(index_prefix + ".hashids.npy", mmap_mode=mmap_mode)
+        self.vectors = np.load(index_prefix + ".vectors.npy", mmap_mode=mmap_mode)
+        self.norms = np.load(index_prefix + ".norms.npy", mmap_mode=mmap_mode)
+
+    @staticmethod
+    def write(index_prefix, hashids, vectors):
+        _, first = np.unique(hashids, return_index=True)
+        first = np.sort(first)
+        vectors = np.ascontiguousarray(vectors[first], dtype=np.float32)
+        np.save(index_prefix + ".hashids.npy", hashids[first])
+        np.save(index_prefix + ".vectors.npy", vectors)
+        np.save(index_prefix + ".norms.npy", np.einsum("ij,ij->i", vectors, vectors))
+        return len(first)
+
+    def __len__(self):
+        return len(self.hashids)
+
+    def vector(self, hashid):
+        pos = np.flatnonzero(self.hashids == hashid)
+        if not len(pos):
+            raise KeyError(hashid)
+        return self.vectors[pos[0]]
+
+    def top_k(self, query, k=10):
+        # k nearest (squared euclidean) hashids to query vector, nearest first.
+        query = np.asarray(query, dtype=np.float32)
+        distances = self.norms - 2 * (self.vectors @ query) + query @ query
+        k = min(k, len(distances))
+        if not k:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return list(
+            zip(
+                self.hashids[nearest].tolist(),
+                np.maximum(distances[nearest], 0).tolist(),
+            )
+        )
+
+
+def build_ssf_vectors(ssffiles, index_prefix, pal=True, cia=0):
+    sid = get_sid(pal, cia)
+    all_hashids = []
+    all_vectors = []
+    for ssffile in ssffiles:
+        ssf_df = read_csv(ssffile, dtype=pd.Int64Dtype())
+        if ssf_df.empty:
+            continue
+        hashids, vectors = ssf_fingerprints(sid, ssf_df)
+        all_hashids.append(hashids)
+        all_vectors.append(vectors)
+        logging.info("fingerprinted %u SSFs from %s", len(hashids), ssffile)
+    if not all_hashids:
+        all_hashids.append(np.array([], dtype=np.int64))
+        all_vectors.append(np.zeros((0, FINGERPRINT_DIMS), dtype=np.float32))
+    return SsfVectors.write(
+        index_prefix, np.concatenate(all_hashids), np.concatenate(all_vectors)
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Build SSF fingerprints for similarity search"
+    )
+    parser.add_argument("ssffile", nargs="*", help="ssf.zst files to fingerprint")
+    parser.add_argument(
+        "--ssflist", default=None, type=str, help="file of ssf.zst files to fingerprint"
+    )
+    parser.add_argument("--index", default="ssfvectors", help="index file prefix")
+    timer_args(parser)
+    args = parser.parse_args()
+
+    ssffiles = list(args.ssffile)
+    if args.ssflist:
+        with open(args.ssflist, encoding="utf8") as f:
+            ssffiles.extend(line.strip() for line in f if line.strip())
+    hashids = build_ssf_vectors(ssffiles, args.index, pal=args.pal, cia=args.cia)
+    logging.info("indexed %u SSFs", hashids)
+
+
+def query_main():
+    parser = argparse.ArgumentParser(description="Find SSFs that sound like an SSF")
+    parser.add_argument("hashid", type=int, help="SSF to find neighbours of")
+    parser.add_argument("--index", default="ssfvectors", help="index file prefix")
+    parser.add_argument("--k", default=10, type=int, help="neighbours to find")
+    args = parser.parse_args()
+
+    ssf_vectors = SsfVectors(args.index)
+    for hashid, distance in ssf_vectors.top_k(ssf_vectors.vector(args.hashid), args.k):
+        print(hashid, "%.4f" % distance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Columnar SSF store: ssf.parquet with each hashid's rows contiguous, in small
+# row groups, and a sidecar ssf_index.parquet of hashid -> (row offset, rows, count).
+# Reading some SSFs reads only the row groups that hold them.
+# log.parquet is sorted by clock in small row groups, so reading a clock window
+# skips row groups whose clock statistics do not overlap it.
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from desidulate.fileio import out_path, read_csv, read_int_columns
+
+SSF_STORE_ROW_GROUP = 4096
+SSF_READ_BATCH = 256
+SSF_INDEX_COLS = ["hashid", "offset", "rows", "count"]
+SSF_LOG_ROW_GROUP = 8192
+SSF_LOG_COLS = ["clock", "hashid", "voice"]
+
+
+def ssf_index_path(ssffile):
+    return out_path(ssffile, "ssf_index.parquet")
+
+
+def ssf_store_path(logfile):
+    # prefer the SSF store, if reg2ssf wrote one after any ssf.zst.
+    ssffile = out_path(logfile, "ssf.zst")
+    storefile = out_path(logfile, "ssf.parquet")
+    if os.path.exists(storefile) and (
+        not os.path.exists(ssffile)
+        or os.path.getmtime(storefile) >= os.path.getmtime(ssffile)
+    ):
+        return storefile
+    return ssffile
+
+
+def write_ssf_store(ssf_df, ssffile, row_group_size=SSF_STORE_ROW_GROUP):
+    # ssf_df as from state2ssfs, indexed by hashid.
+    df = ssf_df.reset_index() if "hashid" not in ssf_df.columns else ssf_df
+    index_df = pd.DataFrame(columns=SSF_INDEX_COLS, dtype=pd.Int64Dtype())
+    if not df.empty:
+        hashids = df["hashid"].to_numpy(dtype=np.int64)
+        # group each hashid's rows together, in order of first appearance.
+        _, first, inverse = np.unique(hashids, return_index=True, return_inverse=True)
+        order = np.argsort(first[inverse], kind="stable")
+        df = df.iloc[order].reset_index(drop=True).astype(pd.Int64Dtype())
+        hashids = hashids[order]
+        starts = np.flatnonzero(np.diff(hashids, prepend=hashids[:1] - 1))
+        index_df = pd.DataFrame(
+            {
+                "hashid": hashids[starts],
+                "offset": starts,
+                "rows": np.diff(starts, append=len(hashids)),
+                "count": (
+                    df["count"].to_numpy()[starts] if "count" in df.columns else pd.NA
+                ),
+            }
+        ).astype(pd.Int64Dtype())
+    df.to_parquet(ssffile, index=False, row_group_size=row_group_size)
+    index_df.to_parquet(ssf_index_path(ssffile), index=False)
+    return index_df
+
+
+class SsfStore:
+
+    def __init__(self, ssffile):
+        # ssf.zst files are also accepted, but are read in full.
+        self.ssffile = ssffile
+        self.index_df = None
+        self.csv_df = None
+        if ssffile.endswith(".parquet"):
+            self.index_df = pd.read_parquet(ssf_index_path(ssffile)).set_index("hashid")
+            self.parquet_file = pq.ParquetFile(ssffile)
+            self.row_group_starts = np.cumsum(
+                [0]
+                + [
+                    self.parquet_file.metadata.row_group(i).num_rows
+                    for i in range(self.parquet_file.num_row_groups)
+                ]
+            )
+
+    def read_all_csv(self):
+        if self.csv_df is None:
+            self.csv_df = read_csv(self.ssffile, dtype=pd.Int64Dtype())
+        return self.csv_df
+
+    def hashids(self):
+        # in store order.
+        if self.index_df is None:
+            df = self.read_all_csv()
+            if df.empty:
+                return np.array([], dtype=np.int64)
+            return df["hashid"].unique().to_numpy(dtype=np.int64)
+        return self.index_df.index.to_numpy(dtype=np.int64)
+
+    def read_batches(self, hashids=None, batch=SSF_READ_BATCH):
+        # yields frames of at most batch SSFs, for hashids (or all SSFs).
+        if self.index_df is None:
+            yield self.read(hashids)
+            return
+        if hashids is None:
+            hashids = self.hashids()
+        for i in range(0, len(hashids), batch):
+            yield self.read(hashids[i : i + batch])
+
+    def read(self, hashids=None, columns=None):
+        # rows for hashids (or all rows), in store order.
+        if self.index_df is None:
+            df = self.read_all_csv()
+            if hashids is not None and not df.empty:
+                df = df[df["hashid"].isin(hashids)]
+            if columns is not None:
+                df = df[columns]
+            return df
+        if hashids is None:
+            return pd.read_parquet(self.ssffile, columns=columns)
+        ranges_df = self.index_df[self.index_df.index.isin(hashids)].sort_values(
+            "offset"
+        )
+        offsets = ranges_df["offset"].to_numpy(dtype=np.int64)
+        rows = ranges_df["rows"].to_numpy(dtype=np.int64)
+        # store row numbers wanted, and the row groups that hold them.
+        wanted = np.repeat(offsets - (np.cumsum(rows) - rows), rows) + np.arange(
+            rows.sum()
+        )
+        wanted_groups = np.searchsorted(self.row_group_starts, wanted, side="right") - 1
+        groups, table_groups = np.unique(wanted_groups, return_inverse=True)
+        table = self.parquet_file.read_row_groups(groups, columns=columns)
+        group_rows = np.diff(self.row_group_starts)[groups]
+        table_starts = np.cumsum(group_rows) - group_rows
+        positions = (
+            wanted - self.row_group_starts[wanted_groups] + table_starts[table_groups]
+        )
+        return table.take(positions).to_pandas(
+            types_mapper={pa.int64(): pd.Int64Dtype()}.get
+        )
+
+
+def write_ssf_log(ssf_log_df, logfile, row_group_size=SSF_LOG_ROW_GROUP):
+    # ssf_log_df as from state2ssfs, indexed by clock.
+    df = ssf_log_df.reset_index() if "clock" not in ssf_log_df.columns else ssf_log_df
+    if not df.empty:
+        df = df.sort_values("clock", kind="stable")
+    df.to_parquet(logfile, index=False, row_group_size=row_group_size)
+
+
+def file_columns(path):
+    if path.endswith(".parquet"):
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_ssf_log(logfile, minclock=0, maxclock=0):
+    # SSF log rows with minclock <= clock <= maxclock (0 for no limit).
+    if sorted(file_columns(logfile)) != SSF_LOG_COLS:
+        # not an SSF log (or empty), let the caller decide.
+        return read_csv(logfile, dtype=pd.Int64Dtype())
+    filters = []
+    if minclock:
+        filters.append(("clock", ">=", minclock))
+    if maxclock:
+        filters.append(("clock", "<=", maxclock))
+    return read_int_columns(logfile, SSF_LOG_COLS, filters=filters)
@@ -1,7 +1,6 @@
 #!/usr/bin/python3
 
-import struct
-from itertools import groupby
+import numpy as np
 
 
 def dot0(hexval):
@@ -10,34 +9,51 @@ def dot0(hexval):
     return "".join(val)
 
 
+def sw_rle_diff_int(vals, diffmult):
+    # vals are 16 bit (prefix << 8 | suffix). Runs of suffixes with a constant
+    # difference (within the same prefix) are compressed to (run length, difference).
+    vals = np.asarray(vals, dtype=np.int64)
+    prefixes = vals >> 8
+    suffixes = vals & 0xFF
+    # leading 0 prefixes are kept as 0.
+    lead = np.flatnonzero(prefixes != 0)
+    lead = lead[0] if len(lead) else len(vals)
+    prefixes = prefixes[lead:]
+    suffixes = suffixes[lead:]
+
+    prefix_starts = np.ones(len(prefixes), dtype=bool)
+    prefix_starts[1:] = prefixes[1:] != prefixes[:-1]
+    diffs = np.diff(suffixes, prepend=0)
+    diffs[prefix_starts] = 0
+    run_starts = prefix_starts.copy()
+    run_starts[1:] |= diffs[1:] != diffs[:-1]
+    run_starts = np.flatnonzero(run_starts)
+    run_lens = np.diff(run_starts, append=len(prefixes))
+
+    single = run_lens == 1
+    # difference as a signed byte.
+    run_diffs = (diffs[run_starts] * diffmult) & 0xFF
+    compressed_prefixes = np.where(single, prefixes[run_starts], run_lens)
+    compressed_suffixes = np.where(single, suffixes[run_starts], run_diffs)
+    if not lead and len(run_lens) and run_lens[0] > 1:
+        # a first run needs its starting value.
+        compressed_prefixes = np.insert(compressed_prefixes, 0, prefixes[0])
+        compressed_suffixes = np.insert(compressed_suffixes, 0, suffixes[0])
+    compressed = np.concatenate(
+        [
+            np.zeros(lead, dtype=np.int64),
+            (compressed_prefixes << 8) | compressed_suffixes,
+        ]
+    )
+
+    # drop trailing runs of no difference.
+    keep = np.flatnonzero(((compressed >> 8) > 0x7F) | ((compressed & 0xFF) > 0))
+    compressed = compressed[: max(keep[-1] + 1 if len(keep) else 0, 1)]
+    return np.concatenate(
+        [compressed, np.zeros(len(vals) - len(compressed), dtype=np.int64)]
+    )
+
+
 def sw_rle_diff(col, diffmult):
-    pairs = [(int(pair[:2], 16), int(pair[2:], 16)) for pair in col]
-    compressed_pairs = []
-    while pairs and pairs[0][0] == 0:
-        compressed_pairs.append((0, 0))
-        pairs = pairs[1:]
-    for prefix, pairs in groupby(pairs, key=lambda x: x[0]):
-        suffixes = [pair[1] for pair in pairs]
-        diffs = [0]
-        for i, x in enumerate(suffixes[1:]):
-            diffs.append(x - suffixes[i])
-        for diff, vals in groupby(zip(suffixes, diffs), key=lambda x: x[1]):
-            vals = list(vals)
-            len_vals = len(vals)
-            if len_vals == 1:
-                compressed_pairs.append(((prefix, vals[0][0])))
-            else:
-                if not compressed_pairs:
-                    compressed_pairs.append(((prefix, vals[0][0])))
-                diff *= diffmult
-                if diff < 0:
-                    diff = ord(struct.pack("b", diff))
-                compressed_pairs.append((len_vals, diff))
-    while len(compressed_pairs) > 1:
-        lastpair = compressed_pairs[-1]
-        if lastpair[0] > 0x7F or lastpair[1] > 0:
-            break
-        compressed_pairs = compressed_pairs[:-1]
-    compressed_pairs = ["%2.2X%2.2X" % i for i in compressed_pairs]
-    compressed_pairs.extend(["0000"] * (len(col) - len(compressed_pairs)))
-    return compressed_pairs
+    compressed = sw_rle_diff_int([int(val, 16) for val in col], diffmult)
+    return ["%4.4X" % val for val in compressed]
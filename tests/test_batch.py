@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+import argparse
+import filecmp
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import zstandard
+from desidulate.batch import run_batch
+from desidulate.fileio import read_timings
+from desidulate.indexssf import index_ssf
+from desidulate.reg2ssf import reg2ssf
+from desidulate.ssf2midi import ssf2midi, ssf2midi_parser
+
+
+def tune_writes():
+    writes = [(1, 24, 15)]
+    for freq in (0x1000, 0x1400, 0x1000, 0x1800):
+        writes.extend(
+            [
+                (20000, 0, freq & 0xFF),
+                (10, 1, freq >> 8),
+                (10, 5, 0x09),
+                (10, 6, 0xA0),
+                (10, 4, 0x21),
+                (60000, 4, 0x20),
+            ]
+        )
+    writes.append((40000, 24, 15))
+    return writes
+
+
+def make_dump(dump, writes=None):
+    if writes is None:
+        writes = tune_writes()
+    with zstandard.open(dump, "w", encoding="utf8") as f:
+        for write in writes:
+            f.write("%u %u %u\n" % write)
+
+
+class BatchTestCase(unittest.TestCase):
+    """Test desidulate-batch."""
+
+    def test_run_batch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tunedir = os.path.join(tmpdir, "C64Music", "x", "1")
+            os.makedirs(tunedir)
+            with open(os.path.join(tmpdir, "C64Music", "x.sid"), "wb") as f:
+                f.write(b"PSID")
+            dump = os.path.join(tunedir, "x-1.dump.zst")
+            make_dump(dump)
+            df = pd.DataFrame(
+                [
+                    {"path": "C64Music/x.sid", "song": 1, "pal": 1, "length": 1},
+                    {"path": "C64Music/y.sid", "song": 1, "pal": 1, "length": 1},
+                ]
+            )
+            args = argparse.Namespace(
+                hvscdir=tmpdir, workers=1, dump_backend=None, filter="", force=False
+            )
+            # dump for y not present, so skipped.
+            throughput = run_batch(args, df)
+            self.assertEqual(
+                {"dump": 0, "reg2ssf": 1, "indexssf": 1, "ssf2midi": 1},
+                {stage: stats["ran"] for stage, stats in throughput.items()},
+            )
+            self.assertLess(0, throughput["reg2ssf"]["time"])
+
+            # same outputs as running each stage from files.
+            refdir = os.path.join(tmpdir, "ref")
+            os.makedirs(refdir)
+            refdump = shutil.copy(dump, refdir)
+            reg2ssf(refdump, True, 0)
+            index_ssf(os.path.join(refdir, "x-1.ssf.zst"))
+            ssf2midi(
+                ssf2midi_parser().parse_args(
+                    [os.path.join(refdir, "x-1.log.zst"), "--workers=1"]
+                )
+            )
+            ref_files = sorted(os.listdir(refdir))
+            self.assertIn("x-1.mid", ref_files)
+            self.assertIn("x-1.1.s.index_ssf.zst", ref_files)
+            self.assertEqual(
+                sorted(ref_files + ["x-1.index_ssf.txt", "x-1.timings.json"]),
+                sorted(os.listdir(tunedir)),
+            )
+            timings = read_timings(dump)
+            self.assertEqual(["indexssf", "reg2ssf", "ssf2midi"], sorted(timings))
+            self.assertEqual(os.path.getsize(dump), timings["reg2ssf"]["bytes"])
+            _, mismatch, errors = filecmp.cmpfiles(
+                refdir, tunedir, ref_files, shallow=False
+            )
+            self.assertEqual(([], []), (mismatch, errors))
+
+            # up to date stages are skipped.
+            throughput = run_batch(args, df)
+            self.assertEqual(
+                {"dump": 0, "reg2ssf": 0, "indexssf": 0, "ssf2midi": 0},
+                {stage: stats["ran"] for stage, stats in throughput.items()},
+            )
+            self.assertEqual(1, throughput["ssf2midi"]["skipped"])
+            self.assertEqual(timings, read_timings(dump))
+            os.utime(dump)
+            throughput = run_batch(args, df)
+            self.assertEqual(1, throughput["reg2ssf"]["ran"])
+            self.assertNotEqual(timings, read_timings(dump))
+
+    def test_run_batch_no_index_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tunedir = os.path.join(tmpdir, "C64Music", "x", "1")
+            os.makedirs(tunedir)
+            dump = os.path.join(tunedir, "x-1.dump.zst")
+            # no gate, so no SSFs to index.
+            make_dump(dump, writes=[(1, 4, 0x20), (40000, 4, 0x20)])
+            df = pd.DataFrame(
+                [{"path": "C64Music/x.sid", "song": 1, "pal": 1, "length": 1}]
+            )
+            args = argparse.Namespace(
+                hvscdir=tmpdir, workers=1, dump_backend=None, filter="", force=False
+            )
+            throughput = run_batch(args, df)
+            self.assertEqual(1, throughput["indexssf"]["ran"])
+            self.assertFalse(
+                [
+                    name
+                    for name in os.listdir(tunedir)
+                    if name.endswith(".index_ssf.zst")
+                ]
+            )
+            # no index files is still up to date.
+            throughput = run_batch(args, df)
+            self.assertEqual(0, throughput["indexssf"]["ran"])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
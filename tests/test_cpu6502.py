@@ -0,0 +1,424 @@
+#!/usr/bin/python3
+
+import unittest
+from desidulate.cpu6502 import C64, Cpu6502
+
+CODE_ADDRESS = 0x200
+
+# (description, code at $0200, state before, state after, cycles)
+# state is registers/flags by name, and RAM by address. Flags not given in
+# the state after are expected to be unchanged.
+OPCODE_CASES = (
+    # addressing modes.
+    ("LDA #$00", (0xA9, 0x00), {"a": 5}, {"a": 0, "z": 1, "n": 0, "pc": 0x202}, 2),
+    ("LDA #$80", (0xA9, 0x80), {}, {"a": 0x80, "z": 0, "n": 1}, 2),
+    ("LDA $10", (0xA5, 0x10), {0x10: 0x42}, {"a": 0x42, "pc": 0x202}, 3),
+    ("LDA $F0,X wraps", (0xB5, 0xF0), {"x": 0x20, 0x10: 0x42}, {"a": 0x42}, 4),
+    ("LDX $F0,Y wraps", (0xB6, 0xF0), {"y": 0x21, 0x11: 7}, {"x": 7}, 4),
+    (
+        "LDA $1234",
+        (0xAD, 0x34, 0x12),
+        {0x1234: 0x99},
+        {"a": 0x99, "n": 1, "pc": 0x203},
+        4,
+    ),
+    ("LDA $1230,X", (0xBD, 0x30, 0x12), {"x": 4, 0x1234: 0x99}, {"a": 0x99, "n": 1}, 4),
+    ("LDA $1230,Y", (0xB9, 0x30, 0x12), {"y": 4, 0x1234: 0x99}, {"a": 0x99, "n": 1}, 4),
+    ("LDY $1230,X", (0xBC, 0x30, 0x12), {"x": 4, 0x1234: 0x99}, {"y": 0x99, "n": 1}, 4),
+    (
+        "LDA ($0E,X)",
+        (0xA1, 0x0E),
+        {"x": 2, 0x10: 0x34, 0x11: 0x12, 0x1234: 0x99},
+        {"a": 0x99, "n": 1},
+        6,
+    ),
+    (
+        "LDA ($FF,X) pointer wraps",
+        (0xA1, 0xFF),
+        {0xFF: 0x34, 0x00: 0x12, 0x1234: 0x99},
+        {"a": 0x99, "n": 1},
+        6,
+    ),
+    (
+        "LDA ($10),Y",
+        (0xB1, 0x10),
+        {"y": 4, 0x10: 0x30, 0x11: 0x12, 0x1234: 0x99},
+        {"a": 0x99, "n": 1},
+        5,
+    ),
+    ("STA $1234", (0x8D, 0x34, 0x12), {"a": 0x55}, {0x1234: 0x55}, 4),
+    ("STA $1230,X", (0x9D, 0x30, 0x12), {"a": 0x55, "x": 4}, {0x1234: 0x55}, 5),
+    (
+        "STA ($10),Y",
+        (0x91, 0x10),
+        {"a": 0x55, "y": 1, 0x10: 0x33, 0x11: 0x12},
+        {0x1234: 0x55},
+        6,
+    ),
+    (
+        "STA ($0F,X)",
+        (0x81, 0x0F),
+        {"a": 0x55, "x": 1, 0x10: 0x34, 0x11: 0x12},
+        {0x1234: 0x55},
+        6,
+    ),
+    ("STX $10,Y", (0x96, 0x10), {"x": 0x66, "y": 1}, {0x11: 0x66}, 4),
+    ("STY $10,X", (0x94, 0x10), {"y": 0x77, "x": 1}, {0x11: 0x77}, 4),
+    ("JMP $1234", (0x4C, 0x34, 0x12), {}, {"pc": 0x1234}, 3),
+    (
+        "JMP ($12FF) page wrap",
+        (0x6C, 0xFF, 0x12),
+        {0x12FF: 0x00, 0x1200: 0x30, 0x1300: 0x40},
+        {"pc": 0x3000},
+        5,
+    ),
+    # arithmetic and flags.
+    (
+        "ADC #$01 overflow",
+        (0x69, 0x01),
+        {"a": 0x7F, "c": 0},
+        {"a": 0x80, "n": 1, "v": 1, "z": 0, "c": 0},
+        2,
+    ),
+    (
+        "ADC #$01 carry",
+        (0x69, 0x01),
+        {"a": 0xFF, "c": 0},
+        {"a": 0, "n": 0, "v": 0, "z": 1, "c": 1},
+        2,
+    ),
+    (
+        "ADC #$80 carry in",
+        (0x69, 0x80),
+        {"a": 0x80, "c": 1},
+        {"a": 0x01, "n": 0, "v": 1, "z": 0, "c": 1},
+        2,
+    ),
+    (
+        "SBC #$01 borrow",
+        (0xE9, 0x01),
+        {"a": 0, "c": 1},
+        {"a": 0xFF, "n": 1, "v": 0, "c": 0},
+        2,
+    ),
+    (
+        "SBC #$01 overflow",
+        (0xE9, 0x01),
+        {"a": 0x80, "c": 1},
+        {"a": 0x7F, "n": 0, "v": 1, "c": 1},
+        2,
+    ),
+    (
+        "ADC #$28 decimal",
+        (0x69, 0x28),
+        {"d": 1, "a": 0x19, "c": 0},
+        {"a": 0x47, "c": 0},
+        2,
+    ),
+    (
+        "ADC #$01 decimal carry",
+        (0x69, 0x01),
+        {"d": 1, "a": 0x99, "c": 0},
+        # NMOS Z is from the binary result, N before the high digit is adjusted.
+        {"a": 0, "c": 1, "z": 0, "n": 1},
+        2,
+    ),
+    (
+        "SBC #$01 decimal",
+        (0xE9, 0x01),
+        {"d": 1, "a": 0x10, "c": 1},
+        {"a": 0x09, "c": 1},
+        2,
+    ),
+    (
+        "SBC #$01 decimal borrow",
+        (0xE9, 0x01),
+        {"d": 1, "a": 0x00, "c": 1},
+        # NMOS flags are from the binary result.
+        {"a": 0x99, "c": 0, "n": 1, "z": 0},
+        2,
+    ),
+    ("CMP #$10 equal", (0xC9, 0x10), {"a": 0x10}, {"z": 1, "c": 1, "n": 0}, 2),
+    ("CMP #$20 less", (0xC9, 0x20), {"a": 0x10}, {"z": 0, "c": 0, "n": 1}, 2),
+    ("CPX #$05", (0xE0, 0x05), {"x": 6}, {"z": 0, "c": 1, "n": 0}, 2),
+    ("CPY $10", (0xC4, 0x10), {"y": 0, 0x10: 1}, {"z": 0, "c": 0, "n": 1}, 3),
+    (
+        "BIT $10",
+        (0x24, 0x10),
+        {"a": 0x01, 0x10: 0xC0},
+        {"a": 0x01, "z": 1, "n": 1, "v": 1},
+        3,
+    ),
+    ("AND #$0F", (0x29, 0x0F), {"a": 0xF3}, {"a": 0x03, "z": 0, "n": 0}, 2),
+    ("ORA #$80", (0x09, 0x80), {"a": 0x01}, {"a": 0x81, "n": 1}, 2),
+    ("EOR #$FF", (0x49, 0xFF), {"a": 0xFF}, {"a": 0, "z": 1}, 2),
+    ("ASL A", (0x0A,), {"a": 0x81}, {"a": 0x02, "c": 1, "n": 0}, 2),
+    ("LSR A", (0x4A,), {"a": 0x01}, {"a": 0, "c": 1, "z": 1}, 2),
+    ("ROL A", (0x2A,), {"a": 0x80, "c": 1}, {"a": 0x01, "c": 1}, 2),
+    ("ROR A", (0x6A,), {"a": 0x01, "c": 1}, {"a": 0x80, "c": 1, "n": 1}, 2),
+    ("ASL $10", (0x06, 0x10), {0x10: 0x40}, {0x10: 0x80, "n": 1, "c": 0}, 5),
+    (
+        "INC $1230,X",
+        (0xFE, 0x30, 0x12),
+        {"x": 4, 0x1234: 0xFF},
+        {0x1234: 0, "z": 1},
+        7,
+    ),
+    ("DEC $0F,X", (0xD6, 0x0F), {"x": 1, 0x10: 0}, {0x10: 0xFF, "n": 1}, 6),
+    ("INX", (0xE8,), {"x": 0xFF}, {"x": 0, "z": 1}, 2),
+    ("DEY", (0x88,), {"y": 0}, {"y": 0xFF, "n": 1}, 2),
+    ("TAX", (0xAA,), {"a": 0x80}, {"x": 0x80, "n": 1}, 2),
+    ("TAY", (0xA8,), {"a": 0}, {"y": 0, "z": 1}, 2),
+    ("TXA", (0x8A,), {"x": 0x12}, {"a": 0x12}, 2),
+    ("TYA", (0x98,), {"y": 0x34}, {"a": 0x34}, 2),
+    ("SEC", (0x38,), {"c": 0}, {"c": 1}, 2),
+    ("CLC", (0x18,), {"c": 1}, {"c": 0}, 2),
+    ("SED", (0xF8,), {"d": 0}, {"d": 1}, 2),
+    ("CLD", (0xD8,), {"d": 1}, {"d": 0}, 2),
+    ("SEI", (0x78,), {"i": 0}, {"i": 1}, 2),
+    ("CLI", (0x58,), {"i": 1}, {"i": 0}, 2),
+    ("CLV", (0xB8,), {"v": 1}, {"v": 0}, 2),
+    # branches.
+    ("BNE taken", (0xD0, 0x02), {"z": 0}, {"pc": 0x204}, 3),
+    ("BNE not taken", (0xD0, 0x02), {"z": 1}, {"pc": 0x202}, 2),
+    ("BEQ backwards", (0xF0, 0xFC), {"z": 1}, {"pc": 0x1FE}, 3),
+    ("BCC taken", (0x90, 0x10), {"c": 0}, {"pc": 0x212}, 3),
+    ("BCS not taken", (0xB0, 0x10), {"c": 0}, {"pc": 0x202}, 2),
+    ("BPL taken", (0x10, 0x10), {"n": 0}, {"pc": 0x212}, 3),
+    ("BMI not taken", (0x30, 0x10), {"n": 0}, {"pc": 0x202}, 2),
+    ("BVC not taken", (0x50, 0x10), {"v": 1}, {"pc": 0x202}, 2),
+    ("BVS taken", (0x70, 0x80), {"v": 1}, {"pc": 0x182}, 3),
+    # stack.
+    ("PHA", (0x48,), {"a": 0x42, "sp": 0xFF}, {0x1FF: 0x42, "sp": 0xFE}, 3),
+    (
+        "PLA",
+        (0x68,),
+        {"sp": 0xFE, 0x1FF: 0x80},
+        {"a": 0x80, "n": 1, "z": 0, "sp": 0xFF},
+        4,
+    ),
+    (
+        "PHP",
+        (0x08,),
+        {"sp": 0xFF, "n": 1, "v": 0, "d": 0, "i": 0, "z": 0, "c": 1},
+        # B and unused bits set.
+        {0x1FF: 0xB1, "sp": 0xFE},
+        3,
+    ),
+    (
+        "PLP",
+        (0x28,),
+        {"sp": 0xFE, 0x1FF: 0xFF},
+        {"n": 1, "v": 1, "d": 1, "i": 1, "z": 1, "c": 1, "sp": 0xFF},
+        4,
+    ),
+    (
+        "PLP wraps",
+        (0x28,),
+        {"sp": 0xFF, 0x100: 0x01},
+        {"c": 1, "z": 0, "sp": 0x00},
+        4,
+    ),
+    (
+        "JSR $1234",
+        (0x20, 0x34, 0x12),
+        {"sp": 0xFF},
+        {"pc": 0x1234, "sp": 0xFD, 0x1FF: 0x02, 0x1FE: 0x02},
+        6,
+    ),
+    (
+        "RTS",
+        (0x60,),
+        {"sp": 0xFD, 0x1FE: 0x33, 0x1FF: 0x12},
+        {"pc": 0x1234, "sp": 0xFF},
+        6,
+    ),
+    ("TSX", (0xBA,), {"sp": 0xF0}, {"x": 0xF0, "n": 1}, 2),
+    ("TXS", (0x9A,), {"x": 0, "z": 0}, {"sp": 0, "z": 0}, 2),
+    # interrupts.
+    (
+        "BRK",
+        (0x00, 0xEA),
+        {"sp": 0xFF, "c": 1, "i": 0, 0xFFFE: 0x00, 0xFFFF: 0x30},
+        {
+            "pc": 0x3000,
+            "sp": 0xFC,
+            "i": 1,
+            0x1FF: 0x02,
+            0x1FE: 0x02,
+            0x1FD: 0x31,
+        },
+        7,
+    ),
+    (
+        "RTI",
+        (0x40,),
+        {"sp": 0xFC, 0x1FD: 0xC3, 0x1FE: 0x34, 0x1FF: 0x12},
+        {
+            "pc": 0x1234,
+            "sp": 0xFF,
+            "n": 1,
+            "v": 1,
+            "d": 0,
+            "i": 0,
+            "z": 1,
+            "c": 1,
+        },
+        6,
+    ),
+    # illegal opcodes.
+    ("LAX $10", (0xA7, 0x10), {0x10: 0x80}, {"a": 0x80, "x": 0x80, "n": 1}, 3),
+    (
+        "LAX ($10),Y",
+        (0xB3, 0x10),
+        {"y": 4, 0x10: 0x30, 0x11: 0x12, 0x1234: 0x01},
+        {"a": 0x01, "x": 0x01},
+        5,
+    ),
+    ("SAX $10", (0x87, 0x10), {"a": 0xF0, "x": 0x3C}, {0x10: 0x30}, 3),
+    (
+        "DCP $10",
+        (0xC7, 0x10),
+        {"a": 0x7F, 0x10: 0x80},
+        {0x10: 0x7F, "z": 1, "c": 1},
+        5,
+    ),
+    (
+        "DCP $1230,Y",
+        (0xDB, 0x30, 0x12),
+        {"a": 0, "y": 4, 0x1234: 1},
+        {0x1234: 0, "z": 1, "c": 1},
+        7,
+    ),
+    (
+        "ISC $10",
+        (0xE7, 0x10),
+        {"a": 0x10, "c": 1, 0x10: 0x0F},
+        {0x10: 0x10, "a": 0, "z": 1, "c": 1},
+        5,
+    ),
+    (
+        "SLO $10",
+        (0x07, 0x10),
+        {"a": 0x01, 0x10: 0x81},
+        {0x10: 0x02, "a": 0x03, "c": 1},
+        5,
+    ),
+    (
+        "RLA $10",
+        (0x27, 0x10),
+        {"a": 0xFF, "c": 1, 0x10: 0x40},
+        {0x10: 0x81, "a": 0x81, "c": 0, "n": 1},
+        5,
+    ),
+    (
+        "SRE $10",
+        (0x47, 0x10),
+        {"a": 0xFF, 0x10: 0x03},
+        {0x10: 0x01, "a": 0xFE, "c": 1, "n": 1},
+        5,
+    ),
+    (
+        "RRA $10",
+        (0x67, 0x10),
+        {"a": 0x01, "c": 1, 0x10: 0x02},
+        {0x10: 0x81, "a": 0x82, "c": 0, "n": 1, "v": 0},
+        5,
+    ),
+    ("ANC #$80", (0x0B, 0x80), {"a": 0xFF}, {"a": 0x80, "n": 1, "c": 1}, 2),
+    ("ALR #$03", (0x4B, 0x03), {"a": 0xFF}, {"a": 0x01, "c": 1}, 2),
+    (
+        "ARR #$FF",
+        (0x6B, 0xFF),
+        {"a": 0xC0, "c": 1},
+        {"a": 0xE0, "n": 1, "c": 1, "v": 0},
+        2,
+    ),
+    (
+        "SBX #$01",
+        (0xCB, 0x01),
+        {"a": 0xF0, "x": 0x0F},
+        {"x": 0xFF, "c": 0, "n": 1},
+        2,
+    ),
+    ("SBC #$01 ($EB)", (0xEB, 0x01), {"a": 0x10, "c": 1}, {"a": 0x0F, "c": 1}, 2),
+    ("NOP", (0xEA,), {}, {"pc": 0x201}, 2),
+    ("NOP ($1A)", (0x1A,), {}, {"pc": 0x201}, 2),
+    ("NOP #$FF ($80)", (0x80, 0xFF), {}, {"pc": 0x202}, 2),
+    ("NOP $1230,X ($1C)", (0x1C, 0x30, 0x12), {"x": 4}, {"pc": 0x203}, 4),
+)
+
+
+class Cpu6502TestCase(unittest.TestCase):
+    """Test 6502 emulation."""
+
+    @staticmethod
+    def _set_state(cpu, state):
+        for key, val in state.items():
+            if isinstance(key, int):
+                cpu.ram[key] = val
+            else:
+                setattr(cpu, key, val)
+
+    def _get_state(self, cpu, state):
+        return {
+            key: cpu.ram[key] if isinstance(key, int) else getattr(cpu, key)
+            for key in state
+        }
+
+    def test_opcodes(self):
+        for description, code, before, after, cycles in OPCODE_CASES:
+            with self.subTest(description):
+                cpu = Cpu6502()
+                cpu.pc = CODE_ADDRESS
+                cpu.ram[CODE_ADDRESS : CODE_ADDRESS + len(code)] = bytes(code)
+                self._set_state(cpu, before)
+                flags_before = self._get_state(cpu, ("n", "v", "d", "i", "z", "c"))
+                cpu.step()
+                self.assertEqual(after, self._get_state(cpu, after))
+                # flags not expected to change, did not.
+                unchanged = {
+                    flag: val for flag, val in flags_before.items() if flag not in after
+                }
+                self.assertEqual(unchanged, self._get_state(cpu, unchanged))
+                self.assertEqual(cycles, cpu.cycles)
+                self.assertEqual(1, cpu.instructions)
+                self.assertIsNone(cpu.jammed)
+
+    def test_jam(self):
+        cpu = Cpu6502()
+        cpu.pc = CODE_ADDRESS
+        cpu.ram[CODE_ADDRESS] = 0x02
+        cpu.step()
+        self.assertEqual(0x02, cpu.jammed)
+        self.assertEqual(CODE_ADDRESS, cpu.pc)
+
+    def test_all_opcodes_decoded(self):
+        # every opcode but the JAMs, and the unstable illegal opcodes (which are
+        # treated as JAMs), has an implementation.
+        cpu = Cpu6502()
+        jams = {opcode for opcode, (op, _, _) in enumerate(cpu.ops) if op == cpu.op_jam}
+        self.assertEqual(
+            {0x02, 0x12, 0x22, 0x32, 0x42, 0x52, 0x62, 0x72, 0x92, 0xB2, 0xD2, 0xF2}
+            | {0x8B, 0x93, 0x9B, 0x9C, 0x9E, 0x9F, 0xAB, 0xBB},
+            jams,
+        )
+
+    def test_cia_writes(self):
+        c64 = C64()
+        c64.write(0xDC04, 0x34)
+        # a mirror of $DC05.
+        c64.write(0xDC25, 0x12)
+        c64.write(0xDC06, 0x01)
+        self.assertEqual([(0x4, 0x34), (0x5, 0x12)], c64.cia_writes)
+        self.assertEqual(0x1234, c64.cia_latch)
+        # with I/O banked out, writes go to the RAM underneath.
+        c64.write(1, 0x34)
+        c64.write(0xDC0E, 0x11)
+        self.assertEqual([(0x4, 0x34), (0x5, 0x12)], c64.cia_writes)
+        self.assertEqual(0x11, c64.ram[0xDC0E])
+        self.assertEqual(0, c64.cia_ctrl)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
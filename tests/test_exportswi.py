@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+import pandas as pd
+from desidulate.exportswi import export_swis
+from desidulate.fileio import read_csv
+from desidulate.sidwrap import get_sid
+from desidulate.ssf2swi import print_swi, ssf_swi
+
+SSF_ROWS = """
+hashid,pr_speed,clock,gate1,sync1,ring1,test1,saw1,freq1,pwduty1,pulse1,tri1,noise1,flt1,fltcoff,fltres,fltlo,fltband,flthi,atk1,dec1,sus1,rel1,pr_frame,count
+1,1,0,1,0,0,0,0,4000,256,1,0,0,0,,,,,,0,10,0,0,0,10
+1,1,100,1,0,0,0,0,4000,258,1,0,0,0,,,,,,,,,,1,10
+1,1,200,1,0,0,0,0,4000,260,1,0,0,0,,,,,,,,,,2,10
+2,1,0,1,0,0,0,0,2000,,0,1,0,1,1024,15,1,0,0,0,9,0,0,0,1
+2,1,100,1,0,0,0,0,2000,,0,1,0,1,1032,15,1,0,0,,,,,1,1
+3,2,0,1,0,0,0,0,3000,,0,0,1,0,,,,,,0,8,0,0,0,5
+3,2,100,0,0,0,0,0,3000,,0,0,1,0,,,,,,,,,,1,5
+"""
+
+
+class ExportSwiTestCase(unittest.TestCase):
+
+    def test_export_swis(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = os.path.join(tmpdir, "merged.ssf.zst")
+            library = os.path.join(tmpdir, "swi.zip")
+            df = read_csv(io.StringIO(SSF_ROWS), dtype=pd.Int64Dtype())
+            df.to_csv(store, index=False)
+            self.assertEqual(
+                2,
+                export_swis(
+                    store, library, workers=1, batch=1, chunk_rows=2, min_count=5
+                ),
+            )
+            with zipfile.ZipFile(library) as library_zip:
+                self.assertEqual(
+                    ["1.swi.txt", "3.swi.txt", "index.csv"],
+                    sorted(library_zip.namelist()),
+                )
+                index_df = pd.read_csv(io.BytesIO(library_zip.read("index.csv")))
+                self.assertEqual([1, 3], list(index_df["hashid"]))
+                self.assertEqual(["p", "n"], list(index_df["labels"]))
+                self.assertEqual(["0A00", "0800"], list(index_df["adsr"]))
+                swi_f = io.StringIO()
+                print_swi(
+                    *ssf_swi(get_sid(pal=True, cia=0), df[df["hashid"] == 1]),
+                    file=swi_f
+                )
+                self.assertEqual(
+                    swi_f.getvalue(), library_zip.read("1.swi.txt").decode("utf8")
+                )
+            self.assertEqual(
+                1,
+                export_swis(
+                    store, library, workers=1, pr_speeds=[2], label="^n$", min_count=0
+                ),
+            )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+
+import hashlib
+import os
+import sqlite3
+import struct
+import tempfile
+import unittest
+import pandas as pd
+from desidulate.gensidinfo import scrape_sids
+from desidulate.sidinfo import emulate_cia_timer
+
+CIA_SID = os.path.join(os.path.dirname(__file__), "sids", "psid_init.sid")
+
+
+def fixed_cia_probe(_sidfile, _validate_ctrl, _tune):
+    return 0x4321
+
+
+def make_vbi_sid(name, author=b"test"):
+    header = struct.pack(
+        ">4sHHHHHHHI32s32s32sHBBBB",
+        b"PSID",
+        2,
+        0x7C,
+        0x1000,
+        0x1000,
+        0x1003,
+        1,
+        1,
+        0,
+        name,
+        author,
+        b"test",
+        1 << 2,
+        0,
+        0,
+        0,
+        0,
+    )
+    return header + bytes((0x60, 0x00, 0x00, 0x60))
+
+
+class GenSidInfoTestCase(unittest.TestCase):
+    """Test gensidinfo."""
+
+    @staticmethod
+    def _write_hvsc(sids, docs=os.path.join("C64Music", "DOCUMENTS")):
+        os.makedirs(docs, exist_ok=True)
+        with open(os.path.join(docs, "Songlengths.md5"), "w", encoding="utf8") as f:
+            for sidfile, sid in sids.items():
+                with open(os.path.join("C64Music", sidfile), "wb") as sid_f:
+                    sid_f.write(sid)
+                f.write(f"; /{sidfile}\n{hashlib.md5(sid).hexdigest()}=1:02.5\n")
+
+    def test_scrape_sids(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                db_path = os.path.join(tmpdir, "sidinfo.db")
+                sids = {
+                    "a.sid": make_vbi_sid(b"a"),
+                    "b.sid": make_vbi_sid(b"b"),
+                    "c.sid": make_vbi_sid(b"c"),
+                }
+                self._write_hvsc(sids)
+                csv_path = os.path.join(tmpdir, "sidinfo.csv")
+                scrape_sids(".", True, db_path, csv_path)
+                df = pd.read_csv(csv_path)
+                self.assertEqual(
+                    ["C64Music/a.sid", "C64Music/b.sid", "C64Music/c.sid"],
+                    df["path"].tolist(),
+                )
+                self.assertEqual([63, 63, 63], df["length"].tolist())
+                self.assertEqual(["a", "b", "c"], df["name"].tolist())
+                self.assertNotIn("author", df.columns)
+                with sqlite3.connect(db_path) as db:
+                    self.assertEqual(
+                        3, db.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+                    )
+
+                del sids["b.sid"]
+                os.remove(os.path.join("C64Music", "b.sid"))
+                sids["c.sid"] = make_vbi_sid(b"d")
+                self._write_hvsc(sids)
+                os.utime(os.path.join("C64Music", "c.sid"), (1, 1))
+                scrape_sids(".", True, db_path, csv_path)
+                df = pd.read_csv(csv_path)
+                self.assertEqual(["a", "d"], df["name"].tolist())
+                with sqlite3.connect(db_path) as db:
+                    self.assertEqual(
+                        2, db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+                    )
+                    self.assertEqual(
+                        2, db.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+                    )
+            finally:
+                os.chdir(cwd)
+
+    def test_scrape_sids_unknowns(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                self._write_hvsc(
+                    {
+                        "a.sid": make_vbi_sid(b"a", author=b"x"),
+                        "b.sid": make_vbi_sid(b"b", author=b"<?>"),
+                    }
+                )
+                csv_path = os.path.join(tmpdir, "sidinfo.csv")
+                scrape_sids(".", True, os.path.join(tmpdir, "sidinfo.db"), csv_path)
+                df = pd.read_csv(csv_path)
+                # one known value and unknowns is still two distinct values.
+                self.assertEqual("x", df["author"][0])
+                self.assertTrue(pd.isna(df["author"][1]))
+            finally:
+                os.chdir(cwd)
+
+    def test_scrape_sids_songlengths_files(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                # each tune is only in one of the Songlengths.md5 files.
+                self._write_hvsc({"a.sid": make_vbi_sid(b"a")})
+                self._write_hvsc(
+                    {"e.sid": make_vbi_sid(b"e")},
+                    docs=os.path.join("C64Music", "DOCUMENTS", "extra"),
+                )
+                csv_path = os.path.join(tmpdir, "sidinfo.csv")
+                scrape_sids(".", True, os.path.join(tmpdir, "sidinfo.db"), csv_path)
+                df = pd.read_csv(csv_path)
+                self.assertEqual(
+                    ["C64Music/a.sid", "C64Music/e.sid"], df["path"].tolist()
+                )
+                self.assertEqual([63, 63], df["length"].tolist())
+            finally:
+                os.chdir(cwd)
+
+    def test_scrape_sids_cia_probe(self):
+        cwd = os.getcwd()
+        with open(CIA_SID, "rb") as f:
+            cia_sid = f.read()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                self._write_hvsc({"a.sid": cia_sid})
+                db_path = os.path.join(tmpdir, "sidinfo.db")
+                csv_path = os.path.join(tmpdir, "sidinfo.csv")
+                # cached songs are kept only while the probe is the same.
+                for cia_probe, cia in (
+                    (emulate_cia_timer, 0x1234),
+                    (fixed_cia_probe, 0x4321),
+                    (fixed_cia_probe, 0x4321),
+                    (emulate_cia_timer, 0x1234),
+                ):
+                    scrape_sids(".", True, db_path, csv_path, cia_probe)
+                    self.assertEqual([cia], pd.read_csv(csv_path)["cia"].tolist())
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+import io
+import os
+import tempfile
+import unittest
+import pandas as pd
+from desidulate.fileio import read_csv, read_int_columns
+from desidulate.indexssf import index_ssf
+
+SSF_ROWS = """
+hashid,hashid_noclock,pr_speed,clock,gate1,sync1,ring1,test1,tri1,saw1,pulse1,noise1,freq1,vol
+1,10,1,0,1,0,0,0,0,0,1,0,4000,
+1,10,1,100,0,0,0,0,0,0,1,0,,
+2,20,1,0,1,0,0,0,1,0,0,0,2000,
+2,20,1,600000,1,0,0,0,0,0,0,1,,
+3,30,9,0,1,0,0,0,0,0,0,1,3000,
+4,40,1,0,0,0,0,0,0,0,0,0,,15
+"""
+
+
+class IndexSsfTestCase(unittest.TestCase):
+
+    def test_index_ssf(self):
+        df = read_csv(io.StringIO(SSF_ROWS), dtype=pd.Int64Dtype())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for ext in ("zst", "parquet"):
+                ssffile = os.path.join(tmpdir, "%s.ssf.%s" % (ext, ext))
+                if ext == "parquet":
+                    df.to_parquet(ssffile, index=False)
+                else:
+                    df.to_csv(ssffile, index=False)
+                filtered_df = read_int_columns(
+                    ssffile,
+                    ["hashid", "clock", "missing"],
+                    filters=[("clock", "<=", 500000)],
+                )
+                self.assertEqual([1, 1, 2, 3, 4], list(filtered_df["hashid"]))
+                self.assertTrue(filtered_df["missing"].isna().all())
+                index_files = index_ssf(ssffile)
+                self.assertEqual(
+                    [
+                        os.path.join(tmpdir, "%s.1.%s.index_ssf.zst" % (ext, labels))
+                        for labels in ("0", "p", "t")
+                    ],
+                    index_files,
+                )
+                self.assertEqual(
+                    [[1, 10]], read_csv(index_files[1]).to_numpy().tolist()
+                )
+            self.assertEqual(
+                index_files[2].replace("parquet.", "zst."),
+                index_ssf(os.path.join(tmpdir, "zst.ssf.zst"), df=df)[2],
+            )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+
+import os
+import random
+import tempfile
+import unittest
+import pandas as pd
+from desidulate.mergessf import merge_ssfs, ssf_tune_song
+
+
+def make_ssf_df(rng, hashids):
+    rows = []
+    for hashid in hashids:
+        count = rng.randint(1, 10)
+        for clock in range(0, rng.randint(1, 4) * 100, 100):
+            rows.append(
+                {
+                    "hashid": hashid,
+                    "clock": clock,
+                    "gate1": rng.randint(0, 1),
+                    "freq1": hashid % 1000,
+                    "count": count,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+class MergeSsfTestCase(unittest.TestCase):
+    """Test mergessf."""
+
+    def test_ssf_tune_song(self):
+        self.assertEqual(
+            ("C64Music/x.sid", 2), ssf_tune_song("C64Music/x/2/x-2.ssf.zst")
+        )
+        self.assertEqual(("other.ssf.zst", 0), ssf_tune_song("other.ssf.zst"))
+
+    def test_merge_ssfs(self):
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ssffiles = []
+            ssf_dfs = []
+            for tune in range(5):
+                ssffile = os.path.join(
+                    tmpdir, "C64Music", str(tune), "1", "%u-1.ssf.zst" % tune
+                )
+                os.makedirs(os.path.dirname(ssffile))
+                ssf_df = make_ssf_df(
+                    rng, rng.sample(range(-(2**40), -(2**40) + 50), 20)
+                )
+                ssf_df.to_csv(ssffile, index=False)
+                ssffiles.append(ssffile)
+                ssf_dfs.append(ssf_df)
+            store = os.path.join(tmpdir, "merged.ssf.zst")
+            occurrences = os.path.join(tmpdir, "merged.occurrences.zst")
+            hashids = merge_ssfs(ssffiles, store, occurrences, buckets=3, merge_rows=50)
+            all_df = pd.concat(ssf_dfs)
+            self.assertEqual(all_df["hashid"].nunique(), hashids)
+
+            store_df = pd.read_csv(store)
+            self.assertEqual(list(ssf_dfs[0].columns), list(store_df.columns))
+            for hashid, hashid_df in store_df.groupby("hashid"):
+                tune_dfs = [
+                    ssf_df[ssf_df["hashid"] == hashid]
+                    for ssf_df in ssf_dfs
+                    if hashid in ssf_df["hashid"].values
+                ]
+                # rows from the first tune, count summed over all tunes.
+                self.assertEqual(
+                    sum(tune_df["count"].iat[0] for tune_df in tune_dfs),
+                    hashid_df["count"].iat[0],
+                )
+                self.assertEqual(
+                    tune_dfs[0].drop(columns="count").values.tolist(),
+                    hashid_df.drop(columns="count").values.tolist(),
+                )
+
+            occurrences_df = pd.read_csv(occurrences)
+            self.assertEqual(100, len(occurrences_df))
+            self.assertEqual(
+                sorted(ssf_dfs[2]["hashid"].unique()),
+                sorted(
+                    occurrences_df[
+                        occurrences_df["tune"].str.endswith("C64Music/2.sid")
+                    ]["hashid"]
+                ),
+            )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
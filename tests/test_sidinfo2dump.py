@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from desidulate.sidinfo2dump import (
+    dump_jobs,
+    read_dump_status,
+    read_sidinfo,
+    run_dump_jobs,
+    stub_dump,
+)
+from desidulate.songlengths import songlengths_index
+
+
+class SidInfo2DumpTestCase(unittest.TestCase):
+    """Test sidinfo2dump."""
+
+    def test_run_dump_jobs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sidinfo_csv = os.path.join(tmpdir, "sidinfo.csv")
+            pd.DataFrame(
+                [
+                    {"path": "C64Music/a.sid", "song": 1, "pal": 1, "length": 10},
+                    {"path": "C64Music/a.sid", "song": 2, "pal": 1, "length": 30},
+                    {"path": "C64Music/b.sid", "song": 1, "pal": 0, "length": 30},
+                    {"path": "C64Music/c.sid", "song": 1, "pal": 1, "length": 20},
+                ]
+            ).to_csv(sidinfo_csv, index=False)
+            jobs = dump_jobs(read_sidinfo(sidinfo_csv), tmpdir)
+            self.assertEqual(
+                os.path.join(tmpdir, "C64Music", "a", "2", "a-2.dump.zst"),
+                jobs[1].dump_path,
+            )
+            self.assertIn("/vice/a/2/a-2.dump.zst", jobs[1].vice_cmd())
+            status_path = os.path.join(tmpdir, "status.jsonl")
+
+            def fail_b(job):
+                if job.path.endswith("b.sid"):
+                    return 1
+                return stub_dump(job)
+
+            self.assertEqual(
+                {"ok": 3, "failed": 1},
+                run_dump_jobs(jobs, fail_b, status_path, workers=1),
+            )
+            with open(status_path, encoding="utf8") as f:
+                records = [json.loads(line) for line in f]
+            # longest first (NTSC clock is faster than PAL).
+            self.assertEqual(
+                [
+                    "C64Music/b.sid:1",
+                    "C64Music/a.sid:2",
+                    "C64Music/c.sid:1",
+                    "C64Music/a.sid:1",
+                ],
+                [record["job"] for record in records],
+            )
+            self.assertEqual(
+                ["failed", "ok", "ok", "ok"], [record["status"] for record in records]
+            )
+            for job in jobs:
+                self.assertEqual(
+                    not job.path.endswith("b.sid"), os.path.exists(job.dump_path)
+                )
+
+            # resume, after an interrupted status write.
+            with open(status_path, "a", encoding="utf8") as f:
+                f.write('{"job": "C64Mu')
+            self.assertEqual(
+                {"ok": 1, "failed": 0},
+                run_dump_jobs(jobs, stub_dump, status_path, workers=2),
+            )
+            dump_status = read_dump_status(status_path)
+            self.assertEqual(4, len(dump_status))
+            self.assertEqual("ok", dump_status["C64Music/b.sid:1"]["status"])
+            self.assertEqual(
+                {"ok": 0, "failed": 0},
+                run_dump_jobs(jobs, stub_dump, status_path, workers=2),
+            )
+            # a removed dump is run again.
+            os.remove(jobs[0].dump_path)
+            self.assertEqual(
+                {"ok": 1, "failed": 0},
+                run_dump_jobs(jobs, stub_dump, status_path, workers=2),
+            )
+            self.assertTrue(os.path.exists(jobs[0].dump_path))
+
+    def test_read_sidinfo_songlengths(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sidinfo_csv = os.path.join(tmpdir, "sidinfo.csv")
+            pd.DataFrame(
+                [
+                    {"path": "C64Music/a.sid", "song": 1, "pal": 1, "length": 10},
+                    {"path": "C64Music/a.sid", "song": 2, "pal": 1, "length": 30},
+                ]
+            ).to_csv(sidinfo_csv, index=False)
+            songlengths = os.path.join(tmpdir, "Songlengths.md5")
+            with open(songlengths, "w", encoding="utf8") as f:
+                f.write("; /a.sid\n%.32x=1:02.5 0:07\n" % 1)
+            opened = []
+
+            def open_songlengths(songlengths_file):
+                opened.append(songlengths_index(songlengths_file))
+                return opened[-1]
+
+            with mock.patch(
+                "desidulate.sidinfo2dump.songlengths_index", open_songlengths
+            ):
+                df = read_sidinfo(sidinfo_csv, songlengths)
+            self.assertEqual([63, 7], df["length"].tolist())
+            # the songlengths index is not left open.
+            self.assertTrue(opened[0].mmap.closed)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+import os
+import random
+import tempfile
+import unittest
+from desidulate.fileio import write_timings
+from desidulate.sidinfoargs import estimate_costs, recorded_cost, shard_jobs
+
+
+class SidInfoArgsTestCase(unittest.TestCase):
+    """Test sidinfoargs cost model."""
+
+    def test_recorded_cost(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dump = os.path.join(tmpdir, "x-1.dump.zst")
+            self.assertEqual(None, recorded_cost(dump))
+            write_timings(dump, {"reg2ssf": {"time": 2, "bytes": 100}})
+            write_timings(
+                dump,
+                {"dump": {"time": 10, "bytes": 1}, "ssf2midi": {"time": 3, "bytes": 1}},
+            )
+            self.assertEqual(5, recorded_cost(dump))
+
+    def test_estimate_costs(self):
+        # cost = 2 * size + 10.
+        self.assertEqual(
+            [30, 50, 90, 210],
+            [
+                round(cost, 6)
+                for cost in estimate_costs([10, 20, 40, 100], [30, 50, None, None])
+            ],
+        )
+        # one timing, so cost is proportional to size.
+        self.assertEqual([20, 40], estimate_costs([10, 20], [20, None]))
+        # no timings, so cost is size.
+        self.assertEqual([10, 20], estimate_costs([10, 20], [None, None]))
+
+    def test_shard_jobs(self):
+        rng = random.Random(0)
+        jobs = [(rng.randint(1, 100), str(i)) for i in range(100)]
+        shards = shard_jobs(jobs, 4)
+        self.assertEqual(
+            sorted(jobs), sorted(cost_job for shard in shards for cost_job in shard)
+        )
+        shard_costs = [sum(cost for cost, _ in shard) for shard in shards]
+        self.assertLessEqual(max(shard_costs) - min(shard_costs), 100)
+        for shard in shards:
+            shard_costs = [cost for cost, _ in shard]
+            self.assertEqual(sorted(shard_costs, reverse=True), shard_costs)
+        self.assertEqual(
+            [sorted(jobs, key=lambda cost_job: cost_job[0], reverse=True)],
+            shard_jobs(jobs, 1),
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -1,5 +1,6 @@
 #!/usr/bin/python3
 
+import random
 import unittest
 from io import StringIO
 import pandas as pd
@@ -8,12 +9,40 @@ from desidulate.sidlib import (
     squeeze_diffs,
     coalesce_near_writes,
     remove_end_repeats,
+    remove_repeats,
+    control_labels,
+    unique_control_labels,
     calc_rates,
     bits2byte,
+    hash_vdf,
+    relative_vdf,
+    ssf_groups,
 )
 from desidulate.sidwrap import get_sid
 
 
+# Reference (original, quadratic) implementations for fuzz testing.
+def ref_remove_end_repeats(waveforms):
+    repeat_len = int(len(waveforms) / 2)
+    if repeat_len > 1:
+        repeat_range = [i for i in reversed(range(repeat_len + 1)) if i > 1]
+        for lookback in repeat_range:
+            while len(waveforms) >= lookback * 2:
+                if waveforms[-lookback:] != waveforms[-(lookback * 2) : -lookback]:
+                    break
+                waveforms = waveforms[:-lookback]
+    return waveforms
+
+
+def ref_remove_repeats(seq):
+    non_repeats = seq[:1]
+    for i in seq[1:]:
+        if i != non_repeats[-1]:
+            non_repeats.append(i)
+            non_repeats = ref_remove_end_repeats(non_repeats)
+    return non_repeats
+
+
 class SIDLibTestCase(unittest.TestCase):
 
     def test_bits2byte(self):
@@ -260,6 +289,50 @@ clock,gate1,freq1,pwduty1,pulse1,noise1,tri1,saw1,test1,sync1,ring1,freq3,test3,
         )
         self.assertEqual([1, 2, 3], remove_end_repeats([1, 2, 3, 1, 2, 3]))
 
+    def test_remove_repeats(self):
+        self.assertEqual([1, 2], remove_repeats([1, 1, 2, 2]))
+        self.assertEqual([1, 2, 3], remove_repeats([1, 2, 3, 1, 2, 3, 1, 2, 3]))
+        self.assertEqual([1, 2, 1, 3], remove_repeats([1, 2, 1, 2, 1, 3]))
+        self.assertEqual([], remove_repeats([]))
+
+    def test_remove_repeats_fuzz(self):
+        rng = random.Random(1)
+        for _ in range(2000):
+            alphabet = rng.randint(1, 5)
+            seq = [rng.randrange(alphabet) for _ in range(rng.randint(0, 120))]
+            if rng.random() < 0.3:
+                seq = (seq[: rng.randint(1, 8)] * rng.randint(1, 10)) + seq
+            self.assertEqual(ref_remove_end_repeats(list(seq)), remove_end_repeats(seq))
+            self.assertEqual(ref_remove_repeats(list(seq)), remove_repeats(seq))
+            labels = ["gp", "gn", "gt", "gs", "0"]
+            seq = [labels[i] for i in seq]
+            self.assertEqual(ref_remove_repeats(list(seq)), remove_repeats(seq))
+
+    def test_control_labels(self):
+        df = self.str2df("""
+clock,hashid,gate1,sync1,ring1,test1,tri1,saw1,pulse1,noise1
+0,1,1,0,0,1,0,0,0,0
+1,2,1,0,0,0,1,0,0,0
+2,1,1,0,0,0,0,0,1,0
+3,1,1,0,0,0,0,0,0,1
+4,2,0,0,0,0,1,0,0,0
+5,1,1,0,0,0,0,0,1,0
+6,1,1,0,0,0,0,0,0,1
+7,3,1,0,0,0,0,0,0,0
+""").reset_index()
+        df = unique_control_labels(control_labels(df))
+        self.assertEqual(
+            ["T", "t", "p", "n", "t", "p", "n", "0"], list(df["control_label"])
+        )
+        self.assertEqual(
+            ["T-p-n", "t", "T-p-n", "T-p-n", "t", "T-p-n", "T-p-n", ""],
+            list(df["control_labels"]),
+        )
+        self.assertEqual(
+            ["n-p", "t", "n-p", "n-p", "t", "n-p", "n-p", "0"],
+            list(df["unique_control_labels"]),
+        )
+
     def test_squeeze_diffs(self):
         df = self.str2df("""
 clock,gate1,pulse1,noise1
@@ -279,6 +352,36 @@ clock,gate1,pulse1,noise1
         df = df[~df.index.isin((200, 400))]
         self.assertEqual(df.to_string(), s_df.to_string())
 
+    def test_relative_hash(self):
+        df = read_csv(
+            StringIO("""
+ssf,clock,freq1,pwduty1
+1,0,1000,100
+1,100,1500,200
+2,0,2000,500
+2,100,3000,600
+3,0,1000,100
+3,100,1600,200
+"""),
+            dtype=pd.Int64Dtype(),
+        )
+        df = hash_vdf(df, {"ssf", "clock"})
+        relative_df = hash_vdf(
+            relative_vdf(df), {"ssf", "clock", "hashid_noclock"}, "hashid_relative"
+        )
+        hashids = relative_df.groupby("ssf")["hashid_relative"].first()
+        self.assertEqual(hashids[1], hashids[2])
+        self.assertNotEqual(hashids[1], hashids[3])
+        self.assertEqual([0, 70, 0, 70], list(relative_vdf(df)["freq1"][:4]))
+        self.assertEqual([0, 100, 0, 100], list(relative_vdf(df)["pwduty1"][:4]))
+
+        ssf_df = df.rename(columns={"ssf": "hashid"}).set_index("hashid")
+        ssf_df["hashid_relative"] = hashids
+        ssf_df["count"] = ssf_df.index.map({1: 2, 2: 5, 3: 1})
+        groups_df = ssf_groups(ssf_df)
+        self.assertEqual([2, 2, 3], list(groups_df["canonical_hashid"]))
+        self.assertEqual([-1200, 0, 0], list(groups_df["transpose"]))
+
     def test_coalesce_near_writes(self):
         df = self.str2df("""
 clock,freq1
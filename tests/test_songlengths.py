@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+import os
+import random
+import re
+import struct
+import tempfile
+import unittest
+from desidulate.songlengths import parse_songlengths, songlengths_index
+
+tunename_re = re.compile(r"^; (.+.sid)$")
+tunelength_re = re.compile(r"([a-z\d]+)=([\d+\s+\:\.]+)$")
+tunelength_time_re = re.compile(r"(\d+)\:(\d+)\.*(\d*)$")
+
+
+def ref_scrape_tunelengths(tunelengthfile):
+    # original regex parser, from gensidinfo.
+    all_tunelengths = {}
+    tunename = None
+    with open(tunelengthfile, encoding="utf8") as f:
+        for line in f:
+            tunename_match = tunename_re.match(line)
+            if tunename_match:
+                tunename = os.path.join("C64Music", tunename_match.group(1)[1:])
+                continue
+            tunelength_match = tunelength_re.match(line)
+            if not tunelength_match:
+                continue
+            assert tunename
+            md5_hash = tunelength_match.group(1)
+            tunelength_raw = tunelength_match.group(2).split()
+            tunelengths = {}
+            for song, raw in enumerate(tunelength_raw, start=1):
+                raw_match = tunelength_time_re.match(raw)
+                if raw_match is None:
+                    raise ValueError(raw)
+                tunelength = int(raw_match.group(1)) * 60
+                tunelength += int(raw_match.group(2))
+                if raw_match.group(3):
+                    tunelength += 1
+                tunelengths[song] = tunelength
+            all_tunelengths[md5_hash] = tunelengths
+            all_tunelengths[tunename] = tunelengths
+            tunename = None
+    return all_tunelengths
+
+
+class SongLengthsTestCase(unittest.TestCase):
+    """Test Songlengths.md5 index."""
+
+    def test_songlengths_index(self):
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            songlengths_file = os.path.join(tmpdir, "Songlengths.md5")
+            with open(songlengths_file, "w", encoding="utf8") as f:
+                f.write("[Database]\n")
+                for i in range(500):
+                    f.write(f"; /MUSICIANS/T/Test/Tune_{i}.sid\n")
+                    lengths = " ".join(
+                        "%u:%.2u%s"
+                        % (
+                            rng.randint(0, 20),
+                            rng.randint(0, 59),
+                            rng.choice(("", ".5", ".001")),
+                        )
+                        for _ in range(rng.randint(1, 10))
+                    )
+                    f.write("%.32x=%s\n" % (rng.getrandbits(128), lengths))
+            ref = ref_scrape_tunelengths(songlengths_file)
+            self.assertEqual(1000, len(ref))
+            self.assertEqual(500, len(list(parse_songlengths(songlengths_file))))
+            songlengths = songlengths_index(songlengths_file)
+            self.assertEqual(500, len(songlengths))
+            for key, tunelengths in ref.items():
+                self.assertIn(key, songlengths)
+                self.assertEqual(tunelengths, songlengths[key])
+            self.assertNotIn("C64Music/MUSICIANS/T/Test/Tune_500.sid", songlengths)
+            self.assertNotIn("%.32x" % 0, songlengths)
+            with self.assertRaises(KeyError):
+                songlengths["missing"]  # pylint: disable=pointless-statement
+            songlengths.close()
+
+            # rebuilt only when Songlengths.md5 changes.
+            index_file = songlengths_file + ".index"
+            os.utime(index_file, (1, 1))
+            songlengths_index(songlengths_file).close()
+            self.assertEqual(1, os.path.getmtime(index_file))
+            # even if the new Songlengths.md5 is older than the index.
+            with open(songlengths_file, "w", encoding="utf8") as f:
+                f.write("; /MUSICIANS/T/Test/Tune_0.sid\n%.32x=1:00\n" % 1)
+            os.utime(songlengths_file, (0, 0))
+            songlengths = songlengths_index(songlengths_file)
+            self.assertLess(1, os.path.getmtime(index_file))
+            self.assertEqual(1, len(songlengths))
+            self.assertEqual(
+                {1: 60}, songlengths["C64Music/MUSICIANS/T/Test/Tune_0.sid"]
+            )
+            songlengths.close()
+            # an index of an older version is rebuilt.
+            with open(index_file, "r+b") as f:
+                f.write(struct.pack("<4sI", b"DSSL", 1))
+            songlengths = songlengths_index(songlengths_file)
+            self.assertEqual(1, len(songlengths))
+            songlengths.close()
+
+    def test_songlengths_index_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            songlengths_files = []
+            for name, tunes in (
+                ("a", (("/A/a.sid", 1, "0:10"), ("/A/b.sid", 2, "0:20"))),
+                ("b", (("/A/b.sid", 3, "0:30 0:31"), ("/B/c.sid", 4, "0:40"))),
+            ):
+                songlengths_file = os.path.join(tmpdir, name, "Songlengths.md5")
+                os.makedirs(os.path.dirname(songlengths_file))
+                with open(songlengths_file, "w", encoding="utf8") as f:
+                    for path, md5_hash, lengths in tunes:
+                        f.write("; %s\n%.32x=%s\n" % (path, md5_hash, lengths))
+                songlengths_files.append(songlengths_file)
+            songlengths = songlengths_index(songlengths_files)
+            self.assertEqual(3, len(songlengths))
+            self.assertEqual({1: 10}, songlengths["C64Music/A/a.sid"])
+            # later files override earlier ones.
+            self.assertEqual({1: 30, 2: 31}, songlengths["C64Music/A/b.sid"])
+            self.assertEqual({1: 40}, songlengths["%.32x" % 4])
+            songlengths.close()
+            # each set of files has its own index.
+            songlengths = songlengths_index(songlengths_files[:1])
+            self.assertEqual(2, len(songlengths))
+            self.assertNotIn("C64Music/B/c.sid", songlengths)
+            songlengths.close()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -1,13 +1,19 @@
 #!/usr/bin/python3
 
 import os
+import pickle
 import tempfile
 import unittest
 import pandas as pd
 from desidulate.sidlib import reg2state, state2ssfs, control_labels
 from desidulate.sidmidi import SidMidiFile, MAX_VEL
 from desidulate.sidwrap import get_sid
-from desidulate.ssf import SidSoundFragment, add_freq_notes_df
+from desidulate.ssf import (
+    SidSoundFragment,
+    SidSoundFragmentFrames,
+    SidSoundFragmentTranscription,
+    add_freq_notes_df,
+)
 
 
 class SSFTestCase(unittest.TestCase):
@@ -148,6 +154,87 @@ class SSFTestCase(unittest.TestCase):
         smf.add_drum_pitch(1, 1, 100, 1, 127)
         smf.write(os.devnull)
 
+    def test_deoverlap_pitches(self):
+        sid = get_sid(pal=True, cia=0)
+        smf = SidMidiFile(sid)
+        for clock, duration, pitch in ((50, 100, 60), (1, 100, 30), (120, 10, 61)):
+            smf.add_pitch(1, clock, duration, pitch, 127)
+        pitches = smf.pitches[1]
+        self.assertEqual(3, len(pitches))
+        clock, duration, pitch, _ = smf.deoverlap_pitches(*pitches.columns())
+        self.assertEqual([1, 50, 120], clock.tolist())
+        self.assertEqual([49, 70, 10], duration.tolist())
+        self.assertEqual([30, 60, 61], pitch.tolist())
+        smf.write(os.devnull)
+
+    def test_ssf_transcription(self):
+        df = pd.DataFrame(
+            [
+                {
+                    "hashid": 1,
+                    "count": 1,
+                    "clock": 0,
+                    "freq1": 1024,
+                    "atk1": 0,
+                    "dec1": 0,
+                    "sus1": 15,
+                    "rel1": 0,
+                    "gate1": 1,
+                    "sync1": 0,
+                    "ring1": 0,
+                    "test1": 0,
+                    "saw1": 0,
+                    "pulse1": 0,
+                    "noise1": 0,
+                    "tri1": 1,
+                    "vol": 15,
+                },
+                {"hashid": 1, "count": 1, "clock": 1e5, "gate1": 0},
+            ],
+            dtype=pd.UInt64Dtype(),
+        )
+        s = self._df2ssf(df, percussion=True)
+        t = pickle.loads(pickle.dumps(SidSoundFragmentTranscription(s, {"hashid": 1})))
+        self.assertEqual(t.instrument["hashid"], 1)
+        sid = get_sid(pal=True, cia=0)
+        smf = SidMidiFile(sid)
+        t_smf = SidMidiFile(sid)
+        s.smf_transcribe(smf, 100, 1, pd.NA)
+        t.smf_transcribe(t_smf, 100, 1, pd.NA)
+        self.assertTrue(smf.pitches[1])
+        for pitches, t_pitches in (
+            (smf.pitches, t_smf.pitches),
+            (smf.drum_pitches, t_smf.drum_pitches),
+        ):
+            self.assertEqual(pitches.keys(), t_pitches.keys())
+            for voicenum, voice_pitches in pitches.items():
+                self.assertEqual(
+                    [col.tolist() for col in voice_pitches.columns()],
+                    [col.tolist() for col in t_pitches[voicenum].columns()],
+                )
+
+    def test_ssf_frames(self):
+        df = pd.DataFrame(
+            [
+                {"hashid": 2, "clock": 0, "gate1": 1, "freq1": 100},
+                {"hashid": 1, "clock": 0, "gate1": 1, "freq1": 200},
+                {"hashid": 2, "clock": 10, "gate1": 0},
+                {"hashid": 1, "clock": 20, "gate1": 0},
+                {"hashid": 3, "clock": 0, "gate1": 1},
+            ],
+            dtype=pd.Int64Dtype(),
+        )
+        frames = SidSoundFragmentFrames(df)
+        self.assertEqual(3, len(frames))
+        self.assertEqual([1, 2, 3], sorted(frames))
+        self.assertNotIn(4, frames)
+        for hashid, ssf_df in df.groupby("hashid"):
+            self.assertEqual(
+                ssf_df.set_index("clock").ffill().to_string(),
+                frames[hashid].to_string(),
+            )
+        self.assertIs(frames[1], frames[1])
+
     def test_ssf_parser(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             test_log = os.path.join(tmpdir, "vicesnd.log")
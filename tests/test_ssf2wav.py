@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import tempfile
+import unittest
+import pandas as pd
+from desidulate.ssf2wav import select_hashids
+from desidulate.ssfindex import SsfIndex
+from desidulate.ssfstore import SsfStore, write_ssf_store
+
+
+class Ssf2WavTestCase(unittest.TestCase):
+
+    def test_select_hashids(self):
+        ssf_df = pd.DataFrame(
+            {
+                "hashid": [5, -3, 9, 7],
+                "pr_speed": [1, 1, 2, 1],
+                "clock": [0, 0, 0, 0],
+                "vol": [None, None, None, None],
+                "count": [4, 3, 2, 1],
+            },
+            dtype=pd.Int64Dtype(),
+        )
+        for col in ("gate1", "sync1", "ring1", "test1", "tri1", "saw1", "pulse1"):
+            ssf_df[col] = pd.array([1, 0, 0, 0], dtype=pd.Int64Dtype())
+        ssf_df["noise1"] = pd.array([0, 1, 1, 1], dtype=pd.Int64Dtype())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ssffile = os.path.join(tmpdir, "x.ssf.parquet")
+            write_ssf_store(ssf_df.set_index("hashid"), ssffile, row_group_size=2)
+            db = os.path.join(tmpdir, "ssfindex.db")
+            ssf_index = SsfIndex(db)
+            ssf_index.add(ssffile, ssf_df)
+            ssf_index.close()
+            ssf_store = SsfStore(ssffile)
+
+            def selected(hashid="0", rank="", query=()):
+                args = argparse.Namespace(
+                    hashid=hashid, rank=rank, query=list(query), db=db
+                )
+                hashids = select_hashids(args, ssf_store)
+                if hashids is None:
+                    return None
+                return list(hashids)
+
+            self.assertIsNone(selected())
+            self.assertEqual([7, 5], selected(hashid="7,5"))
+            self.assertEqual([-3, 9], selected(rank="1:3"))
+            self.assertEqual([9, 7], selected(rank="-2:"))
+            self.assertEqual([-3, 7], selected(query=["control:n", "pr_speed:1"]))
+            self.assertEqual([7], selected(query=["control:n"], rank="2:"))
+            self.assertEqual([5], selected(hashid="5,9", rank=":1"))
+            self.assertEqual(
+                [[5, -3], [9, 7]],
+                [
+                    list(df["hashid"])
+                    for df in ssf_store.read_batches(ssf_store.hashids(), batch=2)
+                ],
+            )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
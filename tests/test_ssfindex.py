@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from desidulate.fileio import read_csv
+from desidulate.indexssf import index_ssf
+from desidulate.ssfindex import (
+    SsfIndex,
+    decode_postings,
+    encode_postings,
+    index_ssfs,
+)
+
+
+def make_ssf_df(ssfs, clock_step=100):
+    rows = []
+    for hashid, waveforms, pr_speed, flt1, atk1 in ssfs:
+        for clock, waveform in enumerate(waveforms):
+            row = {
+                "hashid": hashid,
+                "hashid_noclock": hashid,
+                "pr_speed": pr_speed,
+                "clock": clock * clock_step,
+                "gate1": 1,
+                "sync1": 0,
+                "ring1": 0,
+                "test1": 0,
+                "tri1": int(waveform == "t"),
+                "saw1": int(waveform == "s"),
+                "pulse1": int(waveform == "p"),
+                "noise1": int(waveform == "n"),
+                "flt1": flt1 if clock else None,
+                "atk1": atk1 if not clock else None,
+            }
+            rows.append(row)
+    return pd.DataFrame(rows).astype(pd.Int64Dtype())
+
+
+class SsfIndexTestCase(unittest.TestCase):
+    """Test SSF inverted index."""
+
+    def test_postings(self):
+        hashids = np.array([2**63 - 1, -(2**63), -1, 0, 5, -1], dtype=np.int64)
+        decoded = decode_postings(encode_postings(hashids))
+        self.assertEqual(sorted(set(hashids.tolist())), sorted(decoded.tolist()))
+        self.assertEqual(0, len(decode_postings(encode_postings([]))))
+
+    def test_index_ssfs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "ssfindex.db")
+            ssf_a = os.path.join(tmpdir, "a.ssf.zst")
+            ssf_b = os.path.join(tmpdir, "b.ssf.zst")
+            make_ssf_df(
+                [
+                    (-1, "np", 1, 1, 0),
+                    (2, "np", 1, 0, 0),
+                    (3, "nn", 1, 1, 9),
+                ]
+            ).to_csv(ssf_a, index=False)
+            make_ssf_df(
+                [
+                    (2, "np", 1, 0, 0),
+                    (4, "pn", 2, 1, 0),
+                    (-(2**62), "pnt", 1, 1, 0),
+                ]
+            ).to_csv(ssf_b, index=False)
+            self.assertEqual(2, index_ssfs([ssf_a, ssf_b], db_path, batch=1))
+            self.assertEqual(0, index_ssfs([ssf_a, ssf_b], db_path))
+            ssf_index = SsfIndex(db_path)
+            for terms, hashids in (
+                (["control:n", "control:p", "pr_speed:1", "filter:1"], [-(2**62), -1]),
+                (["labels:n-p"], [-1, 2, 4]),
+                (["control:n"], [-(2**62), -1, 2, 3, 4]),
+                (["atk:9"], [3]),
+                (["filter:0"], [2]),
+                (["control:t", "pr_speed:2"], []),
+                (["missing"], []),
+                ([], []),
+            ):
+                self.assertEqual(
+                    hashids, sorted(ssf_index.query(terms).tolist()), terms
+                )
+            ssf_index.close()
+
+    def test_reindex_changed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "ssfindex.db")
+            ssf_a = os.path.join(tmpdir, "a.ssf.zst")
+            ssf_b = os.path.join(tmpdir, "b.ssf.zst")
+            make_ssf_df([(1, "np", 1, 0, 0), (2, "nn", 1, 0, 0)]).to_csv(
+                ssf_a, index=False
+            )
+            make_ssf_df([(2, "nn", 1, 0, 0)]).to_csv(ssf_b, index=False)
+            self.assertEqual(2, index_ssfs([ssf_a, ssf_b], db_path))
+            # a changes: 1 is gone, 3 is new. 2 is still in b.
+            make_ssf_df([(3, "tt", 2, 0, 0)]).to_csv(ssf_a, index=False)
+            os.utime(ssf_a, (0, 0))
+            self.assertEqual(1, index_ssfs([ssf_a, ssf_b], db_path))
+            ssf_index = SsfIndex(db_path)
+            for terms, hashids in (
+                (["control:n"], [2]),
+                (["labels:n-p"], []),
+                (["labels:n"], [2]),
+                (["pr_speed:1"], [2]),
+                (["control:t", "pr_speed:2"], [3]),
+            ):
+                self.assertEqual(
+                    hashids, sorted(ssf_index.query(terms).tolist()), terms
+                )
+            self.assertNotIn("labels:n-p", ssf_index.terms())
+            ssf_index.close()
+            # b changes: 2 is gone from all files.
+            make_ssf_df([(5, "ss", 1, 0, 0)]).to_csv(ssf_b, index=False)
+            os.utime(ssf_b, (0, 0))
+            self.assertEqual(1, index_ssfs([ssf_a, ssf_b], db_path))
+            ssf_index = SsfIndex(db_path)
+            self.assertEqual([], ssf_index.query(["control:n"]).tolist())
+            self.assertEqual(
+                [
+                    "atk:0",
+                    "control:s",
+                    "control:t",
+                    "filter:0",
+                    "labels:s",
+                    "labels:t",
+                    "pr_speed:1",
+                    "pr_speed:2",
+                ],
+                sorted(ssf_index.terms()),
+            )
+            ssf_index.close()
+
+    def test_labels_as_indexssf(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "ssfindex.db")
+            ssffile = os.path.join(tmpdir, "a.ssf.zst")
+            # 2 and 3 have noise only after indexssf's max_clock, 4 is too fast.
+            pd.concat(
+                [
+                    make_ssf_df([(1, "np", 1, 0, 0), (4, "nn", 9, 0, 0)]),
+                    make_ssf_df(
+                        [(2, "pn", 1, 0, 0), (3, "tn", 1, 0, 0)],
+                        clock_step=600000,
+                    ),
+                ]
+            ).to_csv(ssffile, index=False)
+            index_ssfs([ssffile], db_path)
+            ssf_index = SsfIndex(db_path)
+            index_labels = {}
+            for index_file in index_ssf(ssffile):
+                labels = os.path.basename(index_file).split(".")[2]
+                index_labels[labels] = sorted(read_csv(index_file)["hashid"])
+            self.assertEqual({"n-p": [1], "p": [2], "t": [3]}, index_labels)
+            self.assertEqual(
+                sorted(index_labels),
+                sorted(
+                    term.split(":")[1]
+                    for term in ssf_index.terms()
+                    if term.startswith("labels:")
+                ),
+            )
+            for labels, hashids in index_labels.items():
+                self.assertEqual(
+                    hashids, sorted(ssf_index.query(["labels:" + labels]).tolist())
+                )
+            self.assertEqual([1], ssf_index.query(["control:n"]).tolist())
+            ssf_index.close()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
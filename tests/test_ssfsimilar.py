@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from desidulate.sidwrap import get_sid
+from desidulate.ssfsimilar import (
+    FINGERPRINT_DIMS,
+    FINGERPRINT_FRAMES,
+    SsfVectors,
+    build_ssf_vectors,
+    ssf_fingerprints,
+)
+
+
+def make_ssf_df(hashid, freq1, pwduty1, flt1=0):
+    # pulse with gate on for 2 frames, then off.
+    rows = [
+        {"pr_frame": 0, "gate1": 1, "freq1": freq1, "pwduty1": pwduty1, "atk1": 0},
+        {"pr_frame": 0, "gate1": 1, "freq1": freq1 + 1},
+        {"pr_frame": 2, "gate1": 0, "fltcoff": 1024, "flt1": flt1},
+    ]
+    df = pd.DataFrame(rows)
+    df["hashid"] = hashid
+    df["pulse1"] = 1
+    df["clock"] = df["pr_frame"] * 20000
+    return df.astype(pd.Int64Dtype())
+
+
+class SsfSimilarTestCase(unittest.TestCase):
+    """Test SSF similarity search."""
+
+    def test_ssf_fingerprints(self):
+        sid = get_sid(True, 0)
+        ssf_df = pd.concat(
+            [make_ssf_df(2, 4000, 2048, flt1=1), make_ssf_df(1, 8000, 1024)]
+        )
+        hashids, fingerprints = ssf_fingerprints(sid, ssf_df)
+        self.assertEqual([1, 2], hashids.tolist())
+        self.assertEqual((2, FINGERPRINT_DIMS), fingerprints.shape)
+        frames = fingerprints[:, :-4].reshape(2, FINGERPRINT_FRAMES, -1)
+        # note, pwduty1, gate1, tri1, saw1, pulse1, noise1, fltcoff
+        note = 69 + 12 * np.log2(8001 * sid.freq_scaler / 440)
+        np.testing.assert_allclose(
+            [note / 128, 0.25, 1, 0, 0, 1, 0, 0], frames[0, 0], rtol=1e-6
+        )
+        np.testing.assert_allclose(frames[0, 0], frames[0, 1])
+        self.assertEqual(0, frames[0, 2, 2])
+        # frames after the last change hold its state.
+        np.testing.assert_allclose(frames[0, 2], frames[0, -1])
+        # only filtered voices have a cutoff.
+        self.assertEqual(0, frames[0, 2, 7])
+        self.assertEqual(0.5, frames[1, 2, 7])
+        self.assertEqual(0, frames[1, 0, 7])
+
+    def test_ssf_fingerprints_fltcoff(self):
+        # cutoff set while unfiltered still applies once filtered.
+        sid = get_sid(True, 0)
+        ssf_df = pd.DataFrame(
+            [
+                {"pr_frame": 0, "gate1": 1, "freq1": 4000, "fltcoff": 1024, "flt1": 0},
+                {"pr_frame": 1, "flt1": 1},
+                {"pr_frame": 2, "flt1": 0},
+            ]
+        )
+        ssf_df["hashid"] = 1
+        ssf_df = ssf_df.astype(pd.Int64Dtype())
+        _, fingerprints = ssf_fingerprints(sid, ssf_df)
+        frames = fingerprints[:, :-4].reshape(1, FINGERPRINT_FRAMES, -1)
+        self.assertEqual([0, 0.5, 0], frames[0, :3, 7].tolist())
+
+    def test_top_k(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ssffile = os.path.join(tmpdir, "x.ssf.zst")
+            pd.concat(
+                [
+                    make_ssf_df(1, 4000, 2048),
+                    make_ssf_df(2, 4000, 2040),
+                    make_ssf_df(3, 8000, 2048),
+                    make_ssf_df(4, 4000, 100, flt1=1),
+                    make_ssf_df(5, 4100, 2048),
+                ]
+            ).to_csv(ssffile, index=False)
+            index_prefix = os.path.join(tmpdir, "ssfvectors")
+            self.assertEqual(5, build_ssf_vectors([ssffile, ssffile], index_prefix))
+            ssf_vectors = SsfVectors(index_prefix)
+            self.assertEqual(5, len(ssf_vectors))
+            nearest = ssf_vectors.top_k(ssf_vectors.vector(1), k=3)
+            self.assertEqual([1, 2, 5], [hashid for hashid, _ in nearest])
+            self.assertEqual(0, nearest[0][1])
+            self.assertEqual(
+                [1, 2, 5, 3, 4],
+                [hashid for hashid, _ in ssf_vectors.top_k(ssf_vectors.vector(1), 10)],
+            )
+            with self.assertRaises(KeyError):
+                ssf_vectors.vector(6)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+from desidulate.ssfstore import (
+    SsfStore,
+    read_ssf_log,
+    ssf_store_path,
+    write_ssf_log,
+    write_ssf_store,
+)
+
+
+class SsfStoreTestCase(unittest.TestCase):
+
+    def test_ssf_store(self):
+        ssf_df = pd.DataFrame(
+            {
+                "hashid": [5, 5, 5, -3, -3, 9, 7, 7, 7, 7, 5],
+                "clock": [0, 10, 20, 0, 10, 0, 0, 10, 20, 30, 30],
+                "freq1": [1, 2, 3, 4, None, 6, 7, 8, 9, 10, 11],
+                "count": [3, 3, 3, 2, 2, 1, 1, 1, 1, 1, 3],
+            },
+            dtype=pd.Int64Dtype(),
+        )
+        grouped_df = ssf_df.iloc[[0, 1, 2, 10, 3, 4, 5, 6, 7, 8, 9]].reset_index(
+            drop=True
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logfile = os.path.join(tmpdir, "x.log.zst")
+            ssffile = ssf_store_path(logfile)
+            self.assertEqual(os.path.join(tmpdir, "x.ssf.zst"), ssffile)
+            grouped_df.to_csv(ssffile, index=False)
+            ssffile = os.path.join(tmpdir, "x.ssf.parquet")
+            index_df = write_ssf_store(
+                ssf_df.set_index("hashid"), ssffile, row_group_size=3
+            )
+            self.assertEqual(ssffile, ssf_store_path(logfile))
+            # unless a later reg2ssf wrote ssf.zst.
+            os.utime(ssffile, (1, 1))
+            self.assertEqual(os.path.join(tmpdir, "x.ssf.zst"), ssf_store_path(logfile))
+            self.assertEqual(
+                [[5, 0, 4, 3], [-3, 4, 2, 2], [9, 6, 1, 1], [7, 7, 4, 1]],
+                index_df.to_numpy().tolist(),
+            )
+            for store in (
+                SsfStore(ssffile),
+                SsfStore(os.path.join(tmpdir, "x.ssf.zst")),
+            ):
+                self.assertEqual([5, -3, 9, 7], list(store.hashids()))
+                self.assertTrue(grouped_df.equals(store.read()))
+                for hashids in ([7], [9, 5], [-3, 7, 123], []):
+                    self.assertTrue(
+                        grouped_df[grouped_df["hashid"].isin(hashids)]
+                        .reset_index(drop=True)
+                        .equals(store.read(hashids).reset_index(drop=True)),
+                        hashids,
+                    )
+            self.assertEqual(
+                [[0, 30]],
+                SsfStore(ssffile)
+                .read([7], columns=["clock"])
+                .agg(["min", "max"])
+                .T.to_numpy()
+                .tolist(),
+            )
+
+    def test_ssf_log(self):
+        ssf_log_df = pd.DataFrame(
+            {
+                "clock": [300, 100, 200, 100, 500, 400, 600],
+                "hashid": [1, 2, 3, 4, 5, 6, 7],
+                "voice": [1, 2, 3, 1, 2, 3, 1],
+            },
+            dtype=pd.Int64Dtype(),
+        ).set_index("clock")
+        sorted_df = ssf_log_df.sort_index(kind="stable").reset_index()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logfile = os.path.join(tmpdir, "x.log.parquet")
+            write_ssf_log(ssf_log_df, logfile, row_group_size=2)
+            csv_logfile = os.path.join(tmpdir, "x.log.zst")
+            sorted_df.to_csv(csv_logfile, index=False)
+            for path in (logfile, csv_logfile):
+                self.assertTrue(sorted_df.equals(read_ssf_log(path)))
+                for minclock, maxclock in ((200, 400), (0, 150), (550, 0), (700, 0)):
+                    window_df = sorted_df
+                    if minclock:
+                        window_df = window_df[window_df["clock"] >= minclock]
+                    if maxclock:
+                        window_df = window_df[window_df["clock"] <= maxclock]
+                    self.assertTrue(
+                        window_df.reset_index(drop=True).equals(
+                            read_ssf_log(path, minclock, maxclock)
+                        ),
+                        (path, minclock, maxclock),
+                    )
+            other_file = os.path.join(tmpdir, "other.zst")
+            sorted_df.drop(["voice"], axis=1).to_csv(other_file, index=False)
+            self.assertEqual(
+                ["clock", "hashid"], list(read_ssf_log(other_file).columns)
+            )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
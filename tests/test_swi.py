@@ -1,9 +1,51 @@
 #!/usr/bin/python3
 
+import random
+import struct
 import unittest
+from io import StringIO
+from itertools import groupby
+import pandas as pd
+from desidulate.fileio import read_csv
+from desidulate.sidwrap import get_sid
+from desidulate.ssf2swi import ssf_swi
 from desidulate.swilib import sw_rle_diff, dot0
 
 
+# Reference (original, string based) implementation for fuzz testing.
+def ref_sw_rle_diff(col, diffmult):
+    pairs = [(int(pair[:2], 16), int(pair[2:], 16)) for pair in col]
+    compressed_pairs = []
+    while pairs and pairs[0][0] == 0:
+        compressed_pairs.append((0, 0))
+        pairs = pairs[1:]
+    for prefix, pairs in groupby(pairs, key=lambda x: x[0]):
+        suffixes = [pair[1] for pair in pairs]
+        diffs = [0]
+        for i, x in enumerate(suffixes[1:]):
+            diffs.append(x - suffixes[i])
+        for diff, vals in groupby(zip(suffixes, diffs), key=lambda x: x[1]):
+            vals = list(vals)
+            len_vals = len(vals)
+            if len_vals == 1:
+                compressed_pairs.append(((prefix, vals[0][0])))
+            else:
+                if not compressed_pairs:
+                    compressed_pairs.append(((prefix, vals[0][0])))
+                diff *= diffmult
+                if diff < 0:
+                    diff = ord(struct.pack("b", diff))
+                compressed_pairs.append((len_vals, diff))
+    while len(compressed_pairs) > 1:
+        lastpair = compressed_pairs[-1]
+        if lastpair[0] > 0x7F or lastpair[1] > 0:
+            break
+        compressed_pairs = compressed_pairs[:-1]
+    compressed_pairs = ["%2.2X%2.2X" % i for i in compressed_pairs]
+    compressed_pairs.extend(["0000"] * (len(col) - len(compressed_pairs)))
+    return compressed_pairs
+
+
 class SWITestCase(unittest.TestCase):
 
     def test_sw_rle_diff(self):
@@ -17,6 +59,44 @@ class SWITestCase(unittest.TestCase):
             sw_rle_diff(["8810", "880E", "880C", "880A"], 1),
         )
 
+    def test_sw_rle_diff_fuzz(self):
+        rng = random.Random(0)
+        for _ in range(1000):
+            diffmult = rng.choice((1, 2**3))
+            prefixes = rng.choice(((0,), (0, 0x88), (0x88, 0x89), (0, 0x88, 0x9F)))
+            col = []
+            for _ in range(rng.randint(0, 32)):
+                if col and rng.random() < 0.7:
+                    prefix, suffix = int(col[-1][:2], 16), int(col[-1][2:], 16)
+                    step = rng.choice((0, 1, 2, -2, 15, -15)) * 8 // diffmult
+                    suffix = min(max(suffix + step, 0), 0xFF)
+                else:
+                    prefix, suffix = rng.choice(prefixes), rng.randint(0, 0xFF)
+                col.append("%2.2X%2.2X" % (prefix, suffix))
+            self.assertEqual(
+                ref_sw_rle_diff(col, diffmult), sw_rle_diff(col, diffmult), col
+            )
+
+    def test_ssf_swi(self):
+        ssf_df = read_csv(
+            StringIO("""
+hashid,pr_speed,clock,gate1,freq1,pwduty1,pulse1,tri1,flt1,fltcoff,fltres,fltlo,fltband,flthi,atk1,dec1,sus1,rel1,pr_frame
+1,1,0,1,,,0,0,0,,,,,,0,10,0,0,0
+1,1,100,1,4000,256,1,0,1,1024,15,1,0,0,,,,,1
+1,1,200,1,4000,258,1,0,1,1032,15,1,0,0,,,,,2
+1,1,300,1,4000,260,1,0,1,1040,15,1,0,0,,,,,3
+1,1,400,1,4000,262,0,1,0,,,,,,,,,,4
+"""),
+            dtype=pd.Int64Dtype(),
+        )
+        pr_speed, adsr, sw_df, _ = ssf_swi(get_sid(pal=True, cia=0), ssf_df)
+        self.assertEqual(1, pr_speed)
+        self.assertEqual("0A00", adsr)
+        self.assertEqual(["00", "01", "02", "03"], list(sw_df["F"]))
+        self.assertEqual(["41AF", "41AF", "41AF", "11AF"], list(sw_df["WFARP"]))
+        self.assertEqual(["81..", "0302", "....", "...."], list(sw_df["PULSE"]))
+        self.assertEqual(["9F80", "0208", "....", "...."], list(sw_df["FILT"]))
+
     def test_dot0(self):
         self.assertEqual("....", dot0("0000"))
         self.assertEqual("99..", dot0("9900"))
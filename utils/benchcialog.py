@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Benchmark CIA timer scanning of a recorded sidplayfp --cpu-debug log, e.g.
+# sidplayfp -t1 -q --cpu-debug --delay=0 -os1 -w/dev/null tune.sid > tune.log
+
+import re
+import sys
+import time
+from desidulate.sidinfo import CiaLogScanner
+
+CIA1_TIMERA_RE = re.compile(r"^.+\s+ST([AXY])a\s+dc0([45e])$")
+INSTRUCTION_RE = re.compile(r"^.+Instruction\s+\((\d+)\)$")
+LOG_CHUNK_SIZE = 2**16
+
+
+def regex_scan(lines, instruction_cutoff):
+    cia_writes = []
+    instructions = 0
+    for line in lines:
+        if instructions > instruction_cutoff:
+            continue
+        line = line.decode("utf8").strip()
+        if not line:
+            continue
+        match = INSTRUCTION_RE.match(line)
+        if match:
+            instructions = int(match.group(1))
+            continue
+        match = CIA1_TIMERA_RE.match(line)
+        if not match:
+            continue
+        cpu_reg_map = {"A": 2, "X": 3, "Y": 4}
+        raw_val = line.split()[cpu_reg_map[match.group(1)]]
+        cia_writes.append((int(match.group(2), 16), int(raw_val, 16)))
+    return (cia_writes, instructions)
+
+
+def chunk_scan(log, instruction_cutoff):
+    scanner = CiaLogScanner(instruction_cutoff)
+    for pos in range(0, len(log), LOG_CHUNK_SIZE):
+        scanner.feed(log[pos : pos + LOG_CHUNK_SIZE])
+        if scanner.done:
+            break
+    scanner.flush()
+    return (scanner.cia_writes, scanner.instructions)
+
+
+with open(sys.argv[1], "rb") as f:
+    recorded_log = f.read()
+cutoff = float(sys.argv[2]) if len(sys.argv) > 2 else 1e6
+recorded_lines = recorded_log.splitlines(keepends=True)
+start_time = time.time()
+regex_result = regex_scan(recorded_lines, cutoff)
+regex_time = time.time() - start_time
+start_time = time.time()
+chunk_result = chunk_scan(recorded_log, cutoff)
+chunk_time = time.time() - start_time
+assert regex_result == chunk_result, (regex_result, chunk_result)
+print(
+    f"{len(recorded_lines)} lines, {len(chunk_result[0])} CIA writes: "
+    f"regex {regex_time:.3f}s, chunked {chunk_time:.3f}s"
+)
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Compare CIA timers found by the internal emulator with sidplayfp in docker,
+# for all CIA songs in a directory of .sid files. With --write_expected, also
+# write the sidplayfp timers (or errors) as expected results, e.g. for the
+# fixtures in tests/sids.
+
+import argparse
+import csv
+import pathlib
+import sys
+import time
+from desidulate.sidinfo import sidinfo, emulate_cia_timer, scrape_cia_timer
+
+
+def probe(cia_probe, sidfile, validate_ctrl, song):
+    start_time = time.time()
+    try:
+        timer = cia_probe(sidfile, validate_ctrl, song)
+    except ValueError as err:
+        timer = str(err)
+    return (timer, time.time() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare emulated CIA timers with sidplayfp"
+    )
+    parser.add_argument("siddir", help="directory of .sid files")
+    parser.add_argument(
+        "--write_expected",
+        default=None,
+        help="write sidplayfp timers to this CSV file",
+    )
+    args = parser.parse_args()
+
+    mismatches = 0
+    expected = []
+    siddir = pathlib.Path(args.siddir)
+    for sidfile in sorted(siddir.rglob("*.sid")):
+        sidfile = str(sidfile)
+        for result in sidinfo(sidfile, cia_probe=lambda *_: 1):
+            if result["cia"]:
+                validate_ctrl = result["magicID"] != "RSID"
+                emulated, emulated_time = probe(
+                    emulate_cia_timer, sidfile, validate_ctrl, result["song"]
+                )
+                scraped, scraped_time = probe(
+                    scrape_cia_timer, sidfile, validate_ctrl, result["song"]
+                )
+                if emulated != scraped:
+                    mismatches += 1
+                print(
+                    f"{sidfile} {result['song']}: emulated {emulated} ({emulated_time:.2f}s)"
+                    f" docker {scraped} ({scraped_time:.2f}s)"
+                )
+                if isinstance(scraped, str):
+                    # error, without the sidfile prefix.
+                    cia, error = ("", scraped.split(": ")[1])
+                else:
+                    cia, error = (scraped, "")
+                expected.append(
+                    (
+                        str(pathlib.Path(sidfile).relative_to(siddir)),
+                        result["song"],
+                        cia,
+                        error,
+                    )
+                )
+    if args.write_expected:
+        with open(args.write_expected, "w", encoding="utf8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(("sid", "song", "cia", "error"))
+            writer.writerows(expected)
+    print(f"{mismatches} mismatches")
+    sys.exit(int(mismatches > 0))
+
+
+if __name__ == "__main__":
+    main()
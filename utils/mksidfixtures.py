@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+# Copyright 2020-2022 Josh Bailey (josh@vandervecken.com)
+
+## Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+## The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+# Write the CIA timer .sid fixtures in tests/sids, e.g.
+# utils/mksidfixtures.py tests/sids
+# Expected timers are in tests/sids/cia_timers.csv. They were derived by hand
+# from the emulator's own model and have NOT been checked against sidplayfp.
+# Check them against sidplayfp in docker, and rewrite them, with
+# utils/cmpciatimer.py tests/sids --write_expected tests/sids/cia_timers.csv
+
+import os
+import struct
+import sys
+
+LOAD_ADDRESS = 0x1000
+PLAY_ADDRESS = 0x1020
+DATA_ADDRESS = 0x1030
+CODE_LEN = 0x40
+
+# init: set CIA1 timer A to $1234 and start it.
+CIA_INIT = (
+    0xA9, 0x34, 0x8D, 0x04, 0xDC,  # LDA #$34, STA $DC04
+    0xA9, 0x12, 0x8D, 0x05, 0xDC,  # LDA #$12, STA $DC05
+    0xA9, 0x11, 0x8D, 0x0E, 0xDC,  # LDA #$11, STA $DC0E
+    0x60,  # RTS
+)  # fmt: skip
+# init: as CIA_INIT, but one-shot.
+CIA_ONE_SHOT_INIT = CIA_INIT[:11] + (0x19,) + CIA_INIT[12:]
+# init: set CIA1 timer A to $4CC7 with STX/STY.
+CIA_XY_INIT = (
+    0xA2, 0xC7, 0x8E, 0x04, 0xDC,  # LDX #$C7, STX $DC04
+    0xA0, 0x4C, 0x8C, 0x05, 0xDC,  # LDY #$4C, STY $DC05
+    0xA9, 0x11, 0x8D, 0x0E, 0xDC,  # LDA #$11, STA $DC0E
+    0x60,  # RTS
+)  # fmt: skip
+# init: set CIA1 timer A from a table indexed by song, $1000 or $1880.
+CIA_SONGS_INIT = (
+    0xA8,  # TAY
+    0xB9, 0x30, 0x10, 0x8D, 0x04, 0xDC,  # LDA $1030,Y, STA $DC04
+    0xB9, 0x32, 0x10, 0x8D, 0x05, 0xDC,  # LDA $1032,Y, STA $DC05
+    0xA9, 0x11, 0x8D, 0x0E, 0xDC,  # LDA #$11, STA $DC0E
+    0x60,  # RTS
+)  # fmt: skip
+CIA_SONGS_DATA = (0x00, 0x80, 0x10, 0x18)
+# play: on the 10th call, set CIA1 timer A to $2000.
+CIA_PLAY = (
+    0xE6, 0xFB,  # INC $FB
+    0xA5, 0xFB,  # LDA $FB
+    0xC9, 0x0A,  # CMP #$0A
+    0xD0, 0x0A,  # BNE +10
+    0xA9, 0x00, 0x8D, 0x04, 0xDC,  # LDA #$00, STA $DC04
+    0xA9, 0x20, 0x8D, 0x05, 0xDC,  # LDA #$20, STA $DC05
+    0x60,  # RTS
+)  # fmt: skip
+RTS = (0x60,)
+# RSID init: install IRQ handler at $0314, loop forever.
+RSID_KERNAL_INIT = (
+    0x78,  # SEI
+    0xA9, 0x20, 0x8D, 0x14, 0x03,  # LDA #$20, STA $0314
+    0xA9, 0x10, 0x8D, 0x15, 0x03,  # LDA #$10, STA $0315
+    0x58,  # CLI
+    0x4C, 0x0C, 0x10,  # JMP $100C
+)  # fmt: skip
+# RSID IRQ via KERNAL: on the 5th call, set CIA1 timer A to $3000.
+RSID_KERNAL_IRQ = (
+    0xE6, 0xFB,  # INC $FB
+    0xA5, 0xFB,  # LDA $FB
+    0xC9, 0x05,  # CMP #$05
+    0xD0, 0x0A,  # BNE +10
+    0xA9, 0x00, 0x8D, 0x04, 0xDC,  # LDA #$00, STA $DC04
+    0xA9, 0x30, 0x8D, 0x05, 0xDC,  # LDA #$30, STA $DC05
+    0x4C, 0x31, 0xEA,  # JMP $EA31
+)  # fmt: skip
+# RSID init: bank out KERNAL, install IRQ handler at $FFFE, loop forever.
+RSID_NOKERNAL_INIT = (
+    0x78,  # SEI
+    0xA9, 0x35, 0x85, 0x01,  # LDA #$35, STA $01
+    0xA9, 0x20, 0x8D, 0xFE, 0xFF,  # LDA #$20, STA $FFFE
+    0xA9, 0x10, 0x8D, 0xFF, 0xFF,  # LDA #$10, STA $FFFF
+    0x58,  # CLI
+    0x4C, 0x10, 0x10,  # JMP $1010
+)  # fmt: skip
+# RSID IRQ: acknowledge CIA1, and on the 3rd call set CIA1 timer A to $0F00.
+RSID_NOKERNAL_IRQ = (
+    0x48,  # PHA
+    0xAD, 0x0D, 0xDC,  # LDA $DC0D
+    0xE6, 0xFB,  # INC $FB
+    0xA5, 0xFB,  # LDA $FB
+    0xC9, 0x03,  # CMP #$03
+    0xD0, 0x0A,  # BNE +10
+    0xA9, 0x00, 0x8D, 0x04, 0xDC,  # LDA #$00, STA $DC04
+    0xA9, 0x0F, 0x8D, 0x05, 0xDC,  # LDA #$0F, STA $DC05
+    0x68,  # PLA
+    0x40,  # RTI
+)  # fmt: skip
+
+# filename: (magic, init, play, data, speed, songs)
+SID_FIXTURES = {
+    "psid_init.sid": (b"PSID", CIA_INIT, RTS, (), 1, 1),
+    "psid_play.sid": (b"PSID", CIA_INIT, CIA_PLAY, (), 1, 1),
+    "psid_xy.sid": (b"PSID", CIA_XY_INIT, RTS, (), 1, 1),
+    "psid_songs.sid": (b"PSID", CIA_SONGS_INIT, RTS, CIA_SONGS_DATA, 0b11, 2),
+    "psid_one_shot.sid": (b"PSID", CIA_ONE_SHOT_INIT, RTS, (), 1, 1),
+    "psid_no_timer.sid": (b"PSID", RTS, RTS, (), 1, 1),
+    "rsid_kernal.sid": (b"RSID", RSID_KERNAL_INIT, RSID_KERNAL_IRQ, (), 0, 1),
+    "rsid_no_kernal.sid": (b"RSID", RSID_NOKERNAL_INIT, RSID_NOKERNAL_IRQ, (), 0, 1),
+}
+
+
+def make_sid(magic, init, play, data, speed, songs):
+    code = bytearray(CODE_LEN)
+    code[: len(init)] = bytes(init)
+    for addr, vals in ((PLAY_ADDRESS, play), (DATA_ADDRESS, data)):
+        offset = addr - LOAD_ADDRESS
+        code[offset : offset + len(vals)] = bytes(vals)
+    header = struct.pack(
+        ">4sHHHHHHHI32s32s32sHBBBB",
+        magic,
+        2,
+        0x7C,
+        LOAD_ADDRESS,
+        LOAD_ADDRESS,
+        # RSID play address must be 0.
+        0 if magic == b"RSID" else PLAY_ADDRESS,
+        songs,
+        1,
+        speed,
+        b"desidulate",
+        b"desidulate",
+        b"CIA timer fixture",
+        # PAL.
+        1 << 2,
+        0,
+        0,
+        0,
+        0,
+    )
+    return header + bytes(code)
+
+
+def main():
+    sid_dir = sys.argv[1]
+    for filename, fixture in SID_FIXTURES.items():
+        with open(os.path.join(sid_dir, filename), "wb") as f:
+            f.write(make_sid(*fixture))
+
+
+if __name__ == "__main__":
+    main()